@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import getopt
+import random
+import struct
+import tempfile
+import resource
+import multiprocessing
+from contextlib import redirect_stdout
+from iarlib import iter_sections
+from iarlib.reader import Reader
+from iarlib.index import SectionIndex
+from iarlib.section import section_type
+from iarlib.type import Type, intrinsic_map
+from iarlib.instruction import Abs8
+from iarlib.opcode import opcode_length
+from iarlib.relocation import Relocations
+from iarlib.image import Image
+
+# Synthetic library generator, record layouts follow iar.hexpat
+
+def dynamic(value: int) -> bytes:
+    ret = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value == 0:
+            ret.append(byte)
+            return bytes(ret)
+        ret.append(byte | 0x80)
+
+def string(text: str) -> bytes:
+    encoded = text.encode()
+    return bytes([len(encoded)]) + encoded
+
+def u8(value: int) -> bytes:
+    return bytes([value])
+
+def u16(value: int) -> bytes:
+    return struct.pack(">H", value)
+
+def u32(value: int) -> bytes:
+    return struct.pack(">I", value)
+
+def counts(*sizes) -> bytes:
+    ret = u8(0xC4) + u32(len(sizes))
+    for sno, size in sizes:
+        ret += u8(0xC5) + u8(sno) + u32(size) + u16(0)
+    return ret
+
+memory_infos = ["__bit", "__sfr", "__data", "__idata", "__bdata", "__pdata", "__xdata"]
+BANKED_FUNC = 0x15
+XDATA = 0x06
+
+# First dynamic type index, clear of the intrinsics
+TYPE_BASE = 0x40
+
+def header() -> bytes:
+    ret = u8(0x00) + bytes([0x0A, 0x05, 16, 6, 9, 0x10]) + string("synthetic")
+    ret += u8(0xBD) + bytes([10, 0, 6, 0])
+    ret += u8(0x53) + u16(3)
+    ret += u8(0x54) + u16(0x2000) + string("9.10")
+    for key, value in [("__core", "plain"), ("__code_model", "banked"), ("__data_model", "large")]:
+        ret += u8(0xC9) + u32(0) + u32(len(key)) + key.encode() + u32(len(value)) + value.encode()
+    for index, name in enumerate(memory_infos):
+        ret += u8(0xC6) + u16(0) + bytes([index, 2, 6, 0]) + u32(len(name)) + name.encode()
+    for index in range(0x16 - len(memory_infos)):
+        name = f"__func{index}"
+        ret += u8(0xC6) + u16(0) + bytes([len(memory_infos) + index, 2, 6, 0]) + u32(len(name)) + name.encode()
+    ret += u8(0xD3) + u16(0) + u8(1) + u8(1) + string("__data_overlay")
+    ret += u8(0xC1) + bytes([XDATA, XDATA, XDATA, XDATA, BANKED_FUNC])
+    return ret
+
+def nameTable(count: int) -> bytes:
+    ret = bytearray()
+    for index in range(count):
+        # Every fourth name is scoped under the one before it
+        if index % 4 == 3:
+            ret += u8(0xCD) + u32(0) + u32(0) + string("?relay") + u32(index - 1)
+        else:
+            ret += u8(0xCD) + u32(0) + u32(0) + string(f"name{index}") + u32(0xFFFFFFFF)
+    return bytes(ret)
+
+# Cycles through every type kind, each referring to earlier types
+def types(count: int, names: int, rng: random.Random) -> bytes:
+    ret = bytearray()
+    defined = [0x01, 0x03, 0x0C]
+    for number in range(count):
+        index = TYPE_BASE + number
+        kind = number % 7
+        earlier = lambda: rng.choice(defined)
+        body = u8(0x4A) + dynamic(index)
+        if kind == 0:
+            params = [earlier() for _ in range(rng.randrange(4))]
+            body += u8(0x14) + dynamic(earlier()) + u8(0) + u8(len(params))
+            body += b"".join(dynamic(param) for param in params)
+        elif kind == 1:
+            body += u8(0x2B) + u8(BANKED_FUNC) + dynamic(index - 1) + u32(8) + u8(0) + u32(0x04000000)
+        elif kind == 2:
+            body += u8(0x31) + dynamic(earlier()) + u32(rng.randrange(names))
+        elif kind == 3:
+            body += u8(0x2A) + u8(XDATA) + dynamic(earlier()) + u32(0) + u8(0) + u32(0)
+        elif kind == 4:
+            body += u8(0x0F) + dynamic(earlier())
+        elif kind == 5:
+            body += u8(0x29) + dynamic(earlier()) + u32(4) + u32(rng.randrange(1, 16))
+        else:
+            members = rng.randrange(1, 6)
+            body += u8(0x34) + u32(rng.randrange(names)) + u32(9) + u32(members * 2) + u32(members)
+            for member in range(members):
+                body += u32(member) + u32(rng.randrange(names)) + dynamic(earlier()) + u32(0)
+        ret += body
+        defined.append(index)
+    ret += u8(0x4F) + u8(0x2F) + u8(1)
+    return bytes(ret)
+
+segments = [
+    (0x80, 0x01, 0x24, "ISTACK"),
+    (0x80, 0x02, 0x23, "PSTACK"),
+    (0x80, 0x03, 0x23, "XSTACK"),
+    (0x80, 0x04, 0x24, "IOVERLAY"),
+    (0x80, 0x05, 0x22, "DOVERLAY"),
+    (0x80, 0x06, 0x23, "XDATA_Z"),
+    (0x80, 0x07, 0x21, "BANKED_CODE"),
+    (0xA0, 0x08, 0x21, "BANK_RELAYS"),
+]
+DATA_SEGMENT = 0x06
+
+def segmentTable() -> bytes:
+    ret = bytearray()
+    for spa, index, type, name in segments:
+        ret += u8(0x4B) + u8(spa) + u8(index) + u8(type) + string(name)
+    return bytes(ret)
+
+def callFrames(count: int) -> bytes:
+    names = bytearray([0x05, 0, 1, 0, 8, 2, 0, 47, 0, 1]) + string("IOVERLAY")
+    columns = [("PSW.CY", 1), ("A", None), ("R0", None), ("SP", None), ("XSP16", 16)]
+    names += u8(len(columns)) + u32(0) + u32(0) + u8(1) + u8(4)
+    for column, bits in columns:
+        names += string(column)
+        if bits is not None:
+            names += u8(bits)
+    names += bytes([1, 4, 3, 0])
+    common = bytearray([0x02, 0, 1]) + string("IAR 2") + bytes([1, 0x7F, 3, 0, 0, 0])
+    common += bytes([0x0C, 3, 3, 0x1C, 0, 4, 0, 0x1F, 3, 0x07, 1, 0x08, 2, 0x83, 3])
+    ret = u8(0xD4) + dynamic(len(names)) + names
+    for _ in range(count):
+        ret += u8(0xD4) + dynamic(len(common)) + common
+    return bytes(ret)
+
+def symbols(count: int, names: int, type_count: int, rng: random.Random) -> bytes:
+    ret = bytearray()
+    # External data and function symbols
+    ret += u8(0xCE) + u32(0) + u8(0x05) + dynamic(0) + bytes(7) + u8(0) + dynamic(0x0C) + bytes(3)
+    ret += u8(0xCE) + u32(0) + u8(0x05) + dynamic(1) + bytes(7) + u8(1 % names) + dynamic(0x0C) + bytes(3)
+    ret += u8(0xB1) + u16(0) + u32(0x202) + counts((1, 0), (3, 12))
+    # Relocatable data symbol
+    ret += u8(0xCE) + u32(0) + u8(0x02) + dynamic(DATA_SEGMENT) + bytes(7) + u8(2 % names) + dynamic(0x01) + bytes(3)
+    for function in range(count):
+        type = TYPE_BASE + rng.randrange(type_count) if type_count else 0x0C
+        ret += u8(0xCE) + u32(0) + u8(0x02) + dynamic(functionIndex(function)) + bytes(7)
+        ret += u8(function % min(names, 256)) + dynamic(type) + bytes(3)
+        ret += u8(0xB0) + u16(function + 1) + u16(0xFFFF) + u16(function) + u32(0x203) + u16(0)
+        ret += counts((1, 2), (3, rng.randrange(32))) + counts((1, 0))
+    return bytes(ret)
+
+# Relocatable index of each function, clear of the segment indices
+def functionIndex(function: int) -> int:
+    return 0x10 + function
+
+def stackCheck(message: str, lower: int, upper: int) -> bytes:
+    return u8(0x9D) + string(message) + u8(0x73) + u32(lower) + u32(upper) + u8(0x9D) + string("")
+
+# One instruction with its operand records, and the code bytes it stands for
+def instruction(rng: random.Random, function: int) -> tuple:
+    kind = rng.randrange(8)
+    if kind == 0: # MOV A,#imm
+        return u8(0x36) + u8(0x74) + u8(0x36) + u8(rng.randrange(256)), 2
+    elif kind == 1: # MOV A,Rn
+        return u8(0x36) + u8(0xE8 | rng.randrange(8)), 1
+    elif kind == 2: # MOV direct,direct
+        return u8(0x36) + u8(0x85) + u8(0x36) + u8(rng.randrange(256)) + u8(0x36) + u8(rng.randrange(256)), 3
+    elif kind == 3: # MOV DPTR,#data symbol
+        return (u8(0x36) + u8(0x90) + u8(0x5E) + dynamic(DATA_SEGMENT) + u32(0)
+            + stackCheck("\nNumber out of range", 0xFFFF8000, 0xFFFF)
+            + u8(0x70) + u8(0x6E) + u32(8) + u8(0x5A) + u8(0x5A)), 3
+    elif kind == 4: # LCALL external
+        return (u8(0x36) + u8(0x12) + u8(0x5D) + dynamic(1) + u32(0)
+            + stackCheck("\nNumber out of range", 0xFFFF8000, 0xFFFF)
+            + u8(0x70) + u8(0x6E) + u32(8) + u8(0x5A) + u8(0x5A)), 3
+    elif kind == 5: # SJMP to the start of the function
+        return (u8(0x36) + u8(0x80) + u8(0x5E) + dynamic(functionIndex(function)) + u32(0)
+            + u8(0x62) + u32(0) + u8(0x64) + u8(0x61) + u32(1) + u8(0x64)
+            + stackCheck("\nBranch displacement > 8 bits", 0xFFFFFF80, 0x7F) + u8(0x5A)), 2
+    elif kind == 6: # MOVX @DPTR,A
+        return u8(0x36) + u8(0xF0), 1
+    else: # RET
+        return u8(0x36) + u8(0x22), 1
+
+def code(functions: int, code_bytes: int, rng: random.Random) -> bytes:
+    ret = bytearray()
+    ret += u8(0xC7) + dynamic(DATA_SEGMENT) + u32(0) + u8(0xDE) + u8(10)
+    ret += u8(0x5D) + dynamic(0) + u32(0) + u8(0x9C)
+    per_function = code_bytes // max(functions, 1)
+    for function in range(functions):
+        ret += u8(0xC7) + dynamic(functionIndex(function)) + u32(0) + u8(0xDE) + u8(1)
+        ret += u8(0xCB) + u16(function + 1) + u16(0) + u16(0) + counts((3, 1))
+        if function:
+            ret += u8(0xCB) + u16(function + 1) + u16(function) + u16(0) + counts((1, 2))
+        emitted = 0
+        while emitted < per_function:
+            records, size = instruction(rng, function)
+            ret += records
+            emitted += size
+    ret += u8(0xC7) + dynamic(0x08) + u32(0) + u8(0xDE) + u8(11) + u8(0x37) + u16(0xFFFF)
+    return bytes(ret)
+
+def synthesize(names: int = 256, types_count: int = 200, symbol_count: int = 100,
+               call_frames: int = 50, code_bytes: int = 64 * 1024, seed: int = 1) -> bytes:
+    rng = random.Random(seed)
+    names = max(names, 4)
+    library = header() + nameTable(names) + types(types_count, names, rng) + segmentTable()
+    library += callFrames(call_frames) + symbols(symbol_count, names, types_count, rng)
+    library += code(symbol_count, code_bytes, rng)
+    library += u8(0x3F) + u16(0) + u8(0xFF)
+    return library
+
+# Benchmarks
+
+class Measurement:
+    def __str__(self):
+        return (f'{self.name:<10} {self.seconds * 1000:10.2f} ms {self.bytes / self.seconds / 1e6:10.2f} MB/s '
+                f'{self.records / self.seconds / 1e3:10.1f} k{self.unit}/s')
+    def __init__(self, name: str, seconds: float, bytes: int, records: int, unit: str):
+        self.name = name
+        self.seconds = seconds
+        self.bytes = bytes
+        self.records = records
+        self.unit = unit
+
+def best(function, repeat: int) -> tuple:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ret = function()
+        times.append(time.perf_counter() - start)
+    return min(times), ret
+
+# Reader primitives: pre-scan of every record without decoding
+def benchReader(library: str, repeat: int) -> Measurement:
+    seconds, index = best(lambda: SectionIndex(Reader(library)), repeat)
+    return Measurement("reader", seconds, index.end, len(index), "rec")
+
+def benchSections(library: str, repeat: int) -> Measurement:
+    def decode():
+        count = 0
+        with open(os.devnull, "w") as null, redirect_stdout(null):
+            for _ in iter_sections(library):
+                count += 1
+        return count
+    seconds, count = best(decode, repeat)
+    return Measurement("sections", seconds, os.path.getsize(library), count, "rec")
+
+# Decodes and renders every Type record
+def benchTypes(library: str, repeat: int) -> Measurement:
+    index = SectionIndex(Reader(library))
+    records = index.find(Type.ID)
+    size = sum(index.positions[record + 1] - index.positions[record] for record in records)
+    def resolve():
+        # Drop decoded types, keeping the seeded intrinsics
+        types = index.data.context.type_map
+        for key, _ in list(types.entries()):
+            if key not in intrinsic_map:
+                types[key] = None
+        with open(os.devnull, "w") as null, redirect_stdout(null):
+            for record in records:
+                repr(index.decode(record))
+    seconds, _ = best(resolve, repeat)
+    return Measurement("types", seconds, size, len(records), "types")
+
+# Decodes every instruction, byte rate is in 8051 code bytes
+def benchOpcodes(library: str, repeat: int) -> Measurement:
+    index = SectionIndex(Reader(library))
+    data = index.data
+    # Only Abs8 records that start an instruction, not the operand bytes
+    # the index also lists, so walk the stream the way the decoder does
+    positions = []
+    data.seek(index.positions[0] if len(index) else index.end)
+    with open(os.devnull, "w") as null, redirect_stdout(null):
+        while data.position() < index.end:
+            position = data.position()
+            section_id = data.readU8()
+            if section_id == 0xFF:
+                break
+            section_type[section_id](data)
+            if section_id == Abs8.ID:
+                positions.append(position)
+    code_bytes = sum(opcode_length[data.data[position + 1]] for position in positions)
+    def decode():
+        with open(os.devnull, "w") as null, redirect_stdout(null):
+            for position in positions:
+                index.decodeAt(position)
+    seconds, _ = best(decode, repeat)
+    return Measurement("opcodes", seconds, code_bytes, len(positions), "ins")
+
+# Resolves every relocation of the library with its areas back to back,
+# byte rate is in resolved area bytes
+def benchRelocations(library: str, repeat: int) -> Measurement:
+    relocations = Relocations(library)
+    bases, externals = relocations.layout()
+    size = sum(len(area.image) for area in relocations.areas.values())
+    seconds, _ = best(lambda: relocations.resolve(bases, externals), repeat)
+    return Measurement("relocs", seconds, size, relocations.count, "fix")
+
+# Finds the code in the library areas linked back to back as one image,
+# from the start of every area. Byte rate is in image bytes.
+def benchImage(library: str, repeat: int) -> Measurement:
+    relocations = Relocations(library)
+    bases, externals = relocations.layout()
+    images, _ = relocations.resolve(bases, externals)
+    code = bytearray(max((bases[index] + len(area) for index, area in images.items()), default=0))
+    for index, area in images.items():
+        code[bases[index]:bases[index] + len(area)] = area
+    entries = sorted(bases[index] for index in images)
+    present = b"\x01" * len(code)
+    def discover():
+        disassembly = Image(code, present)
+        disassembly.discover(entries)
+        return disassembly
+    seconds, disassembly = best(discover, repeat)
+    return Measurement("image", seconds, len(code), disassembly.count, "ins")
+
+# Runs in a fresh interpreter so the parent's memory does not count
+def retain(library: str) -> tuple:
+    with open(os.devnull, "w") as null, redirect_stdout(null):
+        sections = list(iter_sections(library))
+    return len(sections), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+# Peak RSS with every decoded section kept alive, byte rate is per KiB of RSS
+def benchMemory(library: str, repeat: int) -> Measurement:
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        start = time.perf_counter()
+        count, peak = pool.apply(retain, (library,))
+        seconds = time.perf_counter() - start
+    print(f"{'memory':<10} peak RSS {peak / 1024:.1f} MiB for {count} sections")
+    return Measurement("memory", seconds, peak * 1024, count, "rec")
+
+benchmarks = {
+    "reader": benchReader,
+    "sections": benchSections,
+    "types": benchTypes,
+    "opcodes": benchOpcodes,
+    "relocs": benchRelocations,
+    "image": benchImage,
+    "memory": benchMemory,
+}
+
+if __name__ == "__main__":
+    config = {
+        "names": 256,
+        "types": 2000,
+        "symbols": 200,
+        "call-frames": 100,
+        "code": 256 * 1024,
+        "seed": 1,
+    }
+    repeat = 3
+    report = None
+    library = None
+    selected = list(benchmarks)
+    try:
+        options, values = getopt.getopt(sys.argv[1:], "hr:b:", ["help", "repeat=", "json=", "bench="] + [f"{key}=" for key in config])
+        for opt, val in options:
+            if opt in ("-h", "--help"):
+                print (f"Usage: benchmark.py [--help] [--repeat=] [--json=] [--bench={','.join(benchmarks)}]")
+                print ("                    [--names=] [--types=] [--symbols=] [--call-frames=] [--code=] [--seed=] [lib]")
+                exit()
+            elif opt in ("-r", "--repeat"):
+                repeat = int(val)
+            elif opt == "--json":
+                report = val
+            elif opt in ("-b", "--bench"):
+                selected = val.split(",")
+                unknown = [name for name in selected if name not in benchmarks]
+                if unknown:
+                    print ("Unknown benchmark:", ", ".join(unknown))
+                    print ("Benchmarks:", ", ".join(benchmarks))
+                    exit(1)
+            else:
+                config[opt[2:]] = int(val)
+        if len(values) > 1:
+            print ("Specify at most one library to benchmark!")
+            exit(1)
+        if len(values) == 1:
+            library = values[0]
+    except getopt.error as error:
+        print(error)
+        exit(1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        if library is None:
+            library = os.path.join(directory, "synthetic.lib")
+            with open(library, "wb") as fp:
+                fp.write(synthesize(config["names"], config["types"], config["symbols"],
+                                    config["call-frames"], config["code"], config["seed"]))
+            print ("Synthetic library:", ", ".join(f"{key}={value}" for key, value in config.items()))
+        print (f"Library size: {os.path.getsize(library)} bytes, best of {repeat}")
+
+        results = []
+        for name in selected:
+            result = benchmarks[name](library, repeat)
+            if name != "memory":
+                print(result)
+            results.append(result)
+
+    if report is not None:
+        with open(report, "w") as fp:
+            json.dump({
+                "config": config,
+                "results": {result.name: {
+                    "seconds": result.seconds,
+                    "bytes_per_second": result.bytes / result.seconds,
+                    "records_per_second": result.records / result.seconds,
+                    "bytes": result.bytes,
+                } for result in results},
+            }, fp, indent=2)
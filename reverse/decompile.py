@@ -1,91 +1,723 @@
 #!/usr/bin/env python3
 
+import os
 import sys
+import atexit
+import time
 import getopt
-from pprint import pprint
+from collections import Counter, deque
+from contextlib import redirect_stdout
 from iarlib.reader import Reader
-section_type = {}
-
-from iarlib.library import *
-section_type[Library.ID] = Library
-section_type[Auxillary.ID] = Auxillary
-section_type[Auxillary1.ID] = Auxillary1
-section_type[Version.ID] = Version
-section_type[End.ID] = End
-from iarlib.keyvalue import KeyValue
-section_type[KeyValue.ID] = KeyValue
-from iarlib.memoryinfo import MemoryInfo
-section_type[MemoryInfo.ID] = MemoryInfo
-from iarlib.attribute import Attribute
-section_type[Attribute.ID] = Attribute
-from iarlib.nametable import NameTable
-section_type[NameTable.ID] = NameTable
-from iarlib.pointertype import PointerType
-section_type[PointerType.ID] = PointerType
-from iarlib.type import Type
-section_type[Type.ID] = Type
-from iarlib.sizetype import SizeType
-section_type[SizeType.ID] = SizeType
-from iarlib.segment import Segment
-section_type[Segment.ID] = Segment
-from iarlib.callframe import CallFrame
-section_type[CallFrame.ID] = CallFrame
-from iarlib.symbol import Symbol, SourceCall
-section_type[Symbol.ID] = Symbol
-section_type[SourceCall.ID] = SourceCall
-from iarlib.instruction import *
-section_type[OrgRel.ID] = OrgRel
-section_type[AssemblyMode.ID] = AssemblyMode
-section_type[PushExt.ID] = PushExt
-section_type[DeleteTos.ID] = DeleteTos
-section_type[Abs8.ID] = Abs8
-section_type[Abs16.ID] = Abs16
-section_type[Pop8.ID] = Pop8
-section_type[PushRel.ID] = PushRel
-section_type[PushAbs.ID] = PushAbs
-section_type[PushPcr.ID] = PushPcr
-section_type[Minus.ID] = Minus
-section_type[Pop24.ID] = Pop24
-from iarlib.error import *
-section_type[StackError.ID] = StackError
-section_type[Check.ID] = Check
-section_type[Copy.ID] = Copy
-section_type[LSR.ID] = LSR
-
-try:
-    options, values = getopt.getopt(sys.argv[1:], "ho:v", ["help", "output="])
-    for opt, val in options:
-        if opt in ("-h", "--help"):
-            print ("Usage: decompile.py [--help] [--output=] <lib>")
-            exit()
-        elif opt in ("-o", "--output"):
-            print ("Output:", val)
+
+class Result:
+    def __str__(self):
+        if self.error is not None:
+            return f'FAIL {self.library} ({self.seconds:.2f}s): {self.error}'
+        return f'OK   {self.library} ({self.seconds:.2f}s): {self.sections} sections'
+    def __init__(self, library: str):
+        self.library = library
+        self.sections = 0
+        self.counts = Counter()
+        self.seconds = 0.0
+        self.error = None
+        self.profile = None
+
+# stdout is a pipe whose reader went away (| head). Later writes, and the
+# flush at exit, go to devnull so the exit stays quiet.
+def closedPipe() -> int:
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, sys.stdout.fileno())
+    return 1
+
+# Runs in a worker process, must never raise so one bad library
+# cannot take down the rest of the batch
+def process(library: str, cache: str = None, profile: bool = False, output: str = None) -> Result:
+    from iarlib.section import iter_sections
+    from iarlib.emitter import Emitter
+    result = Result(library)
+    if profile:
+        from iarlib.profile import Profiler
+        profiler = Profiler()
+        profiler.install()
+    start = time.perf_counter()
+    try:
+        if cache is not None:
+            from iarlib.cache import LibraryCache
+            parsed = LibraryCache(cache).parse(library)
+            result.counts = parsed.counts
+            if output is not None:
+                with Emitter(output) as emitter:
+                    emitter.write(parsed.sections)
         else:
-            print ("Unknown option: ", opt)
-            exit()
-    
-    if len(values) > 1 or len(values) == 0:
-        print ("Specify one library to process!")
-        exit()
-    print ("Processing: ", values)
-except getopt.error as error:
-    print(error)
+            emitter = Emitter(output) if output is not None else None
+            with open(os.devnull, "w") as null, redirect_stdout(null):
+                for section in iter_sections(library):
+                    result.counts[section.__class__.__name__] += 1
+                    if emitter is not None:
+                        emitter.emit(section)
+            if emitter is not None:
+                emitter.close()
+    except (Exception, SystemExit) as error:
+        result.error = f'{type(error).__name__}: {error}'
+    result.seconds = time.perf_counter() - start
+    if profile:
+        profiler.uninstall()
+        result.profile = profiler.report()
+    result.sections = sum(result.counts.values())
+    return result
 
-data = Reader(values[0])
+# Directories are searched recursively, anything with glob characters is expanded.
+# A build script naming one library never imports glob.
+def expand(values: list) -> list:
+    libraries = []
+    for value in values:
+        if os.path.isdir(value):
+            import glob
+            libraries += glob.glob(os.path.join(value, "**", "*.lib"), recursive=True)
+        elif any(char in value for char in "*?["):
+            import glob
+            libraries += glob.glob(value, recursive=True)
+        else:
+            libraries.append(value)
+    return sorted(set(libraries))
 
-sections = []
-while (data.valid()):
-    section_id = data.readU8()
-    if section_type.get(section_id) is not None:
-        sections.append(section_type[section_id](data))
-    elif section_id == 0xFF:
-        print("Successfully read file")
-        break
+# Listing path for each library under output, mirroring the directories
+# below the libraries' common parent so equal names do not collide
+def listings(libraries: list, output: str) -> dict:
+    if output is None:
+        return {library: None for library in libraries}
+    root = os.path.dirname(os.path.commonpath([os.path.abspath(library) for library in libraries]))
+    paths = {}
+    for library in libraries:
+        path = os.path.join(output, os.path.splitext(os.path.relpath(os.path.abspath(library), root))[0] + ".asm")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        paths[library] = path
+    return paths
+
+def batch(libraries: list, jobs: int, cache: str = None, profiler = None, output: str = None) -> bool:
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    try:
+        print(f"Processing {len(libraries)} libraries with {jobs} workers")
+        start = time.perf_counter()
+        results = []
+        paths = listings(libraries, output)
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {executor.submit(process, library, cache, profiler is not None, paths[library]): library for library in libraries}
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as error:
+                    # The worker itself died
+                    result = Result(futures[future])
+                    result.error = f'{type(error).__name__}: {error}'
+                print(result)
+                results.append(result)
+                if profiler is not None and result.profile is not None:
+                    profiler.merge(result.profile)
+
+        failed = [result for result in results if result.error is not None]
+        totals = Counter()
+        for result in results:
+            totals.update(result.counts)
+        print(f"\nSummary: {len(results) - len(failed)} ok, {len(failed)} failed, "
+              f"{sum(result.sections for result in results)} sections in {time.perf_counter() - start:.2f}s")
+        for name, count in totals.most_common():
+            print(f"\t{name}: {count}")
+        for result in sorted(failed, key=lambda result: result.library):
+            print(result)
+        sys.stdout.flush()
+        return len(failed) == 0
+    except BrokenPipeError:
+        closedPipe()
+        return False
+
+# decompile.py query: symbol lookups that only decode the symbol records
+def query(arguments: list) -> int:
+    from iarlib.index import SectionIndex
+    from iarlib.symbolindex import SymbolIndex
+    from iarlib.emitter import Emitter
+    name = None
+    segment = None
+    kind = None
+    code = False
+    output = None
+    try:
+        options, values = getopt.getopt(arguments, "hn:s:k:co:", ["help", "name=", "segment=", "kind=", "code", "output="])
+        for opt, val in options:
+            if opt in ("-h", "--help"):
+                print ("Usage: decompile.py query [--help] [--name=] [--segment=] [--kind=] [--code] [--output=] <lib|dir|glob>...")
+                print ("       --name accepts qualified (a::b) names and globs, --kind is one of")
+                print ("       PUBLIC_REL, EXTERNAL, FUNCTION, DATA, RELAY")
+                return 0
+            elif opt in ("-n", "--name"):
+                name = val
+            elif opt in ("-s", "--segment"):
+                segment = val
+            elif opt in ("-k", "--kind"):
+                kind = val
+            elif opt in ("-c", "--code"):
+                code = True
+            elif opt in ("-o", "--output"):
+                output = val
+        if len(values) == 0:
+            print ("Specify at least one library to query!")
+            return 1
+    except getopt.error as error:
+        print(error)
+        return 1
+
+    libraries = expand(values)
+    matches = 0
+    try:
+        with Emitter(output) as emitter:
+            for library in libraries:
+                try:
+                    symbols = SymbolIndex(SectionIndex(Reader(library)))
+                except LookupError as error:
+                    print(f'FAIL {library}: {error}', file=sys.stderr)
+                    continue
+                for symbol in symbols.query(name, segment, kind):
+                    matches += 1
+                    if len(libraries) > 1:
+                        print(f'{library}: ', end='')
+                    print(symbols.describe(symbol))
+                    if code:
+                        sys.stdout.flush()
+                        emitter.write(symbols.code(symbol))
+                        emitter.flush()
+            sys.stdout.flush()
+    except BrokenPipeError:
+        return closedPipe()
+    return 0 if matches else 1
+
+# decompile.py stack: worst case stack use per segment from the call graph
+def stack(arguments: list) -> int:
+    from iarlib.index import SectionIndex
+    from iarlib.callgraph import fromIndex, stack_names
+    every = False
+    chain = None
+    try:
+        options, values = getopt.getopt(arguments, "hac:", ["help", "all", "chain="])
+        for opt, val in options:
+            if opt in ("-h", "--help"):
+                print ("Usage: decompile.py stack [--help] [--all] [--chain=function] <lib>")
+                print ("       Lists functions nothing calls, or --all of them, with their worst case")
+                print ("       stack use per segment. --chain shows the deepest call chain of a function.")
+                print ("       Recursive functions and their callers are unbounded.")
+                return 0
+            elif opt in ("-a", "--all"):
+                every = True
+            elif opt in ("-c", "--chain"):
+                chain = val
+        if len(values) != 1:
+            print ("Specify one library to analyze!")
+            return 1
+    except getopt.error as error:
+        print(error)
+        return 1
+
+    try:
+        graph = fromIndex(SectionIndex(Reader(values[0])))
+        names = [stack_names.get(sno, f'SNO{sno}') for sno in graph.snos]
+        for cycle in graph.cycles():
+            print ("Recursion:", ", ".join(sorted(function.symbol.name or "?" for function in cycle)))
+        def shown(depth):
+            return "unbounded" if depth is None else depth
+
+        if chain is not None:
+            found = [function for function in graph.objects if function.symbol.name == chain]
+            if len(found) == 0:
+                print ("Function not found:", chain)
+                sys.stdout.flush()
+                return 1
+            for sno, name in zip(graph.snos, names):
+                print(f'{name}: {shown(graph.depth(found[0], sno))}')
+                for function in graph.chain(found[0], sno):
+                    print(f'\t{function.symbol.name}')
+            sys.stdout.flush()
+            return 0
+
+        functions = graph.objects if every else graph.roots()
+        print(f'{"function":<40}' + "".join(f'{name:>10}' for name in names))
+        for function in sorted(functions, key=lambda function: function.symbol.name or ""):
+            print(f'{function.symbol.name or "?":<40}' + "".join(f'{shown(graph.depth(function, sno)):>10}' for sno in graph.snos))
+        print(f'{"worst":<40}' + "".join(f'{shown(graph.worst(sno)):>10}' for sno in graph.snos))
+        sys.stdout.flush()
+        return 0
+    except BrokenPipeError:
+        return closedPipe()
+
+# decompile.py relocs: relocation expression shapes, resolved with --origin
+def relocs(arguments: list) -> int:
+    from iarlib.relocation import Relocations
+    from iarlib.instruction import PushRel
+    origin = None
+    try:
+        options, values = getopt.getopt(arguments, "ho:", ["help", "origin="])
+        for opt, val in options:
+            if opt in ("-h", "--help"):
+                print ("Usage: decompile.py relocs [--help] [--origin=] <lib>")
+                print ("       Lists each expression shape and how often it is used. --origin places")
+                print ("       the areas back to back from there and lists the checks that fail.")
+                return 0
+            elif opt in ("-o", "--origin"):
+                origin = int(val, 0)
+        if len(values) != 1:
+            print ("Specify one library!")
+            return 1
+    except getopt.error as error:
+        print(error)
+        return 1
+
+    try:
+        relocations = Relocations(values[0])
+    except LookupError as error:
+        print(f'FAIL {values[0]}: {error}', file=sys.stderr)
+        return 1
+    try:
+        for count, shape in relocations.summary():
+            print(f'{count:8} {shape}')
+        if origin is None:
+            sys.stdout.flush()
+            return 0
+        bases, externals = relocations.layout(origin)
+        _, failed = relocations.resolve(bases, externals)
+        for area, offset, message in failed:
+            print(f'{relocations.name(PushRel.ID, area.index)}+{offset:04X}: {message}')
+        print(f'{relocations.count} places, {len(failed)} failed checks')
+        sys.stdout.flush()
+        return 1 if failed else 0
+    except BrokenPipeError:
+        return closedPipe()
+
+# decompile.py image: disassembles a linked image from its vectors
+def image(arguments: list) -> int:
+    from iarlib.image import Image, readImage, vector_names, formats
+    base = 0
+    format = None
+    entries = []
+    vectors = len(vector_names)
+    stats = False
+    try:
+        options, values = getopt.getopt(arguments, "hb:e:v:sf:", ["help", "base=", "entry=", "vectors=", "stats", "format="])
+        for opt, val in options:
+            if opt in ("-h", "--help"):
+                print ("Usage: decompile.py image [--help] [--format=hex|bin] [--base=] [--entry=] [--vectors=] [--stats] <hex|bin>")
+                print ("       Follows control flow from reset, the first --vectors interrupt vectors and every")
+                print ("       --entry (comma separated flash addresses, e.g. banked code or jump tables).")
+                print ("       Flat binaries are loaded at --base, Intel HEX files where their records say.")
+                print ("       Without --format a file is Intel HEX when it starts with a valid record.")
+                return 0
+            elif opt in ("-b", "--base"):
+                base = int(val, 0)
+            elif opt in ("-e", "--entry"):
+                entries.extend(int(entry, 0) for entry in val.split(","))
+            elif opt in ("-v", "--vectors"):
+                vectors = int(val)
+            elif opt in ("-s", "--stats"):
+                stats = True
+            elif opt in ("-f", "--format"):
+                if val not in formats:
+                    print ("Unknown image format:", val)
+                    return 1
+                format = val
+        if len(values) != 1:
+            print ("Specify one image!")
+            return 1
+    except (getopt.error, ValueError) as error:
+        print(error)
+        return 1
+
+    try:
+        disassembly = Image(*readImage(values[0], base, format))
+    except (LookupError, OSError) as error:
+        print(f'FAIL {values[0]}: {error}', file=sys.stderr)
+        return 1
+    disassembly.discover(disassembly.vectors(vectors) + entries)
+    try:
+        if not stats:
+            for line in disassembly.listing():
+                print(line)
+        data = sum(stop - start for start, stop in disassembly.data())
+        print(f'; {disassembly.count} instructions, {len(disassembly.calls)} called, {data} bytes of data')
+        for at, reason in sorted(disassembly.problems):
+            print(f'; {at:04X}h: {reason}')
+        sys.stdout.flush()
+    except BrokenPipeError:
+        return closedPipe()
+    return 0
+
+# decompile.py link: cross library symbol resolution through a mapped index
+def link(arguments: list) -> int:
+    from iarlib.linkindex import build, LinkIndex
+    from iarlib.mapped import FormatError
+    path = None
+    jobs = os.cpu_count()
+    where = []
+    entries = []
+    unresolved = False
+    duplicates = False
+    try:
+        options, values = getopt.getopt(arguments, "hi:j:w:e:ud", ["help", "index=", "jobs=", "where=", "entry=", "unresolved", "duplicates"])
+        for opt, val in options:
+            if opt in ("-h", "--help"):
+                print ("Usage: decompile.py link [--help] --index= [--jobs=] [--where=] [--entry=] [--unresolved] [--duplicates] [<lib|dir|glob>...]")
+                print ("       Libraries given rebuild the index, otherwise the existing one is opened. Sorted")
+                print ("       path order is the link order, the first definition of a name wins.")
+                print ("       --where lists the definitions of a name, --entry the libraries a link from it pulls in.")
+                return 0
+            elif opt in ("-i", "--index"):
+                path = val
+            elif opt in ("-j", "--jobs"):
+                jobs = int(val)
+            elif opt in ("-w", "--where"):
+                where.append(val)
+            elif opt in ("-e", "--entry"):
+                entries.append(val)
+            elif opt in ("-u", "--unresolved"):
+                unresolved = True
+            elif opt in ("-d", "--duplicates"):
+                duplicates = True
+        if path is None:
+            print ("Specify the index file!")
+            return 1
+    except getopt.error as error:
+        print(error)
+        return 1
+
+    if values:
+        index = build(expand(values), path, jobs)
     else:
-        pprint(sections)
-        print(f"Unknown section ID: {section_id:02X}")
+        try:
+            index = LinkIndex(path)
+        except (OSError, FormatError) as error:
+            print(error)
+            return 1
+    try:
+        status = 0
+        with index:
+            for library in index.stale():
+                print(f'STALE {library}', file=sys.stderr)
+            for library, error in index.failed():
+                print(f'FAIL {library}: {error}', file=sys.stderr)
+            for name in where:
+                found = index.definitions(name)
+                if not found:
+                    status = 1
+                print(f'{name}: ' + (", ".join(f'{library} ({symbol:04X})' for library, symbol in found) or "undefined"))
+            for entry in entries:
+                pulled, missing = index.pull(entry)
+                print(f'{entry}: {len(pulled)} libraries')
+                for library in pulled:
+                    print(f'\t{library}')
+                for name in missing:
+                    print(f'\tunresolved {name}')
+                if missing:
+                    status = 1
+            if unresolved:
+                for name, libraries in sorted(index.unresolved().items()):
+                    print(f'unresolved {name}: {", ".join(libraries)}')
+            if duplicates:
+                for name, found in sorted(index.duplicates().items()):
+                    print(f'duplicate {name}: ' + ", ".join(f'{library} ({symbol:04X})' for library, symbol in found))
+            if not (where or entries or unresolved or duplicates):
+                print(f'{len(index.libraries)} libraries, {len(index.names)} names, {len(index.def_name)} definitions, '
+                      f'{len(index.unresolved())} unresolved, {len(index.duplicates())} duplicates')
+        sys.stdout.flush()
+        return status
+    except BrokenPipeError:
+        return closedPipe()
+
+# decompile.py meta: segment and symbol listings from the mapped metadata cache
+def meta(arguments: list) -> int:
+    from iarlib.cache import LibraryCache
+    cache = None
+    segments = False
+    symbols = False
+    try:
+        options, values = getopt.getopt(arguments, "hc:gs", ["help", "cache=", "segments", "symbols"])
+        for opt, val in options:
+            if opt in ("-h", "--help"):
+                print ("Usage: decompile.py meta [--help] [--cache=] [--segments] [--symbols] <lib|dir|glob>...")
+                print ("       Metadata is decoded once per library content and mapped from the cache after")
+                return 0
+            elif opt in ("-c", "--cache"):
+                cache = val
+            elif opt in ("-g", "--segments"):
+                segments = True
+            elif opt in ("-s", "--symbols"):
+                symbols = True
+        if len(values) == 0:
+            print ("Specify at least one library!")
+            return 1
+    except getopt.error as error:
+        print(error)
+        return 1
+
+    try:
+        cache = LibraryCache(cache)
+        status = 0
+        for library in expand(values):
+            try:
+                metadata = cache.metadata(library)
+            except LookupError as error:
+                print(f'FAIL {library}: {error}', file=sys.stderr)
+                status = 1
+                continue
+            with metadata:
+                if metadata.error is not None:
+                    print(f'FAIL {library}: {metadata.error}', file=sys.stderr)
+                    status = 1
+                if segments:
+                    print(f'{library}: {" ".join(metadata.segmentNames())}')
+                if symbols:
+                    for name, location, text in metadata.symbolTypes():
+                        print(f'{library}: {location:<10} {name} {text}')
+                if not (segments or symbols):
+                    print(f'{library}: {len(metadata.positions)} records, {len(metadata.segments)} segments, '
+                          f'{len(metadata.symbols)} symbols, {len(metadata.types)} types')
+        sys.stdout.flush()
+        return status
+    except BrokenPipeError:
+        return closedPipe()
+
+# decompile.py serve: keeps libraries decoded and answers queries on a socket
+def serve(arguments: list) -> int:
+    import asyncio
+    from iarlib.server import QueryServer, policies
+    path = None
+    policy = "lazy"
+    interval = 1.0
+    try:
+        options, values = getopt.getopt(arguments, "hS:r:i:", ["help", "socket=", "reload=", "interval="])
+        for opt, val in options:
+            if opt in ("-h", "--help"):
+                print ("Usage: decompile.py serve [--help] --socket= [--reload=eager|lazy|off] [--interval=] [<lib|dir|glob>...]")
+                print ("       Libraries given are decoded up front, others on their first query. Changed")
+                print ("       libraries are decoded again right away (eager), on the next query (lazy) or never.")
+                print ("       See iarlib/server.py for the requests, decompile.py ask sends one.")
+                return 0
+            elif opt in ("-S", "--socket"):
+                path = val
+            elif opt in ("-r", "--reload"):
+                policy = val
+            elif opt in ("-i", "--interval"):
+                interval = float(val)
+        if path is None:
+            print ("Specify the socket!")
+            return 1
+        if policy not in policies:
+            print ("Unknown reload policy:", policy)
+            return 1
+    except getopt.error as error:
+        print(error)
+        return 1
+
+    try:
+        asyncio.run(QueryServer(path, policy, interval).serve(expand(values)))
+    except OSError as error:
+        print(error)
+        return 1
+    return 0
+
+# decompile.py ask: one request to a running daemon, fields as key=value
+def ask(arguments: list) -> int:
+    import json
+    from iarlib.client import ask as request
+    path = None
+    try:
+        options, values = getopt.getopt(arguments, "hS:", ["help", "socket="])
+        for opt, val in options:
+            if opt in ("-h", "--help"):
+                print ("Usage: decompile.py ask [--help] --socket= <op> [key=value...]")
+                print ("       e.g. decompile.py ask --socket=iar.sock symbols library=hci.lib name='HCI_*'")
+                return 0
+            elif opt in ("-S", "--socket"):
+                path = val
+        if path is None or len(values) == 0:
+            print ("Specify the socket and an op!")
+            return 1
+    except getopt.error as error:
+        print(error)
+        return 1
+
+    fields = {"op": values[0]}
+    for value in values[1:]:
+        key, _, field = value.partition("=")
+        fields[key] = field
+    try:
+        response = request(path, fields)
+    except OSError as error:
+        print(error)
+        return 1
+    if not response["ok"]:
+        print(response["error"])
+        return 1
+    try:
+        print(json.dumps(response["result"], indent=1))
+        sys.stdout.flush()
+    except BrokenPipeError:
+        return closedPipe()
+    return 0
+
+# decompile.py diff: checks the decoder against a librarian listing
+def diff(arguments: list) -> int:
+    from iarlib import listing
+    limit = 100
+    try:
+        options, values = getopt.getopt(arguments, "hl:", ["help", "limit="])
+        for opt, val in options:
+            if opt in ("-h", "--help"):
+                print ("Usage: decompile.py diff [--help] [--limit=] <listing> <lib|listing>")
+                print ("       Compares records one by one, listings are from list-object-code")
+                return 0
+            elif opt in ("-l", "--limit"):
+                limit = int(val)
+        if len(values) != 2:
+            print ("Specify a listing and a library or listing to compare it with!")
+            return 1
+    except getopt.error as error:
+        print(error)
+        return 1
+
+    def load(path: str):
+        if path.endswith(".lib"):
+            return listing.binaryRecords(path)
+        return listing.records(path)
+
+    try:
+        differences = listing.diff(load(values[0]), load(values[1]), limit)
+        for index, expected, actual in differences:
+            print(f'{index:6}: {expected}')
+            print(f'{"":6}  {actual}')
+        print(f'{len(differences)}{"+" if len(differences) == limit else ""} differences')
+        sys.stdout.flush()
+        return 1 if differences else 0
+    except BrokenPipeError:
+        return closedPipe()
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "diff":
+        exit(diff(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "query":
+        exit(query(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "stack":
+        exit(stack(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "relocs":
+        exit(relocs(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "link":
+        exit(link(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "meta":
+        exit(meta(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "image":
+        exit(image(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        exit(serve(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "ask":
+        exit(ask(sys.argv[2:]))
+
+    jobs = os.cpu_count()
+    symbol = None
+    cache = None
+    profile = None
+    output = None
+    try:
+        options, values = getopt.getopt(sys.argv[1:], "ho:j:s:c:p:v", ["help", "output=", "jobs=", "symbol=", "cache=", "profile="])
+        for opt, val in options:
+            if opt in ("-h", "--help"):
+                print ("Usage: decompile.py [--help] [--output=] [--jobs=] [--symbol=] [--cache=] [--profile=] <lib|dir|glob>...")
+                print ("       decompile.py query --help")
+                print ("       decompile.py stack --help")
+                print ("       decompile.py relocs --help")
+                print ("       decompile.py link --help")
+                print ("       decompile.py meta --help")
+                print ("       decompile.py image --help")
+                print ("       decompile.py serve --help")
+                print ("       decompile.py ask --help")
+                print ("       decompile.py diff --help")
+                exit()
+            elif opt in ("-o", "--output"):
+                output = val
+            elif opt in ("-j", "--jobs"):
+                jobs = int(val)
+            elif opt in ("-s", "--symbol"):
+                symbol = val
+            elif opt in ("-c", "--cache"):
+                cache = val
+            elif opt in ("-p", "--profile"):
+                profile = val
+            else:
+                print ("Unknown option: ", opt)
+                exit()
+        
+        if len(values) == 0:
+            print ("Specify at least one library to process!")
+            exit()
+    except getopt.error as error:
+        print(error)
+        exit(1)
+
+    libraries = expand(values)
+    if len(libraries) == 0:
+        print ("No libraries found in", values)
         exit(1)
 
+    # Decoders are only swapped for timed ones when asked to
+    profiler = None
+    if profile is not None:
+        from iarlib.profile import Profiler
+        profiler = Profiler()
+        # Also written when decoding fails part way
+        def report():
+            profiler.uninstall()
+            profiler.write(profile)
+            print(profiler.summary(), file=sys.stderr)
+        atexit.register(report)
+
+    if len(libraries) > 1 or libraries != values:
+        exit(0 if batch(libraries, jobs, cache, profiler, output) else 1)
+
+    if profiler is not None:
+        profiler.install()
 
+    from iarlib.section import iter_sections
+    from iarlib.index import SectionIndex
+    from iarlib.emitter import Emitter
+    print ("Processing: ", values)
+    emitter = Emitter(output)
+    atexit.register(emitter.close)
+    if symbol is not None:
+        # Only decode what the symbol needs
+        index = SectionIndex(Reader(values[0]))
+        if index.error is not None:
+            print(index.error)
+        found = index.symbol(symbol)
+        if found is None:
+            print ("Symbol not found:", symbol)
+            exit(1)
+        try:
+            print(found)
+            emitter.write(index.code(found.index))
+            emitter.flush()
+        except BrokenPipeError:
+            exit(closedPipe())
+        exit()
+
+    # Only the last few sections are kept to show where decoding failed
+    recent = deque(maxlen=16)
+    try:
+        for section in iter_sections(values[0]):
+            recent.append(section)
+            emitter.emit(section)
+        emitter.flush()
+        print("Successfully read file")
+    except BrokenPipeError:
+        exit(closedPipe())
+    except LookupError as error:
+        emitter.flush()
+        from pprint import pprint
+        pprint(list(recent))
+        print(error)
+        exit(1)
 
-print("Exiting...")
\ No newline at end of file
+    print("Exiting...")
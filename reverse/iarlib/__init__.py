@@ -0,0 +1,5 @@
+# The decoders register when iarlib.section is imported, which only
+# happens once something is decoded
+def iter_sections(library: str, context=None):
+    from iarlib.section import iter_sections
+    return iter_sections(library, context)
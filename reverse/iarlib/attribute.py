@@ -1,13 +1,20 @@
 from iarlib.reader import Reader
+from iarlib.dispatch import register
 
 types = {
     1: "function",
 }
 
+@register
 class Attribute:
+    __slots__ = ("type", "name")
     ID = 0xD3
     def __init__(self, data: Reader):
         data.readU16() # Size
         self.type = types.get(data.readU8())
         data.readU8() # Index
         self.name = data.readString()
+    def scan(data: Reader):
+        data.skip(4)
+        data.skipString()
+        return ()
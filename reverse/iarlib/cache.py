@@ -0,0 +1,172 @@
+import io
+import os
+import glob
+import zlib
+import pickle
+import hashlib
+from collections import Counter
+from contextlib import redirect_stdout
+from iarlib.context import ParseContext
+from iarlib import iter_sections
+
+# Context tables whose entries sections refer to
+shared_tables = (
+    "type_map",
+    "segment_map",
+    "meminfo_map",
+    "relocatable_table",
+    "external_table",
+    "function_table",
+)
+
+# Pickles sections with references into the context stored as (table, key)
+class SectionPickler(pickle.Pickler):
+    def __init__(self, file, context: ParseContext):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.shared = {}
+        for table in shared_tables:
+            for key, value in getattr(context, table).entries():
+                self.shared[id(value)] = (table, key)
+
+    def persistent_id(self, obj):
+        return self.shared.get(id(obj))
+
+class SectionUnpickler(pickle.Unpickler):
+    def __init__(self, file, context: ParseContext):
+        super().__init__(file)
+        self.context = context
+
+    def persistent_load(self, pid):
+        table, key = pid
+        return getattr(self.context, table).peek(key)
+
+# Everything decoded from one library. The sections are kept as a separate
+# compressed blob and only unpickled when first used, so callers that only
+# need the context tables or the record counts never pay for them.
+class ParsedLibrary:
+    def __init__(self, library: str, context: ParseContext, sections: list):
+        self.library = library
+        self.context = context
+        self.counts = Counter(section.__class__.__name__ for section in sections)
+        self.blob = None
+        self.loaded = sections
+
+    @property
+    def sections(self) -> list:
+        if self.loaded is None:
+            self.loaded = SectionUnpickler(io.BytesIO(zlib.decompress(self.blob)), self.context).load()
+        return self.loaded
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        if state["blob"] is None:
+            blob = io.BytesIO()
+            SectionPickler(blob, self.context).dump(self.loaded)
+            state["blob"] = zlib.compress(blob.getvalue())
+        state["loaded"] = None
+        return state
+
+# The parser version is a digest of the iarlib sources, so editing any
+# decoder invalidates entries made by the old one without a manual bump
+def parserVersion() -> str:
+    digest = hashlib.sha256()
+    for source in sorted(glob.glob(os.path.join(os.path.dirname(__file__), "*.py"))):
+        with open(source, "rb") as fp:
+            digest.update(fp.read())
+    return digest.hexdigest()[:16]
+
+def defaultDirectory() -> str:
+    if "IARLIB_CACHE" in os.environ:
+        return os.environ["IARLIB_CACHE"]
+    base = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(base, "iarlib")
+
+# On disk cache of parsed libraries, keyed on the library content and the
+# parser version. Entries are zlib compressed pickles, the least recently
+# used ones are removed once the directory grows past limit bytes.
+class LibraryCache:
+    def __init__(self, directory: str = None, limit: int = 512 * 1024 * 1024):
+        self.directory = directory if directory is not None else defaultDirectory()
+        self.limit = limit
+        self.version = parserVersion()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, library: str) -> str:
+        digest = hashlib.sha256(self.version.encode())
+        with open(library, "rb") as fp:
+            digest.update(hashlib.file_digest(fp, "sha256").digest())
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".iarc")
+
+    def load(self, library: str, key: str = None) -> ParsedLibrary:
+        path = self.path(key if key is not None else self.key(library))
+        try:
+            with open(path, "rb") as fp:
+                parsed = pickle.loads(zlib.decompress(fp.read()))
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Truncated or written by an incompatible interpreter
+            os.remove(path)
+            return None
+        os.utime(path)
+        parsed.library = library
+        return parsed
+
+    def store(self, parsed: ParsedLibrary, key: str = None):
+        path = self.path(key if key is not None else self.key(parsed.library))
+        # Write then rename so concurrent workers never see half an entry
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as fp:
+            fp.write(zlib.compress(pickle.dumps(parsed, pickle.HIGHEST_PROTOCOL)))
+        os.replace(temporary, path)
+        self.evict()
+
+    def parse(self, library: str) -> ParsedLibrary:
+        key = self.key(library)
+        parsed = self.load(library, key)
+        if parsed is None:
+            context = ParseContext()
+            with open(os.devnull, "w") as null, redirect_stdout(null):
+                sections = list(iter_sections(library, context))
+            parsed = ParsedLibrary(library, context, sections)
+            self.store(parsed, key)
+        return parsed
+
+    # Mapped metadata of library (see metadata.py), kept next to the parse
+    # results under the same key and limit
+    def metadata(self, library: str):
+        from iarlib.metadata import Metadata, build
+        from iarlib.mapped import FormatError
+        path = os.path.join(self.directory, self.key(library) + ".iarm")
+        try:
+            metadata = Metadata(path, library)
+            os.utime(path)
+            return metadata
+        except FileNotFoundError:
+            pass
+        except FormatError:
+            os.remove(path)
+        build(library, path, self.version)
+        self.evict()
+        return Metadata(path, library)
+
+    def evict(self):
+        entries = []
+        for path in glob.glob(os.path.join(self.directory, "*.iarc")) + glob.glob(os.path.join(self.directory, "*.iarm")):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.limit:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -1,7 +1,9 @@
 from iarlib.reader import Reader, BytesReader
 from iarlib.callframeinstruction import CallFrameInstruction
+from iarlib.dispatch import register
 
 class StackOnColumn:
+    __slots__ = ("column", "type")
     def __repr__(self):
         return f'stack based on column {self.column}'
     def __init__(self, bytes: BytesReader):
@@ -9,12 +11,14 @@ class StackOnColumn:
         self.type = bytes.parseU8()
 
 class StaticOverlay:
+    __slots__ = ("name",)
     def __repr__(self):
         return f'static overlay frame in segment "{self.name}"'
     def __init__(self, bytes: BytesReader):
         self.name = bytes.parseString()
 
 class BaseAddress:
+    __slots__ = ()
     # "base address in segment type {type}"
     def __init__(self, bytes: BytesReader):
         print("Base Address frame type not yet implemented")
@@ -27,6 +31,7 @@ frame_type_map = {
 }
 
 class Names1:
+    __slots__ = ("id", "fmtver", "frames", "virtual_columns", "columns", "column_components")
     def __init__(self, bytes: BytesReader):
         self.id = bytes.parseU8()
         self.fmtver = bytes.parseU8()
@@ -66,6 +71,7 @@ class Names1:
             component_count = bytes.parseU8()
 
 class Common:
+    __slots__ = ("id", "version", "name", "code_align", "data_align", "return_address", "names_index", "instructions")
     def __init__(self, bytes: BytesReader):
         self.id = bytes.parseU8()
         self.version = bytes.parseU8()
@@ -81,6 +87,7 @@ class Common:
             self.instructions.append(CallFrameInstruction(bytes))
         
 class Data:
+    __slots__ = ("common", "tot")
     def __init__(self, bytes: BytesReader):
         self.common = bytes.parseU8()
         self.tot = bytes.parseU8()
@@ -95,9 +102,14 @@ type_map = {
     # 0x07: CommonE,
 }
 
+@register
 class CallFrame:
+    __slots__ = ("sub",)
     ID = 0xD4
     def __init__(self, data: Reader):
         byte_count = data.readDynamic()
         bytes = data.read(byte_count)
-        self.sub = type_map[bytes.parseU8()](bytes)
\ No newline at end of file
+        self.sub = type_map[bytes.parseU8()](bytes)
+    def scan(data: Reader):
+        data.skip(data.readDynamic())
+        return ()
\ No newline at end of file
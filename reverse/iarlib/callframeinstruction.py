@@ -1,30 +1,36 @@
 from iarlib.reader import BytesReader
 
 class Offset:
+    __slots__ = ("column", "offset")
     def __init__(self, column, data: BytesReader):
         self.column = column
         self.offset = data.parseU8()
 
 class Undefined:
+    __slots__ = ("column",)
     def __init__(self, data: BytesReader):
         self.column = data.parseU8()
 
 class SameValue:
+    __slots__ = ("column",)
     def __init__(self, data: BytesReader):
         self.column = data.parseU8()
 
 class DefaultCallFrameAddress:
+    __slots__ = ("column", "offset")
     def __init__(self, data: BytesReader):
         self.column = data.parseU8()
         self.offset = data.parseU8()
 
 class IAR_DefaultCallFrameAddressInstruction:
+    __slots__ = ("column", "offset")
     def __init__(self, data: BytesReader):
         data.parseU8() # Unknown
         self.column = data.parseU8()
         self.offset = data.parseU8()
 
 class IAR_DefaultCallFrameAddressInstructionStaticOverlay:
+    __slots__ = ("frame",)
     def __init__(self, data: BytesReader):
         self.frame = data.parseU8()
 
@@ -64,6 +70,7 @@ call_frame_instruction_map = {
 }
 
 class CallFrameInstruction:
+    __slots__ = ("instruction",)
     def __repr__(self):
         return f'{self.instruction}'
     def __init__(self, data: BytesReader):
@@ -0,0 +1,201 @@
+from array import array
+from iarlib.index import SectionIndex
+from iarlib.symbol import SourceCall
+
+# FrameSize.SNO to the stack segment it counts, as listed by NAMES1
+stack_names = {
+    0x01: "ISTACK",
+    0x02: "PSTACK",
+    0x03: "XSTACK",
+    0x04: "IOVERLAY",
+    0x05: "DOVERLAY",
+}
+
+# Largest size per SNO over count records, a dict {SNO: size}
+def frameSizes(counts: list) -> dict:
+    sizes = {}
+    for count in counts:
+        for frame in count.frame_sizes:
+            if frame.size > sizes.get(frame.SNO, 0):
+                sizes[frame.SNO] = frame.size
+    return sizes
+
+# Call graph of one library in compressed sparse row form. Node n is the
+# function with F-INDEX functions[n]; its calls are the edges
+# edge_start[n]:edge_start[n + 1], edge_target holding callee nodes.
+# frame[sno][n] is the function's own frame and site[sno][e] the stack in
+# use at call e. A call chain uses the frame of its last function plus the
+# site size of every call on the way, so
+#   depth(n) = max(frame(n), max(site(e) + depth(callee(e))))
+# Recursive functions (strongly connected components with a cycle) and
+# everything that can call them have no bound and no depth.
+class CallGraph:
+    def __init__(self, functions: dict, calls: list):
+        self.functions = sorted(functions)
+        self.nodes = {index: node for node, index in enumerate(self.functions)}
+        self.objects = [functions[index] for index in self.functions]
+        self.snos = set()
+        sizes = [frameSizes(function.counts) for function in self.objects]
+        edges = [[] for _ in self.functions]
+        for call in calls:
+            if call.caller is None or call.callee is None:
+                continue
+            edges[self.nodes[call.caller.func_index]].append((self.nodes[call.callee.func_index], frameSizes(call.counts)))
+
+        for function in sizes:
+            self.snos.update(function)
+        for _, site in (edge for node in edges for edge in node):
+            self.snos.update(site)
+        self.snos = sorted(self.snos)
+
+        self.edge_start = array("I", [0])
+        self.edge_target = array("I")
+        self.frame = {sno: array("I", (function.get(sno, 0) for function in sizes)) for sno in self.snos}
+        self.site = {sno: array("I") for sno in self.snos}
+        for node in edges:
+            for target, site in node:
+                self.edge_target.append(target)
+                for sno in self.snos:
+                    self.site[sno].append(site.get(sno, 0))
+            self.edge_start.append(len(self.edge_target))
+
+        self.depths = {}
+        # Nodes of every recursive component
+        self.recursion = []
+        # Per node, 1 in a recursive component, 1 when it can reach one
+        self.recursive = bytearray(len(self.functions))
+        self.unbounded = bytearray(len(self.functions))
+        self.walk()
+
+    def callees(self, node: int):
+        return self.edge_target[self.edge_start[node]:self.edge_start[node + 1]]
+
+    # Strongly connected components (Tarjan, iterative), each as a list of
+    # nodes. Components come out callees first.
+    def components(self) -> list:
+        count = len(self.functions)
+        edge_start = self.edge_start
+        edge_target = self.edge_target
+        order = array("i", [-1]) * count
+        low = array("i", [0]) * count
+        on_stack = bytearray(count)
+        stack = []
+        ret = []
+        counter = 0
+        for root in range(count):
+            if order[root] != -1:
+                continue
+            order[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = 1
+            path = [root]
+            next_edge = [edge_start[root]]
+            while path:
+                node = path[-1]
+                edge = next_edge[-1]
+                if edge < edge_start[node + 1]:
+                    next_edge[-1] = edge + 1
+                    target = edge_target[edge]
+                    if order[target] == -1:
+                        order[target] = low[target] = counter
+                        counter += 1
+                        stack.append(target)
+                        on_stack[target] = 1
+                        path.append(target)
+                        next_edge.append(edge_start[target])
+                    elif on_stack[target] and order[target] < low[node]:
+                        low[node] = order[target]
+                    continue
+                path.pop()
+                next_edge.pop()
+                if path and low[node] < low[path[-1]]:
+                    low[path[-1]] = low[node]
+                if low[node] == order[node]:
+                    members = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = 0
+                        members.append(member)
+                        if member == node:
+                            break
+                    ret.append(members)
+        return ret
+
+    # One pass over the components, callees first, so every callee is final
+    # before its callers
+    def walk(self):
+        count = len(self.functions)
+        depths = {sno: array("I", bytes(4 * count)) for sno in self.snos}
+        recursive = self.recursive
+        unbounded = self.unbounded
+        for members in self.components():
+            node = members[0]
+            if len(members) > 1 or node in self.callees(node):
+                self.recursion.append(members)
+                for member in members:
+                    recursive[member] = 1
+                    unbounded[member] = 1
+                continue
+            if any(unbounded[target] for target in self.callees(node)):
+                unbounded[node] = 1
+                continue
+            for sno in self.snos:
+                site = self.site[sno]
+                depth = depths[sno]
+                worst = self.frame[sno][node]
+                for edge in range(self.edge_start[node], self.edge_start[node + 1]):
+                    worst = max(worst, site[edge] + depth[self.edge_target[edge]])
+                depth[node] = worst
+        self.depths = depths
+
+    # None when the function is or can call something recursive
+    def depth(self, function, sno: int) -> int:
+        node = self.nodes[function.func_index]
+        return None if self.unbounded[node] else self.depths[sno][node]
+
+    # Deepest of the library, None when anything is unbounded
+    def worst(self, sno: int) -> int:
+        if any(self.unbounded):
+            return None
+        return max(self.depths[sno], default=0)
+
+    # Deepest chain starting at function for one segment. From an unbounded
+    # function it is the way into the recursion, ending in it.
+    def chain(self, function, sno: int) -> list:
+        node = self.nodes[function.func_index]
+        ret = [self.objects[node]]
+        while not self.recursive[node]:
+            best = None
+            for edge in range(self.edge_start[node], self.edge_start[node + 1]):
+                target = self.edge_target[edge]
+                if self.unbounded[node]:
+                    if self.unbounded[target]:
+                        best = target
+                        break
+                elif self.depths[sno][node] != self.frame[sno][node] and \
+                        self.site[sno][edge] + self.depths[sno][target] == self.depths[sno][node]:
+                    best = target
+                    break
+            if best is None:
+                break
+            node = best
+            ret.append(self.objects[node])
+        return ret
+
+    # Functions nothing in the library calls
+    def roots(self) -> list:
+        called = set(self.edge_target)
+        return [self.objects[node] for node in range(len(self.functions)) if node not in called]
+
+    def cycles(self) -> list:
+        return [[self.objects[node] for node in cycle] for cycle in self.recursion]
+
+# Builds the graph decoding only SourceCall records and the symbols they name
+def fromIndex(index: SectionIndex) -> CallGraph:
+    calls = [index.decode(record) for record in index.find(SourceCall.ID)]
+    context = index.data.context
+    # Also functions that make or take no call
+    for key in [key for table, key in index.keys if table == "function_table"]:
+        context.function_table.get(key)
+    return CallGraph(dict(context.function_table.entries()), calls)
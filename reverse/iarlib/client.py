@@ -0,0 +1,15 @@
+import json
+import socket
+
+# Blocking client for scripts, one request per connection. Kept apart from
+# server.py so asking does not load any decoder.
+def ask(path: str, request: dict, timeout: float = 300) -> dict:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(timeout)
+        connection.connect(path)
+        connection.sendall(json.dumps(request).encode() + b"\n")
+        with connection.makefile("rb") as fp:
+            line = fp.readline()
+    if not line:
+        raise ConnectionError("The daemon closed the connection")
+    return json.loads(line)
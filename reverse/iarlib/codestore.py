@@ -0,0 +1,162 @@
+from array import array
+from bisect import bisect_right
+from iarlib.reader import Reader, DecodeError
+from iarlib.context import ParseContext
+from iarlib.section import section_type
+from iarlib.instruction import Abs8, Abs16, OrgRel
+from iarlib.opcode import OpCode, opcode_table, opcode_length, Mnemonic, LCALL, ACALL
+
+# Operand kinds
+ABSOLUTE = 0
+REFERENCE = 1 # value indexes the symbol side table
+
+# Instructions placed by one OrgRel, stored as parallel columns instead of
+# Abs8/OpCode/Mnemonic/operand objects. Operands of instruction i are
+# operand_* [first[i]:first[i + 1]], in encoding stream order. Text is only
+# rendered when asked for.
+class CodeStore:
+    __slots__ = ("area", "origin", "offset", "opcode", "length", "first",
+        "operand_kind", "operand_value", "operand_offset", "refs", "ref_ids", "end")
+
+    def __len__(self):
+        return len(self.opcode)
+
+    def __init__(self, area, origin: int = 0):
+        self.area = area
+        self.origin = origin
+        self.offset = array("I")
+        self.opcode = bytearray()
+        self.length = bytearray()
+        self.first = array("I", [0])
+        self.operand_kind = bytearray()
+        self.operand_value = array("q")
+        self.operand_offset = array("I")
+        self.refs = []
+        self.ref_ids = {}
+        self.end = origin
+
+    def ref(self, target) -> int:
+        index = self.ref_ids.get(id(target))
+        if index is None:
+            index = len(self.refs)
+            self.ref_ids[id(target)] = index
+            self.refs.append(target)
+        return index
+
+    # Decodes one instruction, the reader is just past the Abs8 tag
+    def append(self, data: Reader):
+        op = data.readU8()
+        encoding = opcode_table[op]
+        self.offset.append(self.end)
+        self.opcode.append(op)
+        self.length.append(opcode_length[op])
+        for _, operand in encoding.operands:
+            # The operand object only lives long enough to be split into columns
+            decoded = operand(data)
+            value = decoded.value
+            if type(value) == int:
+                self.operand_kind.append(ABSOLUTE)
+                self.operand_value.append(value)
+            else:
+                self.operand_kind.append(REFERENCE)
+                self.operand_value.append(self.ref(value))
+            self.operand_offset.append(getattr(decoded, "offset", 0))
+        self.first.append(len(self.operand_kind))
+        self.end += opcode_length[op]
+
+    # Data placed between instructions still moves the location counter
+    def skip(self, count: int):
+        self.end += count
+
+    def operands(self, index: int) -> list:
+        ret = []
+        for operand in range(self.first[index], self.first[index + 1]):
+            value = self.operand_value[operand]
+            if self.operand_kind[operand] == REFERENCE:
+                value = self.refs[value]
+            ret.append((value, self.operand_offset[operand]))
+        return ret
+
+    # Rebuilds the objects the regular decoder would have made for index
+    def instruction(self, index: int) -> OpCode:
+        encoding = opcode_table[self.opcode[index]]
+        mnemonic = Mnemonic.__new__(encoding.mnemonic)
+        mnemonic.params = list(encoding.params)
+        for (param, cls), (value, offset) in zip(encoding.operands, self.operands(index)):
+            operand = cls.__new__(cls)
+            operand.value = value
+            if "offset" in cls.__slots__:
+                operand.offset = offset
+            mnemonic.params[param] = operand
+        opcode = OpCode.__new__(OpCode)
+        opcode.op = mnemonic
+        return opcode
+
+    def text(self, index: int) -> str:
+        return repr(self.instruction(index))
+
+    def lines(self):
+        for index in range(len(self.opcode)):
+            yield self.text(index)
+
+    # Indices of instructions with one of mnemonics whose operands refer to target
+    def find(self, mnemonics: tuple, target=None) -> list:
+        opcodes = set(op for op, encoding in enumerate(opcode_table) if encoding.mnemonic in mnemonics)
+        if target is None:
+            return [index for index, op in enumerate(self.opcode) if op in opcodes]
+        ref = self.ref_ids.get(id(target))
+        if ref is None:
+            return []
+        ret = []
+        operand = -1
+        while True:
+            # array.index does the scan in C, absolute values equal to ref are filtered after
+            try:
+                operand = self.operand_value.index(ref, operand + 1)
+            except ValueError:
+                return ret
+            if self.operand_kind[operand] == REFERENCE:
+                index = bisect_right(self.first, operand) - 1
+                if self.opcode[index] in opcodes and (not ret or ret[-1] != index):
+                    ret.append(index)
+
+    def nbytes(self) -> int:
+        columns = (self.offset, self.opcode, self.length, self.first,
+            self.operand_kind, self.operand_value, self.operand_offset)
+        return sum(memoryview(column).nbytes for column in columns)
+
+# Decodes a library with every instruction going into the CodeStore of the
+# OrgRel that placed it. Other records are decoded as usual for the context
+# tables and then dropped.
+def load(library: str, context: ParseContext = None) -> list:
+    data = Reader(library, context)
+    stores = []
+    store = None
+    while data.valid():
+        section_id = data.readU8()
+        if section_id == Abs8.ID:
+            if store is None:
+                store = CodeStore(None)
+                stores.append(store)
+            store.append(data)
+            continue
+        elif section_id == 0xFF:
+            break
+        section = section_type[section_id]
+        if section is None:
+            raise DecodeError(f"Unknown section ID: {section_id:02X}", data.position() - 1)
+        section = section(data)
+        if isinstance(section, OrgRel):
+            store = CodeStore(section.value, section.offset)
+            stores.append(store)
+        elif isinstance(section, Abs16) and store is not None:
+            store.skip(Abs16.SIZE)
+    return stores
+
+# Every call to target across stores, as (store, instruction index)
+def calls(stores: list, target) -> list:
+    ret = []
+    for store in stores:
+        for index in store.find((LCALL, ACALL), target):
+            ret.append((store, index))
+    return ret
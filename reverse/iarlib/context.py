@@ -0,0 +1,74 @@
+# Lookup table that can ask the context to decode a missing entry on demand
+class Table(dict):
+    def __init__(self, context, name: str):
+        self.context = context
+        self.name = name
+
+    def get(self, key, default=None):
+        value = dict.get(self, key)
+        if value is None and self.context.loader is not None:
+            value = self.context.loader(self.name, key)
+        return default if value is None else value
+
+    # Lookups that never decode
+    def peek(self, key):
+        return dict.get(self, key)
+
+    def entries(self):
+        return dict.items(self)
+
+# Table for small dense integer keys, a list indexed by the key with None
+# in the holes. Lookups are an index instead of a hash. The list only grows
+# to a small multiple of the entries it holds, keys past that go to a dict,
+# so one corrupt key cannot allocate a list of millions of holes.
+class DenseTable(list):
+    SLACK = 1024
+
+    def __init__(self, context, name: str, initial: dict = {}):
+        self.context = context
+        self.name = name
+        self.filled = 0
+        self.sparse = {}
+        for key, value in initial.items():
+            self[key] = value
+
+    def __setitem__(self, key: int, value):
+        if key >= len(self):
+            if key >= 4 * self.filled + self.SLACK:
+                self.sparse[key] = value
+                return
+            self.extend([None] * (key + 1 - len(self)))
+        if list.__getitem__(self, key) is None:
+            self.filled += 1
+        list.__setitem__(self, key, value)
+
+    def peek(self, key: int):
+        return list.__getitem__(self, key) if key < len(self) else self.sparse.get(key)
+
+    def get(self, key: int, default=None):
+        value = self.peek(key)
+        if value is None and self.context.loader is not None:
+            value = self.context.loader(self.name, key)
+        return default if value is None else value
+
+    def entries(self):
+        yield from ((key, value) for key, value in enumerate(self) if value is not None)
+        yield from self.sparse.items()
+
+# Tables filled in while decoding one library. Every Reader carries its own
+# context so several libraries can be decoded in the same process.
+class ParseContext:
+    def __init__(self):
+        # Set by SectionIndex to decode entries lazily, see Table
+        self.loader = None
+        self.names = Table(self, "names")
+        # Intrinsic types are entries like any other, type.py imports the
+        # reader which imports this module so they are fetched here
+        from iarlib.type import intrinsic_map
+        self.type_map = DenseTable(self, "type_map", intrinsic_map)
+        self.segment_map = Table(self, "segment_map")
+        self.meminfo_map = Table(self, "meminfo_map")
+        self.key_values = {}
+        self.relocatable_table = Table(self, "relocatable_table")
+        self.external_table = Table(self, "external_table")
+        self.function_table = Table(self, "function_table")
@@ -0,0 +1,24 @@
+# Top level record decoders by ID byte, one slot for every possible ID with
+# None for unknown ones (and the 0xFF terminator). Decoding a record is an
+# index into a list instead of a hash lookup.
+class SectionTable(list):
+    def __init__(self):
+        list.__init__(self, [None] * 256)
+
+    def get(self, section_id: int, default=None):
+        section = self[section_id]
+        return default if section is None else section
+
+    def entries(self):
+        return ((section_id, section) for section_id, section in enumerate(self) if section is not None)
+
+section_type = SectionTable()
+
+# Class decorator filling the slot of cls.ID, so a new record only needs
+# its class. Importing the module is what registers it, see section.py.
+def register(cls):
+    current = section_type[cls.ID]
+    if current is not None and current.__qualname__ != cls.__qualname__:
+        raise ValueError(f"Section ID {cls.ID:02X} of {cls.__name__} is taken by {current.__name__}")
+    section_type[cls.ID] = cls
+    return cls
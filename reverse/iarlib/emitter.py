@@ -0,0 +1,70 @@
+import sys
+from iarlib.instruction import OrgRel, Abs8
+from iarlib.symbol import SourceCall
+from iarlib.type import Type, Typedef
+
+def emitOrgRel(section: OrgRel) -> str:
+    return repr(section)
+
+def emitAbs8(section: Abs8) -> str:
+    return repr(section.value)
+
+def emitSourceCall(section: SourceCall) -> str:
+    return f';Call to external function {section.callee!r} with flags {section.flags:04X}'
+
+def emitType(section: Type) -> str:
+    if isinstance(section.type, Typedef):
+        return str(section.type)
+    return None
+
+emit_map = {
+    OrgRel: emitOrgRel,
+    Abs8: emitAbs8,
+    SourceCall: emitSourceCall,
+    Type: emitType,
+}
+
+# Listing line of one section, None for sections without one
+def render(section) -> str:
+    emit = emit_map.get(section.__class__)
+    return emit(section) if emit is not None else None
+
+# Writes the assembly listing for decoded sections. Lines are collected and
+# written in large chunks, so a listing costs a handful of writes instead of
+# one per line whatever the output is.
+class Emitter:
+    def __init__(self, output: str = None, chunk: int = 1 << 16):
+        self.owned = output is not None
+        self.fp = open(output, "w", buffering=1 << 20) if self.owned else sys.stdout
+        self.chunk = chunk
+        self.lines = []
+
+    def emit(self, section):
+        line = render(section)
+        if line is None:
+            return
+        self.lines.append(line)
+        if len(self.lines) >= self.chunk:
+            self.flush()
+
+    def write(self, sections):
+        for section in sections:
+            self.emit(section)
+
+    def flush(self):
+        if self.lines:
+            self.lines.append("")
+            self.fp.write("\n".join(self.lines))
+            self.lines = []
+        self.fp.flush()
+
+    def close(self):
+        self.flush()
+        if self.owned:
+            self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
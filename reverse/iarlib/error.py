@@ -1,22 +1,38 @@
 from iarlib.reader import Reader
+from iarlib.dispatch import register
 
+@register
 class StackError:
+    __slots__ = ("error",)
     ID = 0x9D
     def __init__(self, data: Reader):
         self.error = data.readString()
+    def scan(data: Reader):
+        data.skipString()
+        return ()
 
+@register
 class Check:
+    __slots__ = ("lower", "upper")
     ID = 0x73
+    SIZE = 8
     def __init__(self, data: Reader):
-        self.upper = data.readU32()
+        # Bounds the top of the relocation stack, the lower one first
         self.lower = data.readU32()
+        self.upper = data.readU32()
 
+@register
 class Copy:
+    __slots__ = ()
     ID = 0x70
+    SIZE = 0
     def __init__(self, data: Reader):
         pass
 
+@register
 class LSR:
+    __slots__ = ()
     ID = 0x6E
+    SIZE = 4
     def __init__(self, data: Reader):
         data.readU32() # Unknown
\ No newline at end of file
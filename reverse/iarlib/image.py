@@ -0,0 +1,287 @@
+import re
+from iarlib.reader import DecodeError
+from iarlib.opcode import opcode_table, opcode_length, OpCode, Offset, Addr11, Addr16
+from iarlib.opcode import LJMP, AJMP, SJMP, LCALL, ACALL, JMP, RET, RETI, UNDEF
+
+# Disassembly of linked 8051 images, Intel HEX or flat binaries, through the
+# same opcode tables as the library decoder. Code is found by following
+# control flow from the reset and interrupt vectors, so data in between is
+# never decoded as instructions.
+
+# Interrupt vectors of the CC254x after reset at 0000h (cc254x_map.h)
+vector_names = [
+    "RFTXRX", "ADC", "URX0", "URX1", "ENC", "ST", "P2INT", "UTX0", "DMA",
+    "T1", "T2", "T3", "T4", "P0INT", "UTX1", "P1INT", "RF", "WDT",
+]
+
+def vectorAddress(vector: int) -> int:
+    return 0x03 + 8 * vector
+
+# Code above 8000h is the flash bank FMAP selects. The image is indexed by
+# flash address, bank n at n * 8000h, so an image up to 64 KiB is indexed
+# by the address the CPU sees and bank 1 is the one mapped by default.
+BANK = 0x8000
+
+def cpuAddress(at: int) -> int:
+    return at if at < 2 * BANK else BANK | (at & (BANK - 1))
+
+# Flash address of a CPU address reached from the instruction at flash
+# address at, a bank only reaches the common area and itself
+def flashAddress(at: int, address: int) -> int:
+    if address >= BANK and at >= 2 * BANK:
+        return (at & ~(BANK - 1)) + address - BANK
+    return address
+
+# How control leaves each opcode
+NEXT = 0    # falls through
+STOP = 1    # ret, reti, jmp @A+DPTR and undefined, nothing to follow
+JUMP = 2    # ljmp, ajmp, sjmp
+CALL = 3    # lcall, acall, also falls through
+BRANCH = 4  # conditional, both ways
+
+# Where the target is encoded
+NO_TARGET = 0
+RELATIVE = 1  # last byte, from the next instruction
+ABSOLUTE = 2  # bytes 1 and 2, big endian
+PAGE = 3      # 11 bits, 3 in the opcode
+
+def flow(encoding) -> tuple:
+    if encoding.mnemonic in (RET, RETI, JMP, UNDEF):
+        return STOP, NO_TARGET
+    operands = [operand for _, operand in encoding.operands]
+    if Addr16 in operands:
+        where = ABSOLUTE
+    elif Addr11 in operands:
+        where = PAGE
+    elif Offset in operands:
+        where = RELATIVE
+    else:
+        return NEXT, NO_TARGET
+    if encoding.mnemonic in (LJMP, AJMP, SJMP):
+        return JUMP, where
+    if encoding.mnemonic in (LCALL, ACALL):
+        return CALL, where
+    return BRANCH, where
+
+flows = [flow(encoding) for encoding in opcode_table]
+flow_kind = bytes(kind for kind, _ in flows)
+flow_target = bytes(where for _, where in flows)
+
+BOM = b"\xef\xbb\xbf"
+
+# One Intel HEX line, without the line break, as the record bytes after ':'
+def hexRecord(line: bytes, offset: int) -> bytes:
+    if line[:1] != b":":
+        raise DecodeError("Intel HEX record does not start with ':'", offset)
+    try:
+        record = bytes.fromhex(line[1:].decode("ascii"))
+    except ValueError:
+        raise DecodeError("Intel HEX record is not hex", offset)
+    if len(record) < 5 or len(record) != record[0] + 5:
+        raise DecodeError("Intel HEX record length does not match", offset)
+    if sum(record) & 0xFF:
+        raise DecodeError("Intel HEX checksum mismatch", offset)
+    return record
+
+# Whether text starts with a valid Intel HEX record, a binary that just
+# starts with 3Ah (addc A,R2) does not
+def isHex(text: bytes) -> bool:
+    for line in text.removeprefix(BOM).splitlines():
+        line = line.strip()
+        if line:
+            try:
+                hexRecord(line, 0)
+                return True
+            except DecodeError:
+                return False
+    return False
+
+# Data bytes of an Intel HEX file as (code, present), both indexed by
+# address. present marks the bytes the file gives, the rest of code is 0.
+def parseHex(text: bytes) -> tuple:
+    code = bytearray()
+    present = bytearray()
+    upper = 0
+    position = len(BOM) if text.startswith(BOM) else 0
+    for line in text[position:].splitlines():
+        offset = position
+        position += len(line) + 1
+        line = line.strip()
+        if not line:
+            continue
+        record = hexRecord(line, offset)
+        kind = record[3]
+        data = record[4:-1]
+        if kind == 0x00:
+            address = upper + ((record[1] << 8) | record[2])
+            end = address + len(data)
+            if end > len(code):
+                code.extend(bytes(end - len(code)))
+                present.extend(bytes(end - len(present)))
+            code[address:end] = data
+            present[address:end] = b"\x01" * len(data)
+        elif kind == 0x01:
+            break
+        elif kind in (0x02, 0x04):
+            if len(data) != 2:
+                raise DecodeError(f"Intel HEX record type {kind:02X} needs 2 bytes", offset)
+            upper = ((data[0] << 8) | data[1]) << (4 if kind == 0x02 else 16)
+        elif kind not in (0x03, 0x05):
+            raise DecodeError(f"Unknown Intel HEX record type {kind:02X}", offset)
+    return code, present
+
+# A flat binary loaded at base
+def parseBinary(data: bytes, base: int = 0) -> tuple:
+    code = bytearray(base) + data
+    present = bytearray(base) + b"\x01" * len(data)
+    return code, present
+
+formats = ("hex", "bin")
+
+# Intel HEX or flat binary by format, or by the first record when None
+def readImage(path: str, base: int = 0, format: str = None) -> tuple:
+    with open(path, "rb") as fp:
+        data = fp.read()
+    if format is None:
+        format = "hex" if isHex(data) else "bin"
+    if format == "hex":
+        return parseHex(data)
+    if format == "bin":
+        return parseBinary(data, base)
+    raise ValueError(f"Unknown image format: {format}")
+
+# State of every image byte
+ABSENT = 0  # not in the file
+FREE = 1    # no instruction found there (yet)
+START = 2   # first byte of an instruction
+INSIDE = 3  # operand byte
+marks = [b"", bytes([START]), bytes([START, INSIDE]), bytes([START, INSIDE, INSIDE])]
+
+class Image:
+    def __init__(self, code: bytearray, present: bytearray):
+        self.code = code
+        self.state = bytearray(present)
+        # Flash address: name, for every target and entry
+        self.labels = {}
+        self.calls = set()
+        # (flash address, reason) where flow could not be followed
+        self.problems = []
+        self.count = 0
+
+    def label(self, at: int, name: str = None):
+        if name is not None or at not in self.labels:
+            self.labels[at] = name if name is not None else f"L{cpuAddress(at):04X}"
+
+    # Reset and the first count interrupt vectors the image has code for
+    def vectors(self, count: int = len(vector_names)) -> list:
+        ret = [0]
+        self.label(0, "RESET")
+        for vector in range(count):
+            at = vectorAddress(vector)
+            if at < len(self.state) and self.state[at] != ABSENT:
+                ret.append(at)
+                self.label(at, f"{vector_names[vector]}_VECTOR" if vector < len(vector_names) else f"VECTOR_{vector}")
+        return ret
+
+    # Recursive descent from entries, each path is followed until it stops
+    # or runs into code already found, branches and calls go on the work list
+    def discover(self, entries: list):
+        code = self.code
+        state = self.state
+        kinds = flow_kind
+        wheres = flow_target
+        length = opcode_length
+        labels = self.labels
+        size = len(code)
+        count = 0
+        # Taken from the end, so entries are followed in order
+        work = list(reversed(entries))
+        for at in work:
+            self.label(at)
+        while work:
+            at = work.pop()
+            while True:
+                if at >= size or state[at] != FREE:
+                    if at >= size or state[at] != START:
+                        self.problem(at)
+                    break
+                op = code[at]
+                end = at + length[op]
+                if end > at + 1 and (end > size or state[end - 1] != FREE or state[at + 1] != FREE):
+                    self.problem(at)
+                    break
+                state[at:end] = marks[end - at]
+                count += 1
+                kind = kinds[op]
+                if kind == NEXT:
+                    at = end
+                    continue
+                if kind == STOP:
+                    if op == 0x73:
+                        self.problems.append((at, "jmp @A+DPTR"))
+                    break
+                where = wheres[op]
+                address = cpuAddress(end) & 0xFFFF
+                if where == RELATIVE:
+                    target = (address + ((code[end - 1] ^ 0x80) - 0x80)) & 0xFFFF
+                elif where == ABSOLUTE:
+                    target = (code[at + 1] << 8) | code[at + 2]
+                else:
+                    target = (address & 0xF800) | ((op & 0xE0) << 3) | code[at + 1]
+                target = flashAddress(at, target)
+                if target not in labels:
+                    labels[target] = f"L{cpuAddress(target):04X}"
+                if kind == JUMP:
+                    at = target
+                    continue
+                if kind == CALL:
+                    self.calls.add(target)
+                work.append(target)
+                at = end
+        self.count += count
+
+    # Why flow cannot go on at at, off the fast path
+    def problem(self, at: int):
+        state = self.state
+        size = len(state)
+        if at >= size or state[at] == ABSENT:
+            reason = "outside the image"
+        elif state[at] == INSIDE:
+            reason = "inside another instruction"
+        else:
+            end = at + opcode_length[self.code[at]]
+            if end > size or ABSENT in state[at:end]:
+                reason = "runs off the image"
+            else:
+                reason = "overlaps another instruction"
+        self.problems.append((at, reason))
+
+    # Flash addresses of the instructions found, in order
+    def instructions(self):
+        state = self.state
+        at = state.find(START)
+        while at != -1:
+            yield at
+            at = state.find(START, at + 1)
+
+    # (start, stop) of every run of image bytes no instruction covers
+    def data(self) -> list:
+        return [match.span() for match in re.finditer(b"\x01+", self.state)]
+
+    def render(self, at: int) -> str:
+        return repr(OpCode.raw(self.code, at, cpuAddress(at)))
+
+    # Listing in address order, labels on their own line and undecoded runs
+    # summarised
+    def listing(self):
+        code = self.code
+        length = opcode_length
+        gaps = dict(self.data())
+        for at in sorted(set(self.instructions()).union(gaps)):
+            if at in gaps:
+                yield f"; {gaps[at] - at} bytes of data at {at:04X}h"
+                continue
+            if at in self.labels:
+                yield f"{self.labels[at]}:"
+            end = at + length[code[at]]
+            yield f"{at:04X} {code[at:end].hex(' ').upper():<8}{self.render(at)}"
@@ -0,0 +1,142 @@
+from array import array
+from iarlib.reader import Reader, DecodeError
+from iarlib.section import section_type
+from iarlib.nametable import NameTable
+from iarlib.instruction import OrgRel
+
+# Offsets of every top level record in a library, found without decoding.
+# Once built it becomes the context loader so names, types, segments and
+# symbols are only decoded when something looks them up.
+class SectionIndex:
+    def __len__(self):
+        return len(self.positions)
+
+    def __init__(self, data: Reader):
+        self.data = data
+        self.positions = array("I")
+        self.ids = bytearray()
+        self.keys = {}
+        self.loading = set()
+        self.error = None
+        self.end = data.position()
+        self.scan()
+        data.context.loader = self.load
+
+    # Index from what an earlier scan found, see metadata.py
+    def restore(data: Reader, positions, ids, keys: dict, end: int, error: Exception = None):
+        index = SectionIndex.__new__(SectionIndex)
+        index.data = data
+        index.positions = positions
+        index.ids = ids
+        index.keys = keys
+        index.loading = set()
+        index.error = error
+        index.end = end
+        data.context.loader = index.load
+        return index
+
+    def scan(self):
+        data = self.data
+        while data.valid():
+            position = data.position()
+            section_id = data.readU8()
+            if section_id == 0xFF:
+                break
+            section = section_type[section_id]
+            if section is None:
+                # Nothing after an unknown record can be located
+                self.error = DecodeError(f"Unknown section ID: {section_id:02X}", position)
+                break
+            self.positions.append(position)
+            self.ids.append(section_id)
+            scan = getattr(section, "scan", None)
+            if scan is None:
+                data.skip(section.SIZE)
+            else:
+                for key in scan(data):
+                    self.keys[key] = position
+        self.end = data.position()
+
+    def find(self, section_id: int) -> list:
+        return [record for record, id in enumerate(self.ids) if id == section_id]
+
+    # Decodes the record at position, leaving the reader where it was
+    def decodeAt(self, position: int):
+        data = self.data
+        saved = data.position()
+        try:
+            data.seek(position)
+            section_id = data.readU8()
+            return section_type[section_id](data)
+        finally:
+            data.seek(saved)
+
+    def decode(self, record: int):
+        return self.decodeAt(self.positions[record])
+
+    # Decodes records in stream order. Records swallowed by an earlier one
+    # (operands of an Abs8 for example) are not decoded again.
+    def sections(self, start: int = 0, stop: int = None):
+        stop = len(self.positions) if stop is None else stop
+        end = self.positions[stop] if stop < len(self.positions) else self.end
+        data = self.data
+        saved = data.position()
+        try:
+            if start < stop:
+                data.seek(self.positions[start])
+            while start < stop and data.position() < end:
+                section_id = data.readU8()
+                section = section_type[section_id](data)
+                position = data.position()
+                yield section
+                data.seek(position)
+        finally:
+            data.seek(saved)
+
+    # ParseContext loader
+    def load(self, table: str, key):
+        if (table, key) in self.loading:
+            # Already being decoded further up, e.g. a self referencing type
+            return None
+        self.loading.add((table, key))
+        try:
+            if table == "names":
+                self.loadNames()
+            else:
+                position = self.keys.get((table, key))
+                if position is None:
+                    return None
+                self.decodeAt(position)
+            return getattr(self.data.context, table).peek(key)
+        finally:
+            self.loading.discard((table, key))
+
+    # Names refer back to earlier names, so they are decoded all at once in order
+    def loadNames(self):
+        names = self.data.context.names
+        if len(names) == 0:
+            for record in self.find(NameTable.ID):
+                self.decode(record)
+
+    def symbol(self, name: str):
+        self.loadNames()
+        for index, entry in self.data.context.names.items():
+            if entry == name and ("symbol_name", index) in self.keys:
+                return self.decodeAt(self.keys[("symbol_name", index)])
+        return None
+
+    # Records placed by every OrgRel to index, up to the next OrgRel
+    def code(self, index: int):
+        data = self.data
+        saved = data.position()
+        starts = []
+        for record in self.find(OrgRel.ID):
+            data.seek(self.positions[record])
+            if data.peekDynamic(1) == index:
+                starts.append(record)
+        data.seek(saved)
+        for start in starts:
+            stop = start + 1
+            while stop < len(self.ids) and self.ids[stop] != OrgRel.ID:
+                stop += 1
+            yield from self.sections(start, stop)
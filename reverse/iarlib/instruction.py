@@ -2,67 +2,106 @@ from iarlib.reader import Reader
 from iarlib.symbol import Symbol
 from iarlib.segment import Segment
 from iarlib.opcode import OpCode
+from iarlib.dispatch import register
 
 
+@register
 class Abs8:
+    __slots__ = ("value",)
     ID = 0x36
+    SIZE = 1
     def __repr__(self):
         return f'{self.value!r}'
     def __init__(self, data: Reader):
         self.value = OpCode(data)
 
+@register
 class Abs16:
+    __slots__ = ("value",)
     ID = 0x37
+    SIZE = 2
     def __init__(self, data: Reader):
         self.value = data.readU16()
 
+@register
 class Pop8:
+    __slots__ = ()
     ID = 0x5A
+    SIZE = 0
     def __init__(self, data: Reader):
         pass
 
+@register
 class PushExt: # External symbol?
+    __slots__ = ("symbol",)
     ID = 0x5D
     def __repr__(self):
         return f'PUSHEXT {self.symbol!r}'
     def __init__(self, data: Reader):
-        self.symbol = Symbol.getExternal(data.readDynamic())
+        self.symbol = Symbol.getExternal(data.context, data.readDynamic())
         data.readU32() # Unknown
+    def scan(data: Reader):
+        data.readDynamic()
+        data.skip(4)
+        return ()
 
+@register
 class PushRel:
+    __slots__ = ("symbol",)
     ID = 0x5E
     def __repr__(self):
         return f'PUSHREL {self.symbol!r}'
     def __init__(self, data: Reader):
-        self.symbol = Symbol.getRelocatable(data.readDynamic())
+        self.symbol = Symbol.getRelocatable(data.context, data.readDynamic())
         data.readU32() # Unknown
+    def scan(data: Reader):
+        data.readDynamic()
+        data.skip(4)
+        return ()
 
+@register
 class PushAbs:
+    __slots__ = ("value",)
     ID = 0x61
+    SIZE = 4
     def __init__(self, data: Reader):
         self.value = data.readU32()
 
+@register
 class PushPcr:
+    __slots__ = ("value",)
     ID = 0x62
+    SIZE = 4
     def __init__(self, data: Reader):
         self.value = data.readU32() # Unknown
 
+@register
 class Minus:
+    __slots__ = ()
     ID = 0x64
+    SIZE = 0
     def __init__(self, data: Reader):
         pass # These decrement the stack when shared pops are used (sjmp)
 
+@register
 class DeleteTos: # Purpose?
+    __slots__ = ()
     ID = 0x9C
+    SIZE = 0
     def __init__(self, data: Reader):
         pass
 
+@register
 class Pop24:
+    __slots__ = ()
     ID = 0xA4
+    SIZE = 0
     def __init__(self, data: Reader):
         pass
 
+@register
 class OrgRel:
+    __slots__ = ("value", "offset")
     ID = 0xC7
     def __repr__(self):
         if isinstance(self.value, Symbol):
@@ -71,17 +110,23 @@ class OrgRel:
             return f'.area {self.value!r}\n.org 0x{self.offset:08X}'
     def __init__(self, data: Reader):
         idx = data.readDynamic()
-        self.value = Symbol.getRelocatable(idx)
+        self.value = Symbol.getRelocatable(data.context, idx)
         if self.value is None:
-            self.value = Segment.get(idx)
+            self.value = Segment.get(data.context, idx)
         self.offset = data.readU32() # Unknown
-        print(self)
+    def scan(data: Reader):
+        data.readDynamic()
+        data.skip(4)
+        return ()
 
 assembly_modes = {
     0x01: "CODE",
     0x0A: "DATA",
 }
+@register
 class AssemblyMode:
+    __slots__ = ("mode",)
     ID = 0xDE
+    SIZE = 1
     def __init__(self, data: Reader):
         self.mode = data.readU8()
\ No newline at end of file
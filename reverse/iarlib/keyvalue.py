@@ -1,15 +1,20 @@
 from iarlib.reader import Reader
+from iarlib.dispatch import register
 
-key_values = {}
-
+@register
 class KeyValue:
+    __slots__ = ("key", "value")
     ID = 0xC9
     
     def __init__(self, data: Reader):
-        global key_values
         data.readU32() # Size, ignore
         length = data.readU32()
-        key = data.readStringLength(length)
+        self.key = data.readStringLength(length)
         length = data.readU32()
-        value = data.readStringLength(length)
-        key_values[key] = value
+        self.value = data.readStringLength(length)
+        data.context.key_values[self.key] = self.value
+    def scan(data: Reader):
+        data.skip(4)
+        data.skip(data.readU32())
+        data.skip(data.readU32())
+        return ()
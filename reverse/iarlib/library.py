@@ -1,7 +1,10 @@
 from datetime import date
 from iarlib.reader import Reader
+from iarlib.dispatch import register
 
+@register
 class Library:
+    __slots__ = ("revision", "cpa", "date", "name")
     ID = 0x00
     def __str__(self):
         return f'{self.name}.c {self.date} REV={self.revision} CPA={self.cpa}'
@@ -16,9 +19,16 @@ class Library:
         self.date = date(2000 + year, month, day)
         data.readU8() # Unknown (LAN?)
         self.name = data.readString()
+    def scan(data: Reader):
+        data.skip(6)
+        data.skipString()
+        return ()
 
+@register
 class Version:
+    __slots__ = ("major", "minor", "revision")
     ID = 0xBD
+    SIZE = 4
     def __repr__(self):
         return f'{self.major}.{self.minor}.{self.revision}'
     def __init__(self, data: Reader):
@@ -27,18 +37,30 @@ class Version:
         self.revision = data.readU8()
         data.readU8() # Unknown (padding?)
 
+@register
 class Auxillary:
+    __slots__ = ("flags",)
     ID = 0x53
+    SIZE = 2
     def __init__(self, data: Reader):
         self.flags = data.readU16()
 
+@register
 class Auxillary1:
+    __slots__ = ("flags", "version")
     ID = 0x54
     def __init__(self, data: Reader):
         self.flags = data.readU16()
         self.version = data.readString()
+    def scan(data: Reader):
+        data.skip(2)
+        data.skipString()
+        return ()
 
+@register
 class End:
+    __slots__ = ("crc",)
     ID = 0x3F
+    SIZE = 2
     def __init__(self, data:Reader):
         self.crc = data.readU16()
\ No newline at end of file
@@ -0,0 +1,209 @@
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+from iarlib.symbol import Symbol, location_names
+from iarlib.mapped import MappedWriter, MappedFile
+
+MAGIC = b"IARL"
+VERSION = 1
+
+# Names one library defines, as (name, symbol index) of its PUBLIC_REL
+# symbols, and the EXTERNAL names it refers to. Only symbol records are
+# decoded.
+def librarySymbols(library: str) -> tuple:
+    from iarlib.reader import Reader
+    from iarlib.index import SectionIndex
+    index = SectionIndex(Reader(library))
+    if index.error is not None:
+        raise index.error
+    defined = []
+    referenced = []
+    for record in index.find(Symbol.ID):
+        symbol = index.decode(record)
+        if symbol.name is None:
+            continue
+        location = location_names[symbol.location]
+        if location == "PUBLIC_REL":
+            defined.append((symbol.name, symbol.index))
+        elif location == "EXTERNAL":
+            referenced.append(symbol.name)
+    return defined, referenced
+
+# Runs in a worker process, errors are returned instead of raised so one
+# bad library only drops out of the index
+def scanLibrary(library: str) -> tuple:
+    try:
+        defined, referenced = librarySymbols(library)
+        return defined, referenced, ""
+    except Exception as error:
+        return [], [], f'{type(error).__name__}: {error}'
+
+# Linker view of a set of libraries, which library defines every name and
+# what each library needs from the others. Libraries are numbered in link
+# order, the first definition of a name is the one a linker would take.
+# Stored as a mapped file:
+#   libraries, errors   string pools by library
+#   mtime, size         stat of each library when it was indexed
+#   names               every name defined or referenced, sorted
+#   def.name, def.library, def.index
+#                       definitions sorted by name then library
+#   ref.start, ref.name externals of library l are ref.name[ref.start[l]:ref.start[l + 1]]
+def build(libraries: list, path: str, jobs: int = 1) -> "LinkIndex":
+    if jobs > 1 and len(libraries) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(scanLibrary, libraries, chunksize=4))
+    else:
+        results = [scanLibrary(library) for library in libraries]
+
+    names = set()
+    for defined, referenced, _ in results:
+        names.update(name for name, _ in defined)
+        names.update(referenced)
+    names = sorted(names, key=str.encode)
+    name_ids = {name: index for index, name in enumerate(names)}
+
+    definitions = sorted((name_ids[name], library, index)
+        for library, (defined, _, _) in enumerate(results) for name, index in defined)
+    ref_start = array("I", [0])
+    ref_name = array("I")
+    for defined, referenced, _ in results:
+        ref_name.extend(sorted(set(name_ids[name] for name in referenced)))
+        ref_start.append(len(ref_name))
+
+    writer = MappedWriter(MAGIC, VERSION)
+    writer.strings("libraries", libraries)
+    writer.strings("errors", [error for _, _, error in results])
+    stats = [os.stat(library) if os.path.exists(library) else None for library in libraries]
+    writer.add("mtime", "q", [stat.st_mtime_ns if stat is not None else -1 for stat in stats])
+    writer.add("size", "q", [stat.st_size if stat is not None else -1 for stat in stats])
+    writer.strings("names", names)
+    writer.add("def.name", "I", [definition[0] for definition in definitions])
+    writer.add("def.library", "I", [definition[1] for definition in definitions])
+    writer.add("def.index", "I", [definition[2] for definition in definitions])
+    writer.add("ref.start", "I", ref_start)
+    writer.add("ref.name", "I", ref_name)
+    writer.write(path)
+    return LinkIndex(path)
+
+class LinkIndex:
+    def __init__(self, path: str):
+        self.file = MappedFile(path, MAGIC, VERSION)
+        self.libraries = self.file.strings("libraries")
+        self.errors = self.file.strings("errors")
+        self.mtime = self.file.array("mtime")
+        self.size = self.file.array("size")
+        self.names = self.file.strings("names")
+        self.def_name = self.file.array("def.name")
+        self.def_library = self.file.array("def.library")
+        self.def_index = self.file.array("def.index")
+        self.ref_start = self.file.array("ref.start")
+        self.ref_name = self.file.array("ref.name")
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # Definitions of name id are def.*[start:stop]
+    def span(self, name: int) -> tuple:
+        return bisect_left(self.def_name, name), bisect_right(self.def_name, name)
+
+    # Every definition of name as (library, symbol index), the one a linker
+    # takes first
+    def definitions(self, name: str) -> list:
+        name = self.names.find(name)
+        if name < 0:
+            return []
+        start, stop = self.span(name)
+        return [(self.libraries[self.def_library[at]], self.def_index[at]) for at in range(start, stop)]
+
+    def references(self, library: int):
+        return self.ref_name[self.ref_start[library]:self.ref_start[library + 1]]
+
+    # External names of library with where each is defined, {name: [(library, symbol index)]}
+    def externals(self, library: str) -> dict:
+        found = [index for index in range(len(self.libraries)) if self.libraries[index] == library]
+        if not found:
+            raise LookupError(f"{library} is not in the index")
+        ret = {}
+        for name in self.references(found[0]):
+            start, stop = self.span(name)
+            ret[self.names[name]] = [(self.libraries[self.def_library[at]], self.def_index[at]) for at in range(start, stop)]
+        return ret
+
+    # Referenced but defined nowhere, {name: [referencing libraries]}
+    def unresolved(self) -> dict:
+        defined = bytearray(len(self.names))
+        for name in self.def_name:
+            defined[name] = 1
+        ret = {}
+        for library in range(len(self.libraries)):
+            for name in self.references(library):
+                if not defined[name]:
+                    ret.setdefault(self.names[name], []).append(self.libraries[library])
+        return ret
+
+    # Defined more than once, {name: [(library, symbol index)]}
+    def duplicates(self) -> dict:
+        ret = {}
+        for at in range(1, len(self.def_name)):
+            if self.def_name[at] == self.def_name[at - 1]:
+                name = self.names[self.def_name[at]]
+                if name not in ret:
+                    ret[name] = [(self.libraries[self.def_library[at - 1]], self.def_index[at - 1])]
+                ret[name].append((self.libraries[self.def_library[at]], self.def_index[at]))
+        return ret
+
+    # Libraries a link starting from entry pulls in, in the order they are
+    # pulled, and the names none of them define. A library comes in whole,
+    # so everything it refers to has to be found too.
+    def pull(self, entry: str) -> tuple:
+        pulled = []
+        missing = []
+        seen = set()
+        queue = deque()
+        name = self.names.find(entry)
+        if name < 0:
+            return pulled, [entry]
+        queue.append(name)
+        seen.add(name)
+        taken = set()
+        while queue:
+            name = queue.popleft()
+            start, stop = self.span(name)
+            if start == stop:
+                missing.append(self.names[name])
+                continue
+            library = self.def_library[start]
+            if library in taken:
+                continue
+            taken.add(library)
+            pulled.append(self.libraries[library])
+            for reference in self.references(library):
+                if reference not in seen:
+                    seen.add(reference)
+                    queue.append(reference)
+        return pulled, sorted(missing)
+
+    # Libraries changed or gone since they were indexed
+    def stale(self) -> list:
+        ret = []
+        for library in range(len(self.libraries)):
+            path = self.libraries[library]
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                ret.append(path)
+                continue
+            if stat.st_mtime_ns != self.mtime[library] or stat.st_size != self.size[library]:
+                ret.append(path)
+        return ret
+
+    def failed(self) -> list:
+        return [(self.libraries[library], self.errors[library]) for library in range(len(self.libraries)) if self.errors.raw(library)]
@@ -0,0 +1,374 @@
+import re
+from datetime import datetime
+from iarlib.reader import Reader
+from iarlib.context import ParseContext
+from iarlib.index import SectionIndex
+from iarlib.library import Library, Version, Auxillary, Auxillary1, End
+from iarlib.keyvalue import KeyValue
+from iarlib.memoryinfo import MemoryInfo, intrinsic_map
+from iarlib.attribute import Attribute
+from iarlib.nametable import NameTable
+from iarlib.pointertype import PointerType
+from iarlib.sizetype import SizeType, size_map
+from iarlib.segment import Segment, type_map as segment_types
+from iarlib.callframe import CallFrame, Names1, Common, Data
+from iarlib.symbol import Symbol, Function, ExternalFunction, FrameCount, FrameSize, SourceCall, location_names
+from iarlib.instruction import *
+from iarlib.error import StackError, Check, Copy, LSR
+from iarlib.type import Type, Pointer, Array, DataAttribute, FunctionAttribute, Typedef, StructUnion
+from iarlib.type import Function as FunctionType
+
+# Reader for the text IAR Universal Librarian writes for list-object-code.
+# Records are built as the same classes the binary decoder produces, with
+# the fields the listing shows filled in, so the two can be diffed.
+
+# Lines are cut at this width and continue after INDENT spaces, possibly in
+# the middle of a token
+WRAP = 78
+INDENT = 25
+
+# Joins wrapped lines and yields (tag, text, sub lines) per record
+def logicalLines(lines):
+    tag = None
+    text = ""
+    sub = []
+    previous = ""
+    string = False
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if string:
+            # Quoted strings keep their line breaks up to the closing quote
+            text += "\n" + line
+            string = not line.endswith("'")
+        elif tag is not None and len(previous) >= WRAP and line.startswith(" " * INDENT):
+            if sub:
+                sub[-1] += line[INDENT:]
+            else:
+                text += line[INDENT:]
+        elif line.startswith("    t_"):
+            if tag is not None:
+                yield tag, text, sub
+            tag, _, text = line[4:].partition(" ")
+            text = text.lstrip(" ")
+            sub = []
+            string = text.startswith("'") and (len(text) == 1 or not text.rstrip().endswith("'"))
+        elif tag is not None and line.startswith(" " * INDENT):
+            sub.append(line.strip())
+        elif tag is not None:
+            yield tag, text, sub
+            tag = None
+        previous = line
+    if tag is not None:
+        yield tag, text, sub
+
+def make(cls, **fields):
+    record = cls.__new__(cls)
+    for name, value in fields.items():
+        setattr(record, name, value)
+    return record
+
+def quoted(text: str) -> list:
+    return re.findall(r"'((?:[^']|'(?! |$))*)'", text, re.S)
+
+def number(text: str) -> int:
+    return int(text, 16)
+
+# Converters from record text to records, the listing keeps its own context
+# so references resolve the way the binary decoder resolves them
+
+def parseBegLib(text, sub, context):
+    match = re.match(r"REV=(\w+) CPA=(\w+) LAN=(\w+) (\S+) '(.*)'", text)
+    return make(Library, revision=number(match[1]), cpa=number(match[2]),
+        date=datetime.strptime(match[4], "%d/%b/%Y").date(), name=match[5])
+
+def parseVersion(text, sub, context):
+    major, minor, revision = (number(value) for value in text.split()[:3])
+    return make(Version, major=major, minor=minor, revision=revision)
+
+def parseAux(text, sub, context):
+    return make(Auxillary, flags=number(text.split()[0]))
+
+def parseAux1(text, sub, context):
+    return make(Auxillary1, flags=number(text.split()[0]), version=quoted(text)[-1])
+
+def parseKeyValue(text, sub, context):
+    key, value = quoted(text)
+    context.key_values[key] = value
+    return make(KeyValue, key=key, value=value)
+
+# Index types are spelled as the decoder spells them, the listing leaves out
+# "signed" but for char and shows UNDEFINED where intrinsic_map has no name
+meminfo_types = {name: name for name in intrinsic_map.values()}
+meminfo_types.update({name.removeprefix("signed "): name for name in intrinsic_map.values()
+    if name.startswith("signed ") and name != "signed char"})
+meminfo_types["UNDEFINED"] = None
+
+def parseMemInfo(text, sub, context):
+    match = re.match(r"(\S+)\s+(\d+), ptr size (\d+), flags (\d+), index (.*)", text)
+    record = make(MemoryInfo, name=match[1], index=int(match[2]), pointer_size=int(match[3]),
+        flags=int(match[4]), type=meminfo_types.get(match[5].strip(), match[5].strip()))
+    context.meminfo_map[record.index] = record
+    return record
+
+def parseAttrName(text, sub, context):
+    match = re.match(r"(\S+)\s+(\d+), (.*)", text)
+    return make(Attribute, name=match[1], type="function" if match[3].startswith("func") else match[3])
+
+def parseScopedName(text, sub, context):
+    match = re.match(r"N(\w+): NAME\s+'(.*)'(?: N(\w+))?", text)
+    name = match[2]
+    if match[3] is not None:
+        name = context.names[number(match[3])] + '::' + name
+    context.names[len(context.names)] = name
+    return make(NameTable, name=name)
+
+def parseDefPtrTypes(text, sub, context):
+    types = [line.split()[-1] for line in [text] + sub]
+    return make(PointerType, static=types[0], auto=types[1], const=types[2], general=types[3], code=types[4])
+
+subtype_names = {
+    "POINTER": Pointer,
+    "FUNCTION": FunctionType,
+    "ARRAY1": Array,
+    "DATA_ATTR": DataAttribute,
+    "FUNC_ATTR": FunctionAttribute,
+    "TYPEDEF": Typedef,
+    "STRUCT_UNION": StructUnion,
+}
+
+# Only the index and kind, type text in the listing is not round trippable
+def parseType(text, sub, context):
+    match = re.match(r"\[(\w+)\] (\w+)", text)
+    subtype = subtype_names[match[2]].__new__(subtype_names[match[2]])
+    context.type_map[number(match[1])] = subtype
+    return make(Type, index=number(match[1]), type=subtype)
+
+size_ids = {name: id for id, name in reversed(size_map.items())}
+# The listing leaves out "signed" and shows plain char on its own
+size_ids.update({name.removeprefix("signed "): id for name, id in size_ids.items() if name.startswith("signed ")})
+size_ids["char"] = 0x36
+
+def parseSizeType(text, sub, context):
+    match = re.match(r"(.*?) (\w+)(?: \(\w+\))?$", text.strip())
+    return make(SizeType, type=size_ids[match[1]], size=number(match[2]))
+
+def parseSeg(text, sub, context):
+    match = re.match(r"SPA=(\w+)(?::(\w+))? \((\w+)\) (\w+)<[^>]*> '(.*)'", text)
+    record = make(Segment, SPA=match[2] or "NORMAL", index=number(match[3]), type=segment_types[number(match[4])], name=match[5])
+    context.segment_map[record.index] = record
+    return record
+
+call_frame_kinds = {
+    "NAMES1": Names1,
+    "COMMON": Common,
+    "DATA": Data,
+}
+
+def parseCallFrameInfo(text, sub, context):
+    kind = re.match(r"extra: \d+ bytes (\w+)", text)[1]
+    return make(CallFrame, sub=call_frame_kinds[kind].__new__(call_frame_kinds[kind]))
+
+location_ids = {name: id for id, name in location_names.items()}
+
+def parseSymbolDef(text, sub, context):
+    match = re.match(r'(\w+)\s+[<(](\w+)[>)] \w+ N(\w+)"', text)
+    record = make(Symbol, location=location_ids[match[1]], index=number(match[2]),
+        name=context.names.get(number(match[3])), type=None, func=None)
+    if record.location == 0x02:
+        context.relocatable_table[record.index] = record
+    else:
+        context.external_table[record.index] = record
+    return record
+
+def parseSubDefFunc(text, sub, context):
+    match = re.match(r"F-INDEX = (\w+) FILE (\w+) LINE (\w+) FDEF (\w+)", text)
+    record = make(Function, func_index=number(match[1]), file=number(match[2]), line=number(match[3]),
+        func_def=number(match[4]), counts=[])
+    context.function_table[record.func_index] = record
+    return record
+
+def parseSubDefXFunc(text, sub, context):
+    match = re.match(r"F-INDEX = (\w+) FDEF (\w+)", text)
+    record = make(ExternalFunction, func_index=number(match[1]), func_def=number(match[2]), counts=[])
+    context.function_table[record.func_index] = record
+    return record
+
+def parseSrcCall(text, sub, context):
+    match = re.match(r"CALLER = (\w+) CALLEE = (\w+) FLAGS = (\w+)", text)
+    return make(SourceCall, caller=context.function_table.get(number(match[1])),
+        callee=context.function_table.get(number(match[2])), flags=number(match[3]), counts=[])
+
+def parseOrgRel(text, sub, context):
+    match = re.match(r"\((\w+)\) (\w+)", text)
+    index = number(match[1])
+    value = context.relocatable_table.get(index)
+    if value is None:
+        value = context.segment_map.get(index)
+    return make(OrgRel, value=value, offset=number(match[2]))
+
+def parseAsmMode(text, sub, context):
+    return make(AssemblyMode, mode=int(re.search(r"\((\d+)\)", text)[1]))
+
+def parseStackError(text, sub, context):
+    strings = quoted(text)
+    return make(StackError, error=strings[0] if strings else "")
+
+def parseCheck(text, sub, context):
+    lower, upper = text.split()[:2]
+    return make(Check, lower=number(lower), upper=number(upper))
+
+def parseEnd(text, sub, context):
+    return make(End, crc=number(text.split("=")[1]))
+
+parsers = {
+    "t_beg_lib": parseBegLib,
+    "t_version": parseVersion,
+    "t_aux": parseAux,
+    "t_aux_1": parseAux1,
+    "t_key_value": parseKeyValue,
+    "t_mem_info": parseMemInfo,
+    "t_attr_name": parseAttrName,
+    "t_scoped_name": parseScopedName,
+    "t_def_ptr_types": parseDefPtrTypes,
+    "t_type": parseType,
+    "t_size_type": parseSizeType,
+    "t_seg": parseSeg,
+    "t_call_frame_info": parseCallFrameInfo,
+    "t_symbol_def2": parseSymbolDef,
+    "t_src_call": parseSrcCall,
+    "t_org_rel1": parseOrgRel,
+    "t_asm_mode_change": parseAsmMode,
+    "t_abs_8": lambda text, sub, context: make(Abs8, value=number(text.split()[0])),
+    "t_abs_16": lambda text, sub, context: make(Abs16, value=number(text.split()[0])),
+    "t_push_ext": lambda text, sub, context: make(PushExt, symbol=context.external_table.get(number(text[1:].split(">")[0]))),
+    "t_push_rel": lambda text, sub, context: make(PushRel, symbol=context.relocatable_table.get(number(text[1:].split(")")[0]))),
+    "t_push_abs": lambda text, sub, context: make(PushAbs, value=number(text.split()[0])),
+    "t_push_pcr": lambda text, sub, context: make(PushPcr, value=number(text.split()[0])),
+    "t_minus": lambda text, sub, context: make(Minus),
+    "t_delete_tos": lambda text, sub, context: make(DeleteTos),
+    "t_pop_8": lambda text, sub, context: make(Pop8),
+    "t_pop_24": lambda text, sub, context: make(Pop24),
+    "t_stack_error": parseStackError,
+    "t_check": parseCheck,
+    "t_copy": lambda text, sub, context: make(Copy),
+    "t_lsr": lambda text, sub, context: make(LSR),
+    "t_end": parseEnd,
+}
+
+# Streams records out of a listing file. Function definitions and count
+# records belong to the symbol or call before them, as in the binary.
+def records(path: str, context: ParseContext = None):
+    context = context if context is not None else ParseContext()
+    pending = None
+    counts = None
+    with open(path, newline="", errors="replace") as fp:
+        for tag, text, sub in logicalLines(fp):
+            if tag == "t_sub_def_func" or tag == "t_sub_def_xfunc":
+                func = (parseSubDefFunc if tag == "t_sub_def_func" else parseSubDefXFunc)(text, sub, context)
+                func.symbol = pending
+                pending.func = func
+                counts = func.counts
+                continue
+            elif tag == "t_count":
+                count = make(FrameCount, frame_sizes=[])
+                counts.append(count)
+                continue
+            elif tag == "t_sub_def_frame_size":
+                match = re.match(r"SNO = (\w+) SIZE = (\w+)", text)
+                counts[-1].frame_sizes.append(make(FrameSize, SNO=number(match[1]), size=number(match[2]), flags=None))
+                continue
+            if pending is not None:
+                yield pending
+                pending = None
+            parser = parsers.get(tag)
+            if parser is None:
+                raise ValueError(f"Unknown listing record {tag}")
+            record = parser(text, sub, context)
+            if isinstance(record, (Symbol, SourceCall)):
+                # Collects what follows
+                pending = record
+                counts = record.counts if isinstance(record, SourceCall) else None
+            else:
+                yield record
+    if pending is not None:
+        yield pending
+
+# Every record of a binary library on its own, operand records included,
+# which is how the listing shows them. Abs8 holds the raw byte.
+def binaryRecords(library: str):
+    index = SectionIndex(Reader(library))
+    data = index.data
+    for position in index.positions:
+        if data.data[position] == Abs8.ID:
+            yield make(Abs8, value=data.data[position + 1])
+        else:
+            yield index.decodeAt(position)
+    if index.error is not None:
+        raise index.error
+
+# Plain values a record is compared on
+def counted(counts: list) -> tuple:
+    return tuple(tuple((frame.SNO, frame.size) for frame in count.frame_sizes) for count in counts)
+
+def funcIndex(function) -> int:
+    return function.func_index if function is not None else None
+
+def symbolIndex(symbol) -> int:
+    return symbol.index if symbol is not None else None
+
+def words(text: str) -> str:
+    return " ".join(text.split())
+
+signatures = {
+    Library: lambda record: (record.revision, record.cpa, record.date, record.name),
+    Version: lambda record: (record.major, record.minor, record.revision),
+    Auxillary: lambda record: (record.flags,),
+    Auxillary1: lambda record: (record.flags, record.version),
+    KeyValue: lambda record: (record.key, record.value),
+    MemoryInfo: lambda record: (record.index, record.pointer_size, record.flags, record.name, record.type),
+    Attribute: lambda record: (record.type, record.name),
+    NameTable: lambda record: (record.name,),
+    PointerType: lambda record: (record.static, record.auto, record.const, record.general, record.code),
+    Type: lambda record: (record.index, record.type.__class__.__name__),
+    SizeType: lambda record: (size_map.get(record.type), record.size),
+    Segment: lambda record: (record.SPA, record.index, record.type, record.name),
+    CallFrame: lambda record: (record.sub.__class__.__name__,),
+    Symbol: lambda record: (record.location, record.index, record.name, funcIndex(record.func),
+        counted(record.func.counts) if record.func is not None else ()),
+    SourceCall: lambda record: (funcIndex(record.caller), funcIndex(record.callee), record.flags, counted(record.counts)),
+    OrgRel: lambda record: (symbolIndex(record.value), record.offset),
+    AssemblyMode: lambda record: (record.mode,),
+    Abs8: lambda record: (record.value,),
+    Abs16: lambda record: (record.value,),
+    PushExt: lambda record: (symbolIndex(record.symbol),),
+    PushRel: lambda record: (symbolIndex(record.symbol),),
+    PushAbs: lambda record: (record.value,),
+    PushPcr: lambda record: (record.value,),
+    StackError: lambda record: (words(record.error),),
+    Check: lambda record: (record.lower, record.upper),
+    End: lambda record: (record.crc,),
+}
+
+def signature(record) -> tuple:
+    sign = signatures.get(record.__class__)
+    return (record.__class__.__name__,) + (sign(record) if sign is not None else ())
+
+# Compares two record streams position by position, returns the
+# differences as (record index, expected, actual) with None for a missing
+# record. Stops after limit differences.
+def diff(expected, actual, limit: int = 100) -> list:
+    ret = []
+    index = 0
+    expected = iter(expected)
+    actual = iter(actual)
+    while len(ret) < limit:
+        left = next(expected, None)
+        right = next(actual, None)
+        if left is None and right is None:
+            break
+        left = signature(left) if left is not None else None
+        right = signature(right) if right is not None else None
+        if left != right:
+            ret.append((index, left, right))
+        index += 1
+    return ret
@@ -0,0 +1,191 @@
+import os
+import sys
+import mmap
+import struct
+from array import array
+
+# File of named blocks that is used straight from a memory map: opening it
+# reads the directory and nothing else, blocks are memoryviews cast to
+# their array type. Layout, all little endian:
+#   header     magic (4s), format version, block count
+#   directory  per block: name (16s), typecode (c), offset, item count
+#   blocks     each starting at a multiple of 8
+HEADER = struct.Struct("<4sII")
+ENTRY = struct.Struct("<16sc3xQQ")
+ALIGN = 8
+
+class FormatError(ValueError):
+    pass
+
+# Strings as one utf-8 blob and the offsets of each, index i spanning
+# offsets[i]:offsets[i + 1]. Written sorted, find() is a binary search.
+class StringPool:
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __getitem__(self, index: int) -> str:
+        return str(self.blob[self.offsets[index]:self.offsets[index + 1]], "utf-8")
+
+    def raw(self, index: int) -> bytes:
+        return bytes(self.blob[self.offsets[index]:self.offsets[index + 1]])
+
+    # Index of string or -1, the pool has to be sorted by utf-8 bytes
+    def find(self, string: str) -> int:
+        key = string.encode()
+        low = 0
+        high = len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self.raw(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low if low < len(self) and self.raw(low) == key else -1
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+# Fixed width records packed in a byte block, nothing is unpacked until a
+# record or column is read
+class RecordTable:
+    def __len__(self):
+        return len(self.view) // self.record.size
+
+    def __init__(self, view, record: struct.Struct):
+        self.view = view
+        self.record = record
+
+    def __getitem__(self, index: int) -> tuple:
+        if index < 0 or index >= len(self):
+            raise IndexError(index)
+        return self.record.unpack_from(self.view, index * self.record.size)
+
+    def __iter__(self):
+        return self.record.iter_unpack(self.view)
+
+    def column(self, field: int) -> list:
+        return [row[field] for row in self.record.iter_unpack(self.view)]
+
+class MappedWriter:
+    def __init__(self, magic: bytes, version: int):
+        self.magic = magic
+        self.version = version
+        self.blocks = {}
+
+    def add(self, name: str, typecode: str, values):
+        if len(name.encode()) > 16:
+            raise ValueError(f"Block name too long: {name}")
+        self.blocks[name] = values if isinstance(values, array) and values.typecode == typecode else array(typecode, values)
+
+    # Written as name (the blob) and name.o (the offsets)
+    def strings(self, name: str, strings: list):
+        offsets = array("I", [0])
+        blob = bytearray()
+        for string in strings:
+            blob += string.encode()
+            offsets.append(len(blob))
+        self.add(name, "B", blob)
+        self.add(name + ".o", "I", offsets)
+
+    def records(self, name: str, record: struct.Struct, rows):
+        blob = bytearray()
+        for row in rows:
+            blob += record.pack(*row)
+        self.add(name, "B", blob)
+
+    def write(self, path: str):
+        offset = HEADER.size + ENTRY.size * len(self.blocks)
+        directory = []
+        for name, values in self.blocks.items():
+            offset += -offset % ALIGN
+            directory.append(ENTRY.pack(name.encode(), values.typecode.encode(), offset, len(values)))
+            offset += len(values) * values.itemsize
+        # Write then rename so readers never map half a file
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as fp:
+            fp.write(HEADER.pack(self.magic, self.version, len(self.blocks)))
+            fp.write(b"".join(directory))
+            for values in self.blocks.values():
+                fp.write(bytes(-fp.tell() % ALIGN))
+                if sys.byteorder != "little" and values.itemsize > 1:
+                    values = array(values.typecode, values)
+                    values.byteswap()
+                values.tofile(fp)
+        os.replace(temporary, path)
+
+class MappedFile:
+    def __init__(self, path: str, magic: bytes, version: int):
+        if sys.byteorder != "little":
+            raise FormatError("Mapped files are only read on little endian hosts")
+        self.path = path
+        with open(path, "rb") as fp:
+            try:
+                self.map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise FormatError(f"{path} is empty")
+        self.view = memoryview(self.map)
+        self.blocks = {}
+        self.views = []
+        try:
+            found, found_version, count = HEADER.unpack_from(self.view, 0)
+            if found != magic:
+                raise FormatError(f"{path} is not a {magic.decode()} file")
+            if found_version != version:
+                raise FormatError(f"{path} is version {found_version}, expected {version}")
+            for entry in range(count):
+                name, typecode, offset, length = ENTRY.unpack_from(self.view, HEADER.size + ENTRY.size * entry)
+                typecode = typecode.decode()
+                if offset + length * array(typecode).itemsize > len(self.view):
+                    raise FormatError(f"{path} is truncated")
+                self.blocks[name.rstrip(b"\0").decode()] = (typecode, offset, length)
+        except FormatError:
+            self.close()
+            raise
+        except (struct.error, ValueError):
+            # Includes bad utf-8 and typecodes
+            self.close()
+            raise FormatError(f"{path} is truncated")
+
+    def __contains__(self, name: str):
+        return name in self.blocks
+
+    def array(self, name: str) -> memoryview:
+        typecode, offset, length = self.blocks[name]
+        size = array(typecode).itemsize
+        view = self.view[offset:offset + length * size].cast(typecode)
+        self.views.append(view)
+        return view
+
+    def strings(self, name: str) -> StringPool:
+        return StringPool(self.array(name + ".o"), self.array(name))
+
+    def records(self, name: str, record: struct.Struct) -> RecordTable:
+        view = self.array(name)
+        if len(view) % record.size:
+            raise FormatError(f"{self.path}: {name} is not made of {record.size} byte records")
+        return RecordTable(view, record)
+
+    # Views handed out are released too, using one afterwards raises ValueError
+    def close(self):
+        self.blocks = {}
+        for view in self.views:
+            view.release()
+        self.views = []
+        self.view.release()
+        try:
+            self.map.close()
+        except BufferError:
+            # Someone made their own view of a block, unmapped once that goes
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
@@ -1,4 +1,6 @@
 from iarlib.reader import Reader
+from iarlib.context import ParseContext
+from iarlib.dispatch import register
 
 intrinsic_map = {
     # Intrinsic types
@@ -12,14 +14,13 @@ intrinsic_map = {
     0x08: "signed long",
 }
 
-meminfo_map = {}
-
+@register
 class MemoryInfo:
+    __slots__ = ("index", "pointer_size", "type", "flags", "name")
     ID = 0xC6
     def __repr__(self):
         return self.name
     def __init__(self, data: Reader):
-        global meminfo_map
         data.readU16() # Size
         self.index = data.readU8()
         self.pointer_size = data.readU8()
@@ -27,6 +28,12 @@ class MemoryInfo:
         self.flags = data.readU8()
         length = data.readU32()
         self.name = data.readStringLength(length)
-        meminfo_map[self.index] = self
-    def get(index: int):
-        return meminfo_map.get(index)
\ No newline at end of file
+        data.context.meminfo_map[self.index] = self
+    def scan(data: Reader):
+        data.skip(2)
+        index = data.readU8()
+        data.skip(3)
+        data.skip(data.readU32())
+        return (("meminfo_map", index),)
+    def get(context: ParseContext, index: int):
+        return context.meminfo_map.get(index)
\ No newline at end of file
@@ -0,0 +1,134 @@
+import os
+import struct
+from iarlib.reader import Reader
+from iarlib.context import ParseContext
+from iarlib.segment import Segment
+from iarlib.symbol import Symbol, location_names
+from iarlib.type import Type, subtype_map
+from iarlib.mapped import MappedWriter, MappedFile
+
+MAGIC = b"IARM"
+VERSION = 1
+# No string, type or function
+NONE = 0xFFFFFFFF
+
+# Fixed width records, strings are ids into the sorted string pool and
+# position is the offset of the record in the library
+SEGMENT = struct.Struct("<IIIII")     # index, name, type, SPA, position
+SYMBOL = struct.Struct("<B3xIIIIII")  # location, index, name, type index, type text, function index, position
+TYPE = struct.Struct("<IB3xII")       # index, subtype, text, position
+KEY = struct.Struct("<III")           # context table, key, position (SectionIndex.keys)
+
+subtype_ids = {cls: subtype for subtype, cls in subtype_map.items()}
+
+# Decodes the metadata of library and writes it to path. Blocks:
+#   info       string pool of library path, parser version and scan error
+#   stat       library size and mtime when built, end of the records
+#   strings    every name, segment type and rendered type, sorted
+#   segments, symbols, types, keys
+#              fixed width records as above
+#   rec.pos, rec.id
+#              offset and ID of every record, SectionIndex.positions/ids
+def build(library: str, path: str, parser: str = ""):
+    from iarlib.index import SectionIndex
+    index = SectionIndex(Reader(library))
+    context = index.data.context
+    segments = [(index.positions[record], index.decode(record)) for record in index.find(Segment.ID)]
+    types = [(index.positions[record], index.decode(record)) for record in index.find(Type.ID)]
+    symbols = [(index.positions[record], index.decode(record)) for record in index.find(Symbol.ID)]
+    type_ids = {id(value): key for key, value in context.type_map.entries()}
+
+    strings = set()
+    for _, segment in segments:
+        strings.update((segment.name, segment.type, segment.SPA))
+    for _, decoded in types:
+        strings.add(repr(decoded))
+    for _, symbol in symbols:
+        if symbol.name is not None:
+            strings.add(symbol.name)
+        if symbol.type is not None:
+            strings.add(repr(symbol.type))
+    strings.update(table for table, _ in index.keys)
+    strings = sorted(strings, key=str.encode)
+    string_ids = {string: at for at, string in enumerate(strings)}
+    def string(value) -> int:
+        return NONE if value is None else string_ids[value]
+
+    writer = MappedWriter(MAGIC, VERSION)
+    stat = os.stat(library)
+    writer.strings("info", [library, parser, str(index.error) if index.error is not None else ""])
+    writer.add("stat", "q", [stat.st_size, stat.st_mtime_ns, index.end])
+    writer.strings("strings", strings)
+    writer.records("segments", SEGMENT, ((segment.index, string(segment.name), string(segment.type), string(segment.SPA), position)
+        for position, segment in segments))
+    writer.records("symbols", SYMBOL, ((symbol.location, symbol.index, string(symbol.name),
+        type_ids.get(id(symbol.type), NONE), string(repr(symbol.type)) if symbol.type is not None else NONE,
+        symbol.func.func_index if symbol.func is not None else NONE, position) for position, symbol in symbols))
+    writer.records("types", TYPE, ((decoded.index, subtype_ids[decoded.type.__class__], string(repr(decoded)), position)
+        for position, decoded in types))
+    writer.records("keys", KEY, sorted((string_ids[table], key, position) for (table, key), position in index.keys.items()))
+    writer.add("rec.pos", "I", index.positions)
+    writer.add("rec.id", "B", index.ids)
+    writer.write(path)
+
+# Metadata of one library, read straight from the map. Records come back
+# as tuples in the field order of SEGMENT, SYMBOL, TYPE and KEY.
+class Metadata:
+    def __init__(self, path: str, library: str = None):
+        self.file = MappedFile(path, MAGIC, VERSION)
+        info = self.file.strings("info")
+        self.library = library if library is not None else info[0]
+        self.parser = info[1]
+        self.error = info[2] or None
+        self.size, self.mtime, self.end = self.file.array("stat")
+        self.strings = self.file.strings("strings")
+        self.segments = self.file.records("segments", SEGMENT)
+        self.symbols = self.file.records("symbols", SYMBOL)
+        self.types = self.file.records("types", TYPE)
+        self.keys = self.file.records("keys", KEY)
+        self.positions = self.file.array("rec.pos")
+        self.ids = self.file.array("rec.id")
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def string(self, string: int) -> str:
+        return None if string == NONE else self.strings[string]
+
+    def segmentNames(self) -> list:
+        return [self.string(name) for name in self.segments.column(1)]
+
+    # (name, location, rendered type) of every symbol
+    def symbolTypes(self) -> list:
+        return [(self.string(name), location_names[location], self.string(text))
+            for location, _, name, _, text, _, _ in self.symbols]
+
+    def symbol(self, name: str) -> tuple:
+        string = self.strings.find(name)
+        if string < 0:
+            return None
+        for row in self.symbols:
+            if row[2] == string:
+                return row
+        return None
+
+    def stale(self) -> bool:
+        try:
+            stat = os.stat(self.library)
+        except FileNotFoundError:
+            return True
+        return stat.st_size != self.size or stat.st_mtime_ns != self.mtime
+
+    # SectionIndex over the library without scanning it again, anything
+    # can be decoded from there. Only valid while this stays open.
+    def index(self, context: ParseContext = None) -> "SectionIndex":
+        from iarlib.index import SectionIndex
+        keys = {(self.strings[table], key): position for table, key, position in self.keys}
+        error = LookupError(self.error) if self.error is not None else None
+        return SectionIndex.restore(Reader(self.library, context), self.positions, self.ids, keys, self.end, error)
@@ -1,23 +1,30 @@
 from iarlib.reader import Reader
+from iarlib.context import ParseContext
+from iarlib.dispatch import register
 
-names = []
-
+@register
 class NameTable:
+    __slots__ = ("name",)
     ID = 0xCD
     def __repr__(self):
         return self.name
     def __init__(self, data: Reader):
-        global names
         data.readU32() # Size
         data.readU32() # Unknown
         self.name = data.readString()
 
+        names = data.context.names
         refIndex = data.readU32()
         if refIndex != 0xFFFFFFFF:
             self.name = names[refIndex] + '::' + self.name
 
-        names.append(self.name)
-    def get(index: int):
+        names[len(names)] = self.name
+    def scan(data: Reader):
+        data.skip(8)
+        data.skipString()
+        data.skip(4)
+        return ()
+    def get(context: ParseContext, index: int):
         if (index == 0xFFFFFFFF):
             return None
-        return names[index]
\ No newline at end of file
+        return context.names.get(index)
\ No newline at end of file
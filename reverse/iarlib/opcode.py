@@ -1,112 +1,179 @@
-from iarlib.reader import Reader
+from iarlib.reader import Reader, DecodeError
 from iarlib.symbol import Symbol
 from iarlib.segment import Segment
 
+# Operand decoders, keyed by the tag of the record that carries the operand.
+# Each returns (value, offset) and leaves the reader after the record.
+
 def getAbs8(data: Reader):
-    if data.peekU8(0) == 0x36:
-        data.readU8()
-        return data.readU8()
-    else:
-        raise LookupError("Opcode requested Abs8 but it did not exist")
+    data.readU8()
+    return data.readU8(), 0
 
 # Shortcut the Pushes
-def getSymbol(data: Reader):
-    if data.peekU8(0) == 0x5D:
-        symbol = Symbol.getExternal(data.peekDynamic(1))
-        if symbol is None:
-            raise LookupError("Looked up symbol but got None")
-        data.readU8()
-        data.readDynamic()
-        data.readU32() # Unknown
-        return symbol
-    elif data.peekU8(0) == 0x5E:
-        symbol = Symbol.getRelocatable(data.peekDynamic(1))
-        if symbol is None:
-            raise LookupError("Looked up symbol but got None")
-        data.readU8()
-        data.readDynamic()
-        data.readU32() # Unknown
-        return symbol
-    else:
-        raise LookupError("Opcode requested Symbol but it did not exist")
-    
-def reprAbsOrSymbol(value):
+def getExternal(data: Reader):
+    position = data.position()
+    data.readU8()
+    index = data.readDynamic()
+    symbol = Symbol.getExternal(data.context, index)
+    if symbol is None:
+        raise DecodeError(f"Unknown external symbol {index:04X}", position)
+    return symbol, data.readU32()
+
+# Relocatable symbols and segments share the same index space
+def getRelocatable(data: Reader):
+    position = data.position()
+    data.readU8()
+    index = data.readDynamic()
+    value = Symbol.getRelocatable(data.context, index)
+    if value is None:
+        value = Segment.get(data.context, index)
+        if value is None:
+            raise DecodeError(f"Unknown relocatable symbol or segment {index:04X}", position)
+    return value, data.readU32()
+
+abs_tags = {
+    0x36: getAbs8,
+}
+
+symbol_tags = {
+    0x5D: getExternal,
+    0x5E: getRelocatable,
+}
+
+value_tags = {**abs_tags, **symbol_tags}
+
+def getOperand(data: Reader, tags: dict, kind: str):
+    tag = data.peekU8(0)
+    decoder = tags.get(tag)
+    if decoder is None:
+        raise DecodeError(f"{kind} operand cannot start with record {tag:02X}", data.position())
+    return decoder(data)
+
+# Code address in a raw image, see image.py
+class Address:
+    __slots__ = ("value",)
+    def __repr__(self):
+        return f'L{self.value:04X}'
+    def __init__(self, value: int):
+        self.value = value
+
+# Raw operands: raw(code, at, op, end) reads the operand from code[at:] for
+# the instruction op ending at address end
+
+def rawOperand(cls, value, offset: int = 0):
+    operand = cls.__new__(cls)
+    operand.value = value
+    if offset is not None:
+        operand.offset = offset
+    return operand
+
+def reprOperand(value, offset):
     if type(value) == int:
         return f'#{value:02X}h'
+    elif isinstance(value, Segment):
+        return f'{value!r} + {offset}'
     else:
         return f'{value!r}'
 
-def getAbsOrSymbol(data: Reader):
-    try:
-        return getAbs8(data)
-    except:
-        return getSymbol(data)
-
 # Label?
 class Addr11:
+    __slots__ = ("value", "offset")
+    size = 1
     def __repr__(self):
-        return f'{self.value!r}'
+        return reprOperand(self.value, self.offset)
     def __init__(self, data: Reader):
-        self.value = getSymbol(data)
+        self.value, self.offset = getOperand(data, symbol_tags, "Addr11")
+    # Top 5 bits from the next instruction, the next 3 from the opcode
+    def raw(code, at: int, op: int, end: int):
+        return rawOperand(Addr11, Address((end & 0xF800) | ((op & 0xE0) << 3) | code[at]))
 
 # Label?
 class Addr16:
+    __slots__ = ("value", "offset")
+    size = 2
     def __repr__(self):
-        return f'{self.value!r}'
+        return reprOperand(self.value, self.offset)
     def __init__(self, data: Reader):
-        self.value = getSymbol(data)
+        self.value, self.offset = getOperand(data, symbol_tags, "Addr16")
+    def raw(code, at: int, op: int, end: int):
+        return rawOperand(Addr16, Address((code[at] << 8) | code[at + 1]))
 
 class NotBit:
+    __slots__ = ("value",)
+    size = 1
     def __repr__(self):
         return f'/{self.value:02X}h'
     def __init__(self, data: Reader):
-        self.value = getAbs8(data)
+        self.value, _ = getOperand(data, abs_tags, "Bit")
+    def raw(code, at: int, op: int, end: int):
+        return rawOperand(NotBit, code[at], None)
 
 class Bit:
+    __slots__ = ("value",)
+    size = 1
     def __repr__(self):
         return f'{self.value:02X}h'
     def __init__(self, data: Reader):
-        self.value = getAbs8(data)
+        self.value, _ = getOperand(data, abs_tags, "Bit")
+    def raw(code, at: int, op: int, end: int):
+        return rawOperand(Bit, code[at], None)
 
 class Direct:
+    __slots__ = ("value", "offset")
+    size = 1
     def __repr__(self):
-        return reprAbsOrSymbol(self.value)
+        return reprOperand(self.value, self.offset)
     def __init__(self, data: Reader):
-        self.value = getAbsOrSymbol(data)
+        self.value, self.offset = getOperand(data, value_tags, "Direct")
+    def raw(code, at: int, op: int, end: int):
+        return rawOperand(Direct, code[at])
         
 class Immediate:
+    __slots__ = ("value", "offset")
+    size = 1
     def __repr__(self):
-        return reprAbsOrSymbol(self.value)
+        return reprOperand(self.value, self.offset)
     def __init__(self, data: Reader):
-        try:
-            self.value = getAbsOrSymbol(data)
-        except:
-            data.readU8()
-            self.value = Segment.get(data.readDynamic())
-            self.offset = data.readU32()
+        self.value, self.offset = getOperand(data, value_tags, "Immediate")
+    def raw(code, at: int, op: int, end: int):
+        return rawOperand(Immediate, code[at])
+
+class Immediate16:
+    __slots__ = ("value", "offset")
+    size = 2
+    def __repr__(self):
+        return reprOperand(self.value, self.offset)
+    def __init__(self, data: Reader):
+        self.value, self.offset = getOperand(data, value_tags, "Immediate")
+        if type(self.value) == int:
+            self.value = (self.value << 8) | getOperand(data, abs_tags, "Immediate")[0]
+    def raw(code, at: int, op: int, end: int):
+        return rawOperand(Immediate16, (code[at] << 8) | code[at + 1])
 
 # Label?
 class Offset:
+    __slots__ = ("value", "offset")
+    size = 1
     def __repr__(self):
-        if isinstance(self.value, Segment):
-            return f'{self.value!r} + {self.offset}'
-        else:
-            return reprAbsOrSymbol(self.value)
+        return reprOperand(self.value, self.offset)
     def __init__(self, data: Reader):
-        try:
-            self.value = getAbsOrSymbol(data)
-        except:
-            data.readU8()
-            self.value = Segment.get(data.readDynamic())
-            self.offset = data.readU32()
+        self.value, self.offset = getOperand(data, value_tags, "Offset")
+    # Relative to the next instruction
+    def raw(code, at: int, op: int, end: int):
+        return rawOperand(Offset, Address((end + ((code[at] ^ 0x80) - 0x80)) & 0xFFFF))
         
+# Register operands are encoded in the opcode itself
 class Indirect:
+    __slots__ = ("value",)
+    size = 0
     def __repr__(self):
         return f'@R{self.value}'
     def __init__(self, op):
         self.value = op & 0x01
         
 class Register:
+    __slots__ = ("value",)
+    size = 0
     def __repr__(self):
         return f'R{self.value}'
     def __init__(self, op):
@@ -114,412 +181,238 @@ class Register:
         
 # OPCODES
 
-class ACALL:
-    def __init__(self, data: Reader):
-        data.readU8()
-        self.params = Addr11()
-
-class ADD:
-    def __init__(self, data: Reader):
-        op = data.readU8()
-        if op == 0x24:
-            self.params = ["A", Immediate(data)]
-        elif op == 0x25:
-            self.params = ["A", Direct(data)]
-        elif (op & 0xFE) == 0x26:
-            self.params = ["A", Indirect(op)]
-        elif (op & 0xF8) == 0x28:
-            self.params = ["A", Register(op)]
-
-class ADDC:
-    def __init__(self, data: Reader):
-        op = data.readU8()
-        if op == 0x34:
-            self.params = ["A", Immediate(data)]
-        elif op == 0x35:
-            self.params = ["A", Direct(data)]
-        elif (op & 0xFE) == 0x36:
-            self.params = ["A", Indirect(op)]
-        elif (op & 0xF8) == 0x38:
-            self.params = ["A", Register(op)]
-
-class AJMP:
-    def __init__(self, data: Reader):
-        data.readU8()
-        self.params = Addr11()
-
-class ANL:
-    def __init__(self, data: Reader):
-        op = data.readU8()
-        if op == 0x52:
-            self.params = [Direct(data), "A"]
-        elif op == 0x53:
-            self.params = [Direct(data), Immediate(data)]
-        elif op == 0x54:
-            self.params = ["A", Immediate(data)]
-        elif op == 0x55:
-            self.params = ["A", Direct(data)]
-        elif op == 0x82:
-            self.params = ["C", Bit(data)]
-        elif op == 0xB0:
-            self.params = ["C", NotBit(data)]
-        elif (op & 0xFE) == 0x56:
-            self.params = ["A", Indirect(op)]
-        elif (op & 0xF8) == 0x58:
-            self.params = ["A", Register(op)]
-
-class CJNE:
-    def __init__(self, data: Reader):
-        op = data.readU8()
-        if (op & 0xFE) == 0xB6:
-            self.params = [Indirect(op), Immediate(data), Offset(data)]
-        elif op == 0xB4:
-            self.params = ["A", Immediate(data), Offset(data)]
-        elif op == 0xB5:
-            self.params = ["A", Direct(data), Offset(data)]
-        elif (op & 0xF8) == 0xB8:
-            self.params = [Register(op), Immediate(data), Offset(data)]
+class Mnemonic:
+    __slots__ = ("params",)
+    def __init__(self, data: Reader, encoding):
+        self.params = list(encoding.params)
+        for index, operand in encoding.operands:
+            self.params[index] = operand(data)
+
+class ACALL(Mnemonic): __slots__ = ()
+class ADD(Mnemonic): __slots__ = ()
+class ADDC(Mnemonic): __slots__ = ()
+class AJMP(Mnemonic): __slots__ = ()
+class ANL(Mnemonic): __slots__ = ()
+class CJNE(Mnemonic): __slots__ = ()
+class CLR(Mnemonic): __slots__ = ()
+class CPL(Mnemonic): __slots__ = ()
+class DA(Mnemonic): __slots__ = ()
+class DEC(Mnemonic): __slots__ = ()
+class DIV(Mnemonic): __slots__ = ()
+class DJNZ(Mnemonic): __slots__ = ()
+class INC(Mnemonic): __slots__ = ()
+class JB(Mnemonic): __slots__ = ()
+class JBC(Mnemonic): __slots__ = ()
+class JC(Mnemonic): __slots__ = ()
+class JMP(Mnemonic): __slots__ = ()
+class JNB(Mnemonic): __slots__ = ()
+class JNC(Mnemonic): __slots__ = ()
+class JNZ(Mnemonic): __slots__ = ()
+class JZ(Mnemonic): __slots__ = ()
+class LCALL(Mnemonic): __slots__ = ()
+class LJMP(Mnemonic): __slots__ = ()
+class MOV(Mnemonic): __slots__ = ()
+class MOVC(Mnemonic): __slots__ = ()
+class MOVX(Mnemonic): __slots__ = ()
+class MUL(Mnemonic): __slots__ = ()
+class NOP(Mnemonic): __slots__ = ()
+class ORL(Mnemonic): __slots__ = ()
+class POP(Mnemonic): __slots__ = ()
+class PUSH(Mnemonic): __slots__ = ()
+class RET(Mnemonic): __slots__ = ()
+class RETI(Mnemonic): __slots__ = ()
+class RL(Mnemonic): __slots__ = ()
+class RLC(Mnemonic): __slots__ = ()
+class RR(Mnemonic): __slots__ = ()
+class RRC(Mnemonic): __slots__ = ()
+class SETB(Mnemonic): __slots__ = ()
+class SJMP(Mnemonic): __slots__ = ()
+class SUBB(Mnemonic): __slots__ = ()
+class SWAP(Mnemonic): __slots__ = ()
+class XCH(Mnemonic): __slots__ = ()
+class XCHD(Mnemonic): __slots__ = ()
+class XRL(Mnemonic): __slots__ = ()
 
-class CLR:
-    def __init__(self, data: Reader):
-        op = data.readU8()
-        if op == 0xE4:
-            self.params = ["A"]
-        elif op == 0xC2:
-            self.params = [Bit(data)]
-        elif op == 0xC3:
-            self.params = ["C"]
-
-class CPL:
-    def __init__(self, data: Reader):
-        op = data.readU8()
-        if op == 0xF4:
-            self.params = ["A"]
-        elif op == 0xB2:
-            self.params = [Bit(data)]
-        elif op == 0xB3:
-            self.params = ["C"]
-
-class DA:
-    def __init__(self, data: Reader):
-        data.readU8()
-        self.params = ["A"]
-
-class DEC:
-    def __init__(self, data: Reader):
-        op = data.readU8()
-        if (op & 0xFE) == 0x16:
-            self.params = [Indirect(op)]
-        elif op == 0x14:
-            self.params = ["A"]
-        elif op == 0x15:
-            self.params = [Direct(data)]
-        elif (op & 0xF8) == 0x18:
-            self.params = [Register(op)]
-
-class DIV:
-    def __init__(self, data: Reader):
-        data.readU8()
-        self.params = ["AB"]
-
-class DJNZ:
-    def __init__(self, data: Reader):
-        op = data.readU8()
-        if op == 0xD5:
-            self.params = [Direct(data), Offset(data)]
-        elif (op & 0xF8) == 0xD8:
-            self.params = [Register(op), Offset(data)]
-
-class INC:
-    def __init__(self, data: Reader):
-        op = data.readU8()
-        if (op & 0xFE) == 0x06:
-            self.params = [Indirect(op)]
-        elif op == 0x04:
-            self.params = ["A"]
-        elif op == 0x05:
-            self.params = [Direct(data)]
-        elif op == 0xA3:
-            self.params = ["DPTR"]
-        elif (op & 0xF8) == 0x08:
-            self.params = [Register(op)]
-
-class JB:
-    def __init__(self, data: Reader):
-        data.readU8()
-        self.params = [Bit(data), Offset(data)]
-
-class JBC:
-    def __init__(self, data: Reader):
-        data.readU8()
-        self.params = [Bit(data), Offset(data)]
-
-class JC:
-    def __init__(self, data: Reader):
-        data.readU8()
-        self.params = [Offset(data)]
-
-class JMP:
-    def __init__(self, data: Reader):
-        data.readU8()
-        self.params = ["@A+DPTR"]
-
-class JNB:
-    def __init__(self, data: Reader):
-        data.readU8()
-        self.params = [Bit(data), Offset(data)]
-
-class JNC:
-    def __init__(self, data: Reader):
-        data.readU8()
-        self.params = [Offset(data)]
-
-class JNZ:
-    def __init__(self, data: Reader):
-        data.readU8()
-        self.params = [Offset(data)]
-
-class JZ:
-    def __init__(self, data: Reader):
-        data.readU8()
-        self.params = [Offset(data)]
-
-class LCALL:
-    def __init__(self, data: Reader):
-        data.readU8()
-        self.params = [Addr16(data)]
-
-class LJMP:
-    def __init__(self, data: Reader):
-        data.readU8()
-        self.params = [Addr16(data)]
-
-class MOV:
-    def __init__(self, data: Reader):
-        op = data.readU8()
-        if (op & 0xFE) == 0x76:
-            self.params = [Indirect(op), Immediate(data)]
-        elif (op & 0xFE) == 0xF6:
-            self.params = [Indirect(op), "A"]
-        elif (op & 0xFE) == 0xA6:
-            self.params = [Indirect(op), Direct(data)]
-        elif op == 0x74:
-            self.params = ["A", Immediate(data)]
-        elif (op & 0xFE) == 0xE6:
-            self.params = ["A", Indirect(op)]
-        elif op == 0xE5:
-            self.params = ["A", Direct(data)]
-        elif (op & 0xF8) == 0xE8:
-            self.params = ["A", Register(op)]
-        elif op == 0x92:
-            self.params = [Bit(data), "C"]
-        elif op == 0xA2:
-            self.params = ["C", Bit(data)]
-        elif op == 0x85:
-            self.params = [Direct(data), Direct(data)]
-        elif op == 0x75:
-            self.params = [Direct(data), Immediate(data)]
-        elif (op & 0xFE) == 0x86:
-            self.params = [Direct(data), Indirect(op)]
-        elif op == 0xF5:
-            self.params = [Direct(data), "A"]
-        elif (op & 0xF8) == 0x88:
-            self.params = [Direct(data), Register(op)]
-        elif op == 0x90:
-            self.params = ["DPTR", Immediate(data)]
-        elif (op & 0xF8) == 0x78:
-            self.params = [Register(op), Immediate(data)]
-        elif (op & 0xF8) == 0xF8:
-            self.params = [Register(op), "A"]
-        elif (op & 0xF8) == 0xA8:
-            self.params = [Register(op), Direct(data)]
-
-class MOVC:
-    def __init__(self, data: Reader):
-        op = data.readU8()
-        if op == 0x93:
-            self.params = ["A", "@A+DPTR"]
-        elif op == 0x83:
-            self.params = ["A", "@A+PC"]
-
-class MOVX:
-    def __init__(self, data: Reader):
-        op = data.readU8()
-        if op == 0xF0:
-            self.params = ["@DPTR", "A"]
-        elif (op & 0xFE) == 0xF2:
-            self.params = [Indirect(op), "A"]
-        elif op == 0xE0:
-            self.params = ["A", "@DPTR"]
-        elif (op & 0xFE) == 0xE2:
-            self.params = ["A", Indirect(op)]
-
-class MUL:
-    def __init__(self, data: Reader):
-        data.readU8()
-        self.params = ["AB"]
-
-class NOP:
-    def __init__(self, data: Reader):
-        data.readU8()
-        self.params = []
-
-class ORL:
-    def __init__(self, data: Reader):
-        op = data.readU8()
-        if op == 0x44:
-            self.params = ["A", Immediate(data)]
-        elif (op & 0xFE) == 0x46:
-            self.params = ["A", Indirect(op)]
-        elif op == 0x45:
-            self.params = ["A", Direct(data)]
-        elif (op & 0xF8) == 0x48:
-            self.params = ["A", Register(op)]
-        elif op == 0xA0:
-            self.params = ["C", NotBit(data)]
-        elif op == 0x72:
-            self.params = ["C", Bit(data)]
-        elif op == 0x43:
-            self.params = [Direct(data), Immediate(data)]
-        elif op == 0x42:
-            self.params = [Direct(data), "A"]
-
-class POP:
-    def __init__(self, data: Reader):
-        data.readU8()
-        self.params = [Direct(data)]
-
-class PUSH:
-    def __init__(self, data: Reader):
-        data.readU8()
-        self.params = [Direct(data)]
-
-class RET:
-    def __init__(self, data: Reader):
-        data.readU8()
-        self.params = []
+# Not defined by spec
+class UNDEF(Mnemonic): __slots__ = ()
 
-class RETI:
-    def __init__(self, data: Reader):
-        data.readU8()
+class Encoding:
+    __slots__ = ("mnemonic", "params", "operands", "length")
+    def __init__(self, op: int, mnemonic, params: tuple, order: tuple):
+        self.mnemonic = mnemonic
         self.params = []
+        self.operands = []
+        self.length = 1
+        for index, param in enumerate(params):
+            if isinstance(param, str):
+                self.params.append(param)
+            elif param.size == 0:
+                self.params.append(param(op))
+            else:
+                self.params.append(None)
+                self.operands.append((index, param))
+                self.length += param.size
+        # Operands in the order they appear in the stream
+        if order is not None:
+            self.operands = [self.operands[index] for index in order]
+
+    def decode(self, data: Reader):
+        return self.mnemonic(data, self)
+
+    # Same from plain code bytes, the opcode at code[at] and the instruction
+    # at address end - length
+    def decodeRaw(self, code, at: int, end: int):
+        op = code[at]
+        mnemonic = self.mnemonic.__new__(self.mnemonic)
+        mnemonic.params = list(self.params)
+        at += 1
+        for index, operand in self.operands:
+            mnemonic.params[index] = operand.raw(code, at, op, end)
+            at += operand.size
+        return mnemonic
+
+# (first opcode, count, mnemonic, params...)
+# count > 1 covers the @Ri and Rn forms which encode the register in the opcode
+specs = [
+    (0x00, 1, NOP),
+    (0x02, 1, LJMP, Addr16),
+    (0x03, 1, RR, "A"),
+    (0x04, 1, INC, "A"),
+    (0x05, 1, INC, Direct),
+    (0x06, 2, INC, Indirect),
+    (0x08, 8, INC, Register),
+    (0x10, 1, JBC, Bit, Offset),
+    (0x12, 1, LCALL, Addr16),
+    (0x13, 1, RRC, "A"),
+    (0x14, 1, DEC, "A"),
+    (0x15, 1, DEC, Direct),
+    (0x16, 2, DEC, Indirect),
+    (0x18, 8, DEC, Register),
+    (0x20, 1, JB, Bit, Offset),
+    (0x22, 1, RET),
+    (0x23, 1, RL, "A"),
+    (0x24, 1, ADD, "A", Immediate),
+    (0x25, 1, ADD, "A", Direct),
+    (0x26, 2, ADD, "A", Indirect),
+    (0x28, 8, ADD, "A", Register),
+    (0x30, 1, JNB, Bit, Offset),
+    (0x32, 1, RETI),
+    (0x33, 1, RLC, "A"),
+    (0x34, 1, ADDC, "A", Immediate),
+    (0x35, 1, ADDC, "A", Direct),
+    (0x36, 2, ADDC, "A", Indirect),
+    (0x38, 8, ADDC, "A", Register),
+    (0x40, 1, JC, Offset),
+    (0x42, 1, ORL, Direct, "A"),
+    (0x43, 1, ORL, Direct, Immediate),
+    (0x44, 1, ORL, "A", Immediate),
+    (0x45, 1, ORL, "A", Direct),
+    (0x46, 2, ORL, "A", Indirect),
+    (0x48, 8, ORL, "A", Register),
+    (0x50, 1, JNC, Offset),
+    (0x52, 1, ANL, Direct, "A"),
+    (0x53, 1, ANL, Direct, Immediate),
+    (0x54, 1, ANL, "A", Immediate),
+    (0x55, 1, ANL, "A", Direct),
+    (0x56, 2, ANL, "A", Indirect),
+    (0x58, 8, ANL, "A", Register),
+    (0x60, 1, JZ, Offset),
+    (0x62, 1, XRL, Direct, "A"),
+    (0x63, 1, XRL, Direct, Immediate),
+    (0x64, 1, XRL, "A", Immediate),
+    (0x65, 1, XRL, "A", Direct),
+    (0x66, 2, XRL, "A", Indirect),
+    (0x68, 8, XRL, "A", Register),
+    (0x70, 1, JNZ, Offset),
+    (0x72, 1, ORL, "C", Bit),
+    (0x73, 1, JMP, "@A+DPTR"),
+    (0x74, 1, MOV, "A", Immediate),
+    (0x75, 1, MOV, Direct, Immediate),
+    (0x76, 2, MOV, Indirect, Immediate),
+    (0x78, 8, MOV, Register, Immediate),
+    (0x80, 1, SJMP, Offset),
+    (0x82, 1, ANL, "C", Bit),
+    (0x83, 1, MOVC, "A", "@A+PC"),
+    (0x84, 1, DIV, "AB"),
+    (0x85, 1, MOV, Direct, Direct), # Source is encoded first
+    (0x86, 2, MOV, Direct, Indirect),
+    (0x88, 8, MOV, Direct, Register),
+    (0x90, 1, MOV, "DPTR", Immediate16),
+    (0x92, 1, MOV, Bit, "C"),
+    (0x93, 1, MOVC, "A", "@A+DPTR"),
+    (0x94, 1, SUBB, "A", Immediate),
+    (0x95, 1, SUBB, "A", Direct),
+    (0x96, 2, SUBB, "A", Indirect),
+    (0x98, 8, SUBB, "A", Register),
+    (0xA0, 1, ORL, "C", NotBit),
+    (0xA2, 1, MOV, "C", Bit),
+    (0xA3, 1, INC, "DPTR"),
+    (0xA4, 1, MUL, "AB"),
+    (0xA5, 1, UNDEF),
+    (0xA6, 2, MOV, Indirect, Direct),
+    (0xA8, 8, MOV, Register, Direct),
+    (0xB0, 1, ANL, "C", NotBit),
+    (0xB2, 1, CPL, Bit),
+    (0xB3, 1, CPL, "C"),
+    (0xB4, 1, CJNE, "A", Immediate, Offset),
+    (0xB5, 1, CJNE, "A", Direct, Offset),
+    (0xB6, 2, CJNE, Indirect, Immediate, Offset),
+    (0xB8, 8, CJNE, Register, Immediate, Offset),
+    (0xC0, 1, PUSH, Direct),
+    (0xC2, 1, CLR, Bit),
+    (0xC3, 1, CLR, "C"),
+    (0xC4, 1, SWAP, "A"),
+    (0xC5, 1, XCH, "A", Direct),
+    (0xC6, 2, XCH, "A", Indirect),
+    (0xC8, 8, XCH, "A", Register),
+    (0xD0, 1, POP, Direct),
+    (0xD2, 1, SETB, Bit),
+    (0xD3, 1, SETB, "C"),
+    (0xD4, 1, DA, "A"),
+    (0xD5, 1, DJNZ, Direct, Offset),
+    (0xD6, 2, XCHD, "A", Indirect),
+    (0xD8, 8, DJNZ, Register, Offset),
+    (0xE0, 1, MOVX, "A", "@DPTR"),
+    (0xE2, 2, MOVX, "A", Indirect),
+    (0xE4, 1, CLR, "A"),
+    (0xE5, 1, MOV, "A", Direct),
+    (0xE6, 2, MOV, "A", Indirect),
+    (0xE8, 8, MOV, "A", Register),
+    (0xF0, 1, MOVX, "@DPTR", "A"),
+    (0xF2, 2, MOVX, Indirect, "A"),
+    (0xF4, 1, CPL, "A"),
+    (0xF5, 1, MOV, Direct, "A"),
+    (0xF6, 2, MOV, Indirect, "A"),
+    (0xF8, 8, MOV, Register, "A"),
+]
+
+stream_order = {
+    0x85: (1, 0),
+}
 
-class RL:
-    def __init__(self, data: Reader):
-        data.readU8()
-        self.params = ["A"]
-
-class RLC:
-    def __init__(self, data: Reader):
-        data.readU8()
-        self.params = ["A"]
-
-class RR:
-    def __init__(self, data: Reader):
-        data.readU8()
-        self.params = ["A"]
-
-class RRC:
-    def __init__(self, data: Reader):
-        data.readU8()
-        self.params = ["A"]
-
-class SETB:
-    def __init__(self, data: Reader):
-        op = data.readU8()
-        if op == 0xD2:
-            self.params = [Bit(data)]
-        elif op == 0xD3:
-            self.params = ["C"]
-
-class SJMP:
-    def __init__(self, data: Reader):
-        data.readU8()
-        self.params = [Offset(data)]
-
-class SUBB:
-    def __init__(self, data: Reader):
-        op = data.readU8()
-        if op == 0x94:
-            self.params = ["A", Immediate(data)]
-        elif (op & 0xFE) == 0x96:
-            self.params = ["A", Indirect(op)]
-        elif op == 0x95:
-            self.params = ["A", Direct(data)]
-        elif (op & 0xFE) == 0x98:
-            self.params = ["A", Register(op)]
-
-class SWAP:
-    def __init__(self, data: Reader):
-        data.readU8()
-        self.params = ["A"]
-
-class XCH:
-    def __init__(self, data: Reader):
-        op = data.readU8()
-        if (op & 0xFE) == 0xC6:
-            self.params = ["A", Indirect(op)]
-        elif op == 0xC5:
-            self.params = ["A", Direct(data)]
-        elif (op & 0xF8) == 0xC8:
-            self.params = ["A", Register(op)]
-
-class XCHD:
-    def __init__(self, data: Reader):
-        op = data.readU8()
-        self.params = ["A", Indirect(op)]
-
-class XRL:
-    def __init__(self, data: Reader):
-        op = data.readU8()
-        if op == 0x64:
-            self.params = ["A", Immediate(data)]
-        elif (op & 0xFE) == 0x66:
-            self.params = ["A", Indirect(op)]
-        elif op == 0x65:
-            self.params = ["A", Direct(data)]
-        elif (op & 0xF8) == 0x68:
-            self.params = ["A", Register(op)]
-        elif op == 0x63:
-            self.params = [Direct(data), Immediate(data)]
-        elif op == 0x62:
-            self.params = [Direct(data), "A"]
-
-# Not defined by spec
-class UNDEF:
-    def __init__(self, data: Reader):
-        data.readU8()
+# One entry per opcode byte, built once at import
+opcode_table = [None] * 256
+for first, count, mnemonic, *params in specs:
+    for op in range(first, first + count):
+        opcode_table[op] = Encoding(op, mnemonic, params, stream_order.get(op))
+# AJMP and ACALL carry the top address bits in the opcode
+for op in range(0x01, 0x100, 0x20):
+    opcode_table[op] = Encoding(op, AJMP, (Addr11,), None)
+    opcode_table[op + 0x10] = Encoding(op + 0x10, ACALL, (Addr11,), None)
 
-# Key on 4 MSB, val index on 4 LSB (last fills row)
-encodings = {
-    0x00: [NOP, AJMP, LJMP, RR, INC],
-    0x10: [JBC, ACALL, LCALL, RRC, DEC],
-    0x20: [JB, AJMP, RET, RL, ADD],
-    0x30: [JNB, ACALL, RETI, RLC, ADDC],
-    0x40: [JC, AJMP, ORL],
-    0x50: [JNC, ACALL, ANL],
-    0x60: [JZ, AJMP, XRL],
-    0x70: [JNZ, ACALL, ORL, JMP, MOV],
-    0x80: [SJMP, AJMP, ANL, MOVC, DIV, MOV],
-    0x90: [MOV, ACALL, MOV, MOVC, SUBB],
-    0xA0: [ORL, AJMP, MOV, INC, MUL, UNDEF, MOV],
-    0xB0: [ANL, ACALL, CPL, CPL, CJNE],
-    0xC0: [PUSH, AJMP, CLR, CLR, SWAP, XCH],
-    0xD0: [POP, ACALL, SETB, SETB, DA, DJNZ, XCHD, XCHD, DJNZ],
-    0xE0: [MOVX, AJMP, MOVX, MOVX, CLR, MOV],
-    0xF0: [MOVX, ACALL, MOVX, MOVX, CPL, MOV],
-}
+# Encoded length in bytes of each opcode
+opcode_length = bytes(encoding.length for encoding in opcode_table)
 
 class OpCode:
+    __slots__ = ("op",)
     def __repr__(self):
         return f'\t{self.op.__class__.__name__.lower()} {self.op.params}'.replace('[', '').replace(']', '').replace('\'', '')
     def __init__(self, data: Reader):
-        opcode = data.peekU8(0)
-        row = opcode & 0xF0
-        col = opcode & 0x0F
-        cols = encodings[row]
-        if col < len(cols):
-            self.op = cols[col](data)
-        else:
-            self.op = cols[-1](data)
-        print(self)
\ No newline at end of file
+        self.op = opcode_table[data.readU8()].decode(data)
+    # Instruction at code[at] of a raw image, running at address
+    def raw(code, at: int, address: int = None):
+        opcode = OpCode.__new__(OpCode)
+        encoding = opcode_table[code[at]]
+        address = at if address is None else address
+        opcode.op = encoding.decodeRaw(code, at, (address + encoding.length) & 0xFFFF)
+        return opcode
@@ -1,12 +1,16 @@
 from iarlib.reader import Reader
+from iarlib.dispatch import register
 
 types = {
     0x06: "__xdata",
     0x15: "__banked_func",
 }
 
+@register
 class PointerType:
+    __slots__ = ("static", "auto", "const", "general", "code")
     ID = 0xC1
+    SIZE = 5
     def __init__(self, data: Reader):
         self.static = types.get(data.readU8())
         self.auto = types.get(data.readU8())
@@ -0,0 +1,128 @@
+import json
+from time import perf_counter_ns
+from iarlib.reader import Reader
+from iarlib.section import section_type
+from iarlib.type import subtype_map
+from iarlib.opcode import opcode_table
+
+class Stat:
+    def __init__(self):
+        self.count = 0
+        self.bytes = 0
+        self.total = 0
+        self.own = 0
+        self.max = 0
+
+    def merge(self, other: dict):
+        self.count += other["count"]
+        self.bytes += other["bytes"]
+        self.total += other["total_ns"]
+        self.own += other["self_ns"]
+        self.max = max(self.max, other["max_ns"])
+
+    def report(self) -> dict:
+        return {"count": self.count, "bytes": self.bytes, "total_ns": self.total, "self_ns": self.own, "max_ns": self.max}
+
+# Stands in for a decoder in one of the dispatch tables. Everything but the
+# call itself is forwarded, so scan(), SIZE and ID still work through it.
+class Probe:
+    def __init__(self, profiler, stat: Stat, target, method: str = None):
+        self.profiler = profiler
+        self.stat = stat
+        self.target = target
+        self.method = method
+
+    def __getattr__(self, name):
+        return getattr(self.target, name)
+
+    def __call__(self, data: Reader, *args):
+        return self.profiler.measure(self.stat, self.target, data, args)
+
+    # Encoding.decode
+    def decode(self, data: Reader):
+        return self.profiler.measure(self.stat, self.target.decode, data, ())
+
+# Times every decoder dispatched through section_type, subtype_map and
+# opcode_table. Nothing is patched until install(), so a disabled profiler
+# costs nothing; uninstall() puts the original decoders back.
+class Profiler:
+    def __init__(self):
+        self.sections = {}
+        self.types = {}
+        self.opcodes = {}
+        self.saved = None
+        # Time spent in nested decoders, subtracted to get self time
+        self.nested = [0]
+
+    def measure(self, stat: Stat, decoder, data: Reader, args):
+        nested = self.nested
+        nested.append(0)
+        position = data.position()
+        start = perf_counter_ns()
+        try:
+            return decoder(data, *args)
+        finally:
+            elapsed = perf_counter_ns() - start
+            inner = nested.pop()
+            nested[-1] += elapsed
+            stat.count += 1
+            stat.bytes += data.position() - position
+            stat.total += elapsed
+            stat.own += elapsed - inner
+            if elapsed > stat.max:
+                stat.max = elapsed
+
+    def install(self):
+        if self.saved is not None:
+            return
+        self.saved = (list(section_type), dict(subtype_map), list(opcode_table))
+        for section_id, section in section_type.entries():
+            stat = self.sections.setdefault(f'{section_id:02X} {section.__name__}', Stat())
+            section_type[section_id] = Probe(self, stat, section)
+        for subtype, cls in self.saved[1].items():
+            stat = self.types.setdefault(f'{subtype:02X} {cls.__name__}', Stat())
+            subtype_map[subtype] = Probe(self, stat, cls)
+        for op, encoding in enumerate(self.saved[2]):
+            stat = self.opcodes.setdefault(encoding.mnemonic.__name__, Stat())
+            opcode_table[op] = Probe(self, stat, encoding)
+
+    def uninstall(self):
+        if self.saved is None:
+            return
+        section_type[:] = self.saved[0]
+        subtype_map.clear()
+        subtype_map.update(self.saved[1])
+        opcode_table[:] = self.saved[2]
+        self.saved = None
+
+    def __enter__(self):
+        self.install()
+        return self
+
+    def __exit__(self, *exc):
+        self.uninstall()
+
+    def report(self) -> dict:
+        return {table: {name: stat.report() for name, stat in getattr(self, table).items() if stat.count}
+            for table in ("sections", "types", "opcodes")}
+
+    # Adds a report from another process
+    def merge(self, report: dict):
+        for table, stats in report.items():
+            for name, stat in stats.items():
+                getattr(self, table).setdefault(name, Stat()).merge(stat)
+
+    def write(self, path: str):
+        with open(path, "w") as fp:
+            json.dump(self.report(), fp, indent=2)
+
+    def summary(self, limit: int = 10) -> str:
+        lines = []
+        for table in ("sections", "types", "opcodes"):
+            stats = sorted(getattr(self, table).items(), key=lambda item: item[1].own, reverse=True)
+            lines.append(f'{table}: {"count":>10} {"bytes":>10} {"self ms":>10} {"total ms":>10} {"max us":>10}')
+            for name, stat in stats[:limit]:
+                if stat.count:
+                    lines.append(f'  {name:<20} {stat.count:10} {stat.bytes:10} {stat.own / 1e6:10.2f} '
+                        f'{stat.total / 1e6:10.2f} {stat.max / 1e3:10.1f}')
+        return "\n".join(lines)
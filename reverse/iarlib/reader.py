@@ -1,95 +1,202 @@
-import os
-from io import BytesIO
+import struct
 from typing import Tuple
+from iarlib.context import ParseContext
+
+# Only used for long runs of dynamic numbers. Importing it takes longer
+# than decoding most libraries, so that is left to the first long run.
+numpy = None
+numpy_missing = False
+
+def loadNumpy():
+    global numpy, numpy_missing
+    if numpy is None and not numpy_missing:
+        try:
+            import numpy
+        except ImportError:
+            numpy_missing = True
+    return numpy
+
+# Library integers are big endian
+U16 = struct.Struct(">H")
+U32 = struct.Struct(">I")
+
+class DecodeError(LookupError):
+    def __init__(self, message: str, offset: int):
+        super().__init__(f'{message} at 0x{offset:08X}')
+        self.offset = offset
+
+# Dynamic numbers are 7 bits per byte, least significant first, with the
+# MSB set on every byte but the last. Returns (value, offset after it).
+def decodeDynamic(data, offset: int) -> Tuple[int, int]:
+    byte = data[offset]
+    if byte < 0x80:
+        return byte, offset + 1
+    value = byte & 0x7F
+    shift = 7
+    while True:
+        offset += 1
+        byte = data[offset]
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset + 1
+        shift += 7
+
+# Below this many the NumPy setup costs more than it saves
+NUMPY_MINIMUM = 64
+
+# Decodes count consecutive dynamic numbers at offset in one pass.
+# Returns (values, offset after the last).
+def decodeDynamics(data, offset: int, count: int) -> Tuple[list, int]:
+    if count >= NUMPY_MINIMUM and loadNumpy() is not None:
+        return decodeDynamicsNumpy(data, offset, count)
+    values = []
+    append = values.append
+    for _ in range(count):
+        byte = data[offset]
+        offset += 1
+        if byte < 0x80:
+            append(byte)
+            continue
+        value = byte & 0x7F
+        shift = 7
+        while True:
+            byte = data[offset]
+            offset += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        append(value)
+    return values, offset
+
+# Numbers end at bytes below 0x80, so every byte's place in its number
+# follows from where the previous one ended. Limited to 64 bit values.
+def decodeDynamicsNumpy(data, offset: int, count: int) -> Tuple[list, int]:
+    window = numpy.frombuffer(data[offset:offset + 10 * count], dtype=numpy.uint8)
+    ends = numpy.flatnonzero(window < 0x80)[:count]
+    if len(ends) < count:
+        raise DecodeError("Truncated dynamic number", offset + len(window))
+    end = int(ends[-1]) + 1
+    starts = numpy.empty(count, dtype=numpy.int64)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    place = numpy.arange(end) - numpy.repeat(starts, ends - starts + 1)
+    digits = (window[:end] & 0x7F).astype(numpy.uint64) << (7 * place).astype(numpy.uint64)
+    return numpy.add.reduceat(digits, starts).tolist(), offset + end
 
 class BytesReader:
-    def __init__(self, bytes: bytes):
+    def __init__(self, bytes: memoryview):
         self.bytes = bytes
+        self.offset = 0
 
     def valid(self):
-        return len(self.bytes) > 0
+        return self.offset < len(self.bytes)
 
     def parseU8(self) -> int:
-        ret = int.from_bytes(self.bytes[:1])
-        self.bytes = self.bytes[1:]
+        ret = self.bytes[self.offset]
+        self.offset += 1
         return ret
     
     def peekU8(self, offset) -> int:
-        return int.from_bytes(self.bytes[:1])
+        return self.bytes[self.offset + offset]
     
     def parseU16(self) -> int:
-        ret = int.from_bytes(self.bytes[:2])
-        self.bytes = self.bytes[2:]
+        ret, = U16.unpack_from(self.bytes, self.offset)
+        self.offset += 2
         return ret
     
     def parseU32(self) -> int:
-        ret = int.from_bytes(self.bytes[:4])
-        self.bytes = self.bytes[4:]
+        ret, = U32.unpack_from(self.bytes, self.offset)
+        self.offset += 4
         return ret
 
     def parseString(self) -> str:
-        name_length = int.from_bytes(self.bytes[:1])
-        string = self.bytes[1:name_length].decode()
-        self.bytes = self.bytes[name_length+1:]
-        return string
+        start = self.offset + 1
+        self.offset = start + self.bytes[self.offset]
+        return str(self.bytes[start:self.offset], "utf-8")
 
 class Reader:
-    def __init__(self, library_file: str):
+    def __init__(self, library_file: str, context: ParseContext = None):
         with open(library_file, "rb") as fp:
-            self.data = BytesIO(fp.read())
+            self.data = memoryview(fp.read())
+        self.offset = 0
+        self.context = context if context is not None else ParseContext()
 
     def valid(self) -> bool:
-        return self.data.readable()
+        return self.offset < len(self.data)
     
     def position(self) -> int:
-        return self.data.tell()
+        return self.offset
+
+    def seek(self, offset: int):
+        self.offset = offset
+
+    def skip(self, count: int):
+        self.offset += count
+
+    def skipString(self):
+        self.offset += 1 + self.data[self.offset]
     
     # Dynamic sized number
     # If MSB of byte is set shift next byte into it's place
     # Crazy work honestly guys just use a u32 it's not that deep
     def readDynamic(self) -> int:
-        loop = self.readU8()
-        ret = loop & 0x7F
-        offset = 7
-        while loop & 0x80:
-            loop = self.readU8()
-            byte = loop & 0x7F
-            ret = ret | (byte << offset)
-            offset += 7
+        # Nearly all are a single byte
+        byte = self.data[self.offset]
+        if byte < 0x80:
+            self.offset += 1
+            return byte
+        ret, self.offset = decodeDynamic(self.data, self.offset)
+        return ret
+
+    def readDynamics(self, count: int) -> list:
+        ret, self.offset = decodeDynamics(self.data, self.offset, count)
         return ret
+
+    def skipDynamics(self, count: int):
+        data = self.data
+        offset = self.offset
+        for _ in range(count):
+            while data[offset] & 0x80:
+                offset += 1
+            offset += 1
+        self.offset = offset
     
     def read(self, count: int) -> BytesReader:
-        return BytesReader(self.data.read(count))
+        start = self.offset
+        self.offset += count
+        return BytesReader(self.data[start:self.offset])
     
     def readU8(self) -> int:
-        return int.from_bytes(self.data.read(1))
+        ret = self.data[self.offset]
+        self.offset += 1
+        return ret
     
     def peekU8(self, offset) -> int:
-        ret = int.from_bytes(self.data.read(1 + offset)[-1:])
-        self.data.seek(-1 - offset, os.SEEK_CUR)
-        return ret
+        return self.data[self.offset + offset]
     
+    # Never moves the reader
     def peekDynamic(self, initial_next) -> int:
-        loop = self.peekU8(initial_next)
-        ret = loop & 0x7F
-        offset = 7
-        next = 1
-        while loop & 0x80:
-            loop = self.peekU8(initial_next + next)
-            byte = loop & 0x7F
-            ret = ret | (byte << offset)
-            offset += 7
-            next += 1
-        return ret
+        offset = self.offset + initial_next
+        byte = self.data[offset]
+        if byte < 0x80:
+            return byte
+        return decodeDynamic(self.data, offset)[0]
     
     def readU16(self) -> int:
-        return int.from_bytes(self.data.read(2))
+        ret, = U16.unpack_from(self.data, self.offset)
+        self.offset += 2
+        return ret
     
     def readU32(self) -> int:
-        return int.from_bytes(self.data.read(4))
+        ret, = U32.unpack_from(self.data, self.offset)
+        self.offset += 4
+        return ret
     
     def readString(self) -> str:
-        return self.data.read(self.readU8()).decode()
+        return self.readStringLength(self.readU8())
     
     def readStringLength(self, length: int) -> str:
-        return self.data.read(length).decode()
\ No newline at end of file
+        start = self.offset
+        self.offset += length
+        return str(self.data[start:self.offset], "utf-8")
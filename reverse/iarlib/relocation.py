@@ -0,0 +1,414 @@
+from array import array
+from iarlib.reader import Reader, DecodeError
+from iarlib.context import ParseContext
+from iarlib.section import section_type
+from iarlib.symbol import Symbol
+from iarlib.segment import Segment
+from iarlib.instruction import Abs8, Abs16, Pop8, PushExt, PushRel, PushAbs, PushPcr, Minus, DeleteTos, Pop24, OrgRel
+from iarlib.error import StackError, Check, Copy, LSR
+
+# The records after an instruction byte are a small stack program computing
+# the bytes a linker patches in:
+#   PushExt/PushRel  push the address of a symbol or segment plus an offset
+#   PushAbs          push a constant
+#   PushPcr          push the location counter plus a constant
+#   Minus            a, b -> a - b
+#   Copy, LSR        duplicate the top, shift it right
+#   Check            range check the top, StackError holds the message
+#   Pop8/Pop24       place the low 1/3 bytes of the top, most significant first
+#   DeleteTos        drop the top
+# Every value is linear in the pushed addresses until it is shifted, so an
+# expression reduces to a few forms
+#   value = sum(coefficient * address) + coefficient * PC + addend
+# where the addend folds every constant. Expressions with the same tokens
+# share a Shape, compiled once into Python code that patches all of its
+# places in a segment at once.
+
+def signed(value: int) -> int:
+    return value - (1 << 32) if value & 0x80000000 else value
+
+# Coefficients of a stack value over (terms..., PC, constants...)
+class Form:
+    __slots__ = ("coefficients", "shift")
+    def __init__(self, coefficients: tuple, shift: int = 0):
+        self.coefficients = coefficients
+        self.shift = shift
+
+class Shape:
+    __slots__ = ("key", "terms", "constants", "forms", "checks", "outputs", "size", "constant", "source", "evaluate")
+    def __repr__(self):
+        return self.text()
+
+    # Symbolic run of the tokens in key, see Relocations.read
+    def __init__(self, key: tuple):
+        self.key = key
+        self.terms = sum(1 for token in key if token[0] in (PushExt.ID, PushRel.ID))
+        self.constants = sum(1 for token in key if token[0] in (PushExt.ID, PushRel.ID, PushAbs.ID, PushPcr.ID))
+        width = self.terms + 1 + self.constants
+        pc = self.terms
+        forms = []
+        stack = []
+        self.checks = []
+        self.outputs = []
+        term = 0
+        constant = self.terms + 1
+        def unit(*slots):
+            coefficients = [0] * width
+            for slot in slots:
+                coefficients[slot] = 1
+            return Form(tuple(coefficients))
+        for token in key:
+            op = token[0]
+            if op in (PushExt.ID, PushRel.ID):
+                stack.append(unit(term, constant))
+                term += 1
+                constant += 1
+            elif op == PushAbs.ID:
+                stack.append(unit(constant))
+                constant += 1
+            elif op == PushPcr.ID:
+                stack.append(unit(pc, constant))
+                constant += 1
+            elif op == Minus.ID:
+                right = stack.pop()
+                left = stack.pop()
+                if left.shift or right.shift:
+                    raise ValueError("Shifted relocation value in a subtraction")
+                stack.append(Form(tuple(a - b for a, b in zip(left.coefficients, right.coefficients))))
+            elif op == Copy.ID:
+                stack.append(Form(stack[-1].coefficients, stack[-1].shift))
+            elif op == LSR.ID:
+                stack[-1] = Form(stack[-1].coefficients, stack[-1].shift + token[1])
+            elif op == Check.ID:
+                self.checks.append((self.form(forms, stack[-1]), stack[-1].shift, token[1], token[2]))
+            elif op in (Pop8.ID, Pop24.ID):
+                top = stack.pop()
+                self.outputs.append((self.form(forms, top), top.shift, token[1], 1 if op == Pop8.ID else 3))
+            elif op == DeleteTos.ID:
+                stack.pop()
+        self.forms = forms
+        self.size = max((delta + size for _, _, delta, size in self.outputs), default=0)
+        # Nothing but constants, the bytes are known without a link
+        self.constant = all(not any(form[:pc + 1]) for form in forms)
+        self.source = self.generate()
+        code = compile(self.source, f"<relocation {len(shapes)}>", "exec")
+        scope = {}
+        exec(code, scope)
+        self.evaluate = scope["evaluate"]
+
+    def form(self, forms: list, value: Form) -> int:
+        if value.coefficients not in forms:
+            forms.append(value.coefficients)
+        return forms.index(value.coefficients)
+
+    # Addend of every form from the constants of one place
+    def fold(self, constants: list) -> tuple:
+        first = self.terms + 1
+        return tuple(sum(c * value for c, value in zip(form[first:], constants)) for form in self.forms)
+
+    # evaluate(image, base, values, start, terms, addends, messages, failed)
+    # patches image at every start offset. values are the addresses of the
+    # term ids in terms, base the address of image[0]. Failed checks are
+    # appended to failed as (offset, StackError position).
+    def generate(self) -> str:
+        terms = self.terms
+        forms = len(self.forms)
+        checks = len(self.checks)
+        lines = [
+            "def evaluate(image, base, values, start, terms, addends, messages, failed):",
+            "    for i in range(len(start)):",
+            "        offset = start[i]",
+        ]
+        for index, form in enumerate(self.forms):
+            parts = []
+            for slot in range(terms + 1):
+                if form[slot] == 0:
+                    continue
+                value = f"values[terms[i * {terms} + {slot}]]" if slot < terms else "(base + offset)"
+                parts.append(f"{'+' if form[slot] > 0 else '-'} {value if abs(form[slot]) == 1 else f'{abs(form[slot])} * {value}'}")
+            parts.append(f"+ addends[i * {forms} + {index}]")
+            expression = " ".join(parts)
+            lines.append(f"        v{index} = {expression[2:] if expression[0] == '+' else '-' + expression[2:]}")
+        for index, (form, shift, lower, upper) in enumerate(self.checks):
+            lines.append(f"        if not {lower} <= v{form} >> {shift} <= {upper}:")
+            lines.append(f"            failed.append((offset, messages[i * {checks} + {index}]))")
+        for form, shift, delta, size in self.outputs:
+            for byte in range(size):
+                lines.append(f"        image[offset + {delta + byte}] = (v{form} >> {shift + 8 * (size - 1 - byte)}) & 0xFF")
+        return "\n".join(lines) + "\n"
+
+    # e.g. "v0 = t0-PC+k0 -> v0:8 [-128..127]", t being the pushed addresses
+    # and k the folded constants
+    def text(self) -> str:
+        names = [f"t{slot}" for slot in range(self.terms)] + ["PC"]
+        forms = []
+        for index, form in enumerate(self.forms):
+            parts = [f"{'-' if c < 0 else '+'}{'' if abs(c) == 1 else abs(c)}{name}" for c, name in zip(form, names) if c]
+            forms.append(f"v{index} = {''.join(parts).lstrip('+')}{'+' if parts else ''}k{index}")
+        outputs = [f"v{form}>>{shift}:{size * 8}" if shift else f"v{form}:{size * 8}" for form, shift, _, size in self.outputs]
+        checks = "".join(f" [{lower}..{upper}]" for _, _, lower, upper in self.checks)
+        return f"{'; '.join(forms)} -> {', '.join(outputs)}{checks}"
+
+# Compiled shapes by token key, shared by every library
+shapes = {}
+
+def getShape(key: tuple) -> Shape:
+    shape = shapes.get(key)
+    if shape is None:
+        shape = Shape(key)
+        shapes[key] = shape
+    return shape
+
+# Places of one shape in one area, as columns
+class Group:
+    __slots__ = ("shape", "start", "terms", "addends", "messages")
+    def __len__(self):
+        return len(self.start)
+    def __init__(self, shape: Shape):
+        self.shape = shape
+        self.start = array("I")
+        self.terms = array("I")
+        self.addends = array("q")
+        self.messages = array("I")
+
+# Bytes placed after one OrgRel target, with the places still to patch. The
+# image holds zeros where a relocated value goes.
+class Area:
+    __slots__ = ("index", "image", "groups")
+    def __init__(self, index: int):
+        self.index = index
+        self.image = bytearray()
+        self.groups = {}
+
+    def place(self, location: int, data: bytes):
+        end = location + len(data)
+        if end > len(self.image):
+            self.image.extend(bytes(end - len(self.image)))
+        self.image[location:end] = data
+
+    def add(self, shape: Shape, location: int, terms: list, addends: tuple, messages: list):
+        group = self.groups.get(shape.key)
+        if group is None:
+            group = Group(shape)
+            self.groups[shape.key] = group
+        group.start.append(location)
+        group.terms.extend(terms)
+        group.addends.extend(addends)
+        group.messages.extend(messages)
+
+    def resolve(self, base: int, values: array, failed: list) -> bytearray:
+        image = bytearray(self.image)
+        for group in self.groups.values():
+            errors = []
+            group.shape.evaluate(image, base, values, group.start, group.terms, group.addends, group.messages, errors)
+            failed.extend((self, offset, message) for offset, message in errors)
+        return image
+
+# Every relocation expression of a library, read straight from the record
+# stream. Instruction bytes are taken as they are, so an Abs8 does not
+# swallow the push of its operand as it does when decoding instructions.
+class Relocations:
+    def __init__(self, library: str, context: ParseContext = None):
+        self.data = Reader(library, context)
+        self.context = self.data.context
+        self.areas = {}
+        self.targets = []
+        self.target_ids = {}
+        # Checks already failing in expressions of constants
+        self.failed = []
+        self.count = 0
+        self.read()
+
+    def target(self, kind: int, index: int) -> int:
+        key = (kind, index)
+        target = self.target_ids.get(key)
+        if target is None:
+            target = len(self.targets)
+            self.target_ids[key] = target
+            self.targets.append(key)
+        return target
+
+    def read(self):
+        data = self.data
+        area = None
+        location = 0
+        # Tokens of the expression being read and what it refers to
+        key = []
+        terms = []
+        constants = []
+        messages = []
+        depth = 0
+        start = 0
+        message = 0
+        while data.valid():
+            position = data.position()
+            section_id = data.readU8()
+            if section_id == Abs8.ID:
+                byte = data.readU8()
+                if area is not None:
+                    if location == len(area.image):
+                        area.image.append(byte)
+                    else:
+                        area.place(location, bytes((byte,)))
+                location += 1
+                continue
+            elif section_id == 0xFF:
+                break
+            elif section_id in (PushExt.ID, PushRel.ID):
+                if depth == 0:
+                    start = location
+                terms.append(self.target(section_id, data.readDynamic()))
+                constants.append(signed(data.readU32()))
+                key.append((section_id,))
+                depth += 1
+            elif section_id == PushAbs.ID:
+                if depth == 0:
+                    start = location
+                constants.append(signed(data.readU32()))
+                key.append((section_id,))
+                depth += 1
+            elif section_id == PushPcr.ID:
+                if depth == 0:
+                    start = location
+                # PC is where the expression starts, bytes placed since go to the constant
+                constants.append(signed(data.readU32()) + location - start)
+                key.append((section_id,))
+                depth += 1
+            elif section_id in (Minus.ID, DeleteTos.ID, Pop8.ID, Pop24.ID):
+                if depth == 0 or (section_id == Minus.ID and depth == 1):
+                    raise DecodeError("Relocation stack underflow", position)
+                if section_id in (Pop8.ID, Pop24.ID):
+                    key.append((section_id, location - start))
+                    if area is not None:
+                        area.place(location, bytes(1 if section_id == Pop8.ID else 3))
+                    location += 1 if section_id == Pop8.ID else 3
+                else:
+                    key.append((section_id,))
+                depth -= 1
+            elif section_id == Copy.ID:
+                if depth == 0:
+                    raise DecodeError("Relocation stack underflow", position)
+                key.append((section_id,))
+                depth += 1
+            elif section_id == LSR.ID:
+                key.append((section_id, data.readU32()))
+            elif section_id == Check.ID:
+                # The listings show the lower bound first
+                key.append((section_id, signed(data.readU32()), signed(data.readU32())))
+                messages.append(message)
+            elif section_id == StackError.ID:
+                # An empty message ends the one before
+                message = position if data.peekU8(0) else 0
+                data.skipString()
+                continue
+            elif section_id == Abs16.ID:
+                value = data.readU16()
+                if area is not None:
+                    area.place(location, bytes((value >> 8, value & 0xFF)))
+                location += 2
+                continue
+            elif section_id == OrgRel.ID:
+                index = data.readDynamic()
+                area = self.areas.get(index)
+                if area is None:
+                    area = Area(index)
+                    self.areas[index] = area
+                location = data.readU32()
+                continue
+            else:
+                section = section_type[section_id]
+                if section is None:
+                    raise DecodeError(f"Unknown section ID: {section_id:02X}", position)
+                section(data)
+                continue
+
+            if depth == 0:
+                self.add(area, tuple(key), terms, constants, messages, start, position)
+                key = []
+                terms = []
+                constants = []
+                messages = []
+        if depth != 0:
+            raise DecodeError("Relocation expression without end", data.position())
+
+    def add(self, area: Area, key: tuple, terms: list, constants: list, messages: list, start: int, position: int):
+        try:
+            shape = getShape(key)
+        except ValueError as error:
+            raise DecodeError(str(error), position)
+        if not shape.outputs or area is None:
+            return
+        self.count += 1
+        addends = shape.fold(constants)
+        if shape.constant:
+            errors = []
+            shape.evaluate(area.image, 0, (), (start,), terms, addends, messages, errors)
+            self.failed.extend((area, offset, message) for offset, message in errors)
+            return
+        area.add(shape, start, terms, addends, messages)
+
+    def name(self, kind: int, index: int) -> str:
+        if kind == PushExt.ID:
+            value = Symbol.getExternal(self.context, index)
+        else:
+            value = Symbol.getRelocatable(self.context, index) or Segment.get(self.context, index)
+        return value.name if value is not None else f"{index:04X}"
+
+    # Address of every target. Relocatable ones are looked up in bases by
+    # index (symbols and segments share the index space) or by name,
+    # externals in externals by name.
+    def address(self, bases: dict, externals: dict, kind: int, index: int) -> int:
+        address = bases.get(index) if kind == PushRel.ID else None
+        if address is None:
+            address = (externals if kind == PushExt.ID else bases).get(self.name(kind, index))
+        if address is None:
+            raise LookupError(f"No address for {self.name(kind, index)}")
+        return address
+
+    def values(self, bases: dict, externals: dict = {}) -> array:
+        return array("q", (self.address(bases, externals, kind, index) for kind, index in self.targets))
+
+    def message(self, position: int) -> str:
+        if position == 0:
+            return None
+        saved = self.data.position()
+        try:
+            self.data.seek(position + 1)
+            return self.data.readString().strip()
+        finally:
+            self.data.seek(saved)
+
+    # Final bytes of every area, {index: image}, with the areas placed at
+    # bases[index]. Checks that fail are listed as (area, offset, message),
+    # their bytes are patched anyway.
+    def resolve(self, bases: dict, externals: dict = {}) -> tuple:
+        values = self.values(bases, externals)
+        failed = [(area, offset, self.message(message)) for area, offset, message in self.failed]
+        images = {}
+        for index, area in self.areas.items():
+            errors = []
+            images[index] = area.resolve(self.address(bases, externals, PushRel.ID, index), values, errors)
+            failed.extend((area, offset, self.message(message)) for area, offset, message in errors)
+        return images, failed
+
+    # Areas back to back from origin and every other target after them, an
+    # address for everything when there is no linker at hand
+    def layout(self, origin: int = 0, externals: bool = True) -> tuple:
+        bases = {}
+        names = {}
+        for index, area in self.areas.items():
+            bases[index] = origin
+            origin += len(area.image)
+        for kind, index in self.targets:
+            if kind == PushRel.ID and index not in bases:
+                bases[index] = origin
+            elif kind == PushExt.ID and externals:
+                names[self.name(kind, index)] = origin
+        return bases, names
+
+    def summary(self) -> list:
+        counts = {}
+        for area in self.areas.values():
+            for key, group in area.groups.items():
+                counts[key] = counts.get(key, 0) + len(group)
+        return sorted(((count, shapes[key]) for key, count in counts.items()), key=lambda item: -item[0])
@@ -0,0 +1,36 @@
+import struct
+from iarlib.reader import Reader, DecodeError
+from iarlib.context import ParseContext
+from iarlib.dispatch import section_type
+
+# Record classes register themselves by ID when their module is imported,
+# a module with new records only has to be listed here
+import iarlib.library, iarlib.keyvalue, iarlib.memoryinfo, iarlib.attribute
+import iarlib.nametable, iarlib.pointertype, iarlib.type, iarlib.sizetype
+import iarlib.segment, iarlib.callframe, iarlib.symbol, iarlib.instruction, iarlib.error
+
+# Decodes a library one record at a time. Only the context tables (names,
+# types, segments, symbols) outlive a record, everything else is up to the
+# caller to keep or drop.
+def iter_sections(library: str, context: ParseContext = None):
+    data = Reader(library, context)
+    end = len(data.data)
+    while data.valid():
+        position = data.position()
+        section_id = data.readU8()
+        section = section_type[section_id]
+        if section is not None:
+            try:
+                decoded = section(data)
+            except struct.error:
+                # A fixed size field past the end of the file
+                raise DecodeError(f"Section {section_id:02X} is cut short", position)
+            if data.position() > end:
+                # Strings and skips run past the end without failing
+                raise DecodeError(f"Section {section_id:02X} is cut short", position)
+            yield decoded
+        elif section_id == 0xFF:
+            return
+        else:
+            raise DecodeError(f"Unknown section ID: {section_id:02X}", position)
+    raise DecodeError("Sections end without the FF terminator", data.position())
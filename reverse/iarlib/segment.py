@@ -1,4 +1,6 @@
 from iarlib.reader import Reader
+from iarlib.context import ParseContext
+from iarlib.dispatch import register
 
 type_map = {
     0x21: "CODE",
@@ -13,9 +15,9 @@ spa_map = {
     0x20: "REORDER",
 }
 
-segment_map = {}
-
+@register
 class Segment:
+    __slots__ = ("SPA", "index", "type", "name")
     ID = 0x4B
     def __str__(self):
         return f'{self.index:02X}: {self.name} {self.type} SPA={self.SPA}'
@@ -26,6 +28,12 @@ class Segment:
         self.index = data.readU8()
         self.type = type_map[data.readU8()]
         self.name = data.readString()
-        segment_map[self.index] = self
-    def get(index):
-        return segment_map.get(index)
\ No newline at end of file
+        data.context.segment_map[self.index] = self
+    def scan(data: Reader):
+        data.skip(1)
+        index = data.readU8()
+        data.skip(1)
+        data.skipString()
+        return (("segment_map", index),)
+    def get(context: ParseContext, index):
+        return context.segment_map.get(index)
\ No newline at end of file
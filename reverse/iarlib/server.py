@@ -0,0 +1,264 @@
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from iarlib.reader import Reader
+from iarlib.index import SectionIndex
+from iarlib.symbolindex import SymbolIndex, symbolKinds, symbol_kinds
+from iarlib.symbol import location_names
+from iarlib.segment import Segment
+from iarlib.type import Type
+from iarlib.emitter import render
+
+# What happens when the watcher sees a loaded library change
+EAGER = "eager" # decode it again right away
+LAZY = "lazy"   # drop it, the next query decodes it again
+OFF = "off"     # no watcher, keep answering from what was loaded
+policies = (EAGER, LAZY, OFF)
+
+def stamp(path: str) -> tuple:
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+# One library kept decoded between queries. Symbols come from the index as
+# usual, types are decoded all at once the first time they are asked for.
+# A file without a single record is not a library, one that stops part way
+# is kept with what was found and reports where it stopped.
+class Loaded:
+    def __init__(self, library: str):
+        self.library = library
+        self.stamp = stamp(library)
+        self.index = SectionIndex(Reader(library))
+        if len(self.index) == 0 and self.index.error is not None:
+            raise self.index.error
+        self.error = str(self.index.error) if self.index.error is not None else None
+        self.symbols = SymbolIndex(self.index)
+        self.types = None
+        self.loaded = time.time()
+        self.queries = 0
+
+    def allTypes(self) -> list:
+        if self.types is None:
+            self.types = [self.index.decode(record) for record in self.index.find(Type.ID)]
+        return self.types
+
+# Answers JSON queries on a Unix socket, one request and one response per
+# line:
+#   {"id": 1, "op": "symbols", "library": "hci.lib", "name": "HCI_*"}
+#   {"id": 1, "ok": true, "result": [...]}  or  {"id": 1, "ok": false, "error": "..."}
+# Clients are served concurrently, but decoding shares the context tables
+# of each library, so every operation runs on one worker thread in order.
+class QueryServer:
+    def __init__(self, path: str, policy: str = LAZY, interval: float = 1.0):
+        if policy not in policies:
+            raise ValueError(f"Unknown reload policy: {policy}")
+        self.path = path
+        self.policy = policy
+        self.interval = interval
+        self.libraries = {}
+        self.worker = ThreadPoolExecutor(max_workers=1)
+        self.started = time.time()
+        self.clients = 0
+        self.served = 0
+        self.reloads = 0
+        # op: (method, fields the request needs)
+        self.operations = {
+            "libraries": (self.listLibraries, ()),
+            "load": (self.load, ("library",)),
+            "reload": (self.reload, ("library",)),
+            "symbols": (self.listSymbols, ("library",)),
+            "segments": (self.listSegments, ("library",)),
+            "types": (self.listTypes, ("library",)),
+            "code": (self.listCode, ("library", "name")),
+            "stats": (self.stats, ()),
+        }
+
+    # Worker thread side
+
+    def get(self, library: str) -> Loaded:
+        path = os.path.abspath(library)
+        loaded = self.libraries.get(path)
+        if loaded is None:
+            loaded = Loaded(path)
+            self.libraries[path] = loaded
+        loaded.queries += 1
+        return loaded
+
+    def load(self, request: dict):
+        loaded = self.get(request["library"])
+        return {"library": loaded.library, "records": len(loaded.index), "error": loaded.error}
+
+    def reload(self, request: dict):
+        self.libraries.pop(os.path.abspath(request["library"]), None)
+        self.reloads += 1
+        return self.load(request)
+
+    def listLibraries(self, request: dict):
+        return [{"library": loaded.library, "records": len(loaded.index), "error": loaded.error,
+            "queries": loaded.queries, "loaded": loaded.loaded} for loaded in self.libraries.values()]
+
+    def describe(self, symbols: SymbolIndex, symbol) -> dict:
+        segment = symbols.segment(symbol)
+        return {
+            "name": symbol.name,
+            "kinds": list(symbolKinds(symbol)),
+            "segment": segment.name if segment is not None else None,
+            "type": repr(symbol.type),
+        }
+
+    # Any of name (qualified or glob), segment and kind, see SymbolIndex.query
+    def listSymbols(self, request: dict):
+        kind = request.get("kind")
+        if kind is not None and kind not in symbol_kinds:
+            raise ValueError(f'Unknown kind {kind}, one of {", ".join(symbol_kinds)}')
+        symbols = self.get(request["library"]).symbols
+        found = symbols.query(request.get("name"), request.get("segment"), request.get("kind"))
+        return [self.describe(symbols, symbol) for symbol in found]
+
+    def listSegments(self, request: dict):
+        index = self.get(request["library"]).index
+        return [str(index.decode(record)) for record in index.find(Segment.ID)]
+
+    def listTypes(self, request: dict):
+        return [{"index": decoded.index, "type": repr(decoded)} for decoded in self.get(request["library"]).allTypes()]
+
+    # Listing of every relocatable symbol matching name
+    def listCode(self, request: dict):
+        symbols = self.get(request["library"]).symbols
+        ret = []
+        for symbol in symbols.name(request["name"]):
+            if location_names[symbol.location] != "PUBLIC_REL":
+                continue
+            lines = [line for line in map(render, symbols.code(symbol)) if line is not None]
+            ret.append({"name": symbol.name, "lines": lines})
+        return ret
+
+    def stats(self, request: dict):
+        return {
+            "libraries": len(self.libraries),
+            "clients": self.clients,
+            "served": self.served,
+            "reloads": self.reloads,
+            "policy": self.policy,
+            "uptime": time.time() - self.started,
+        }
+
+    # Event loop side
+
+    async def handle(self, line: bytes) -> dict:
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("request is not an object")
+        except ValueError as error:
+            return {"id": None, "ok": False, "error": f"Bad request: {error}"}
+        operation = self.operations.get(request.get("op"))
+        if operation is None:
+            return {"id": request.get("id"), "ok": False, "error": f'Unknown op: {request.get("op")}'}
+        method, fields = operation
+        missing = [field for field in fields if field not in request]
+        if missing:
+            return {"id": request.get("id"), "ok": False, "error": f'Missing field: {", ".join(missing)}'}
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self.worker, method, request)
+        except (Exception, SystemExit) as error:
+            # Fields of the wrong type end up here too
+            return {"id": request.get("id"), "ok": False, "error": failure(error)}
+        self.served += 1
+        return {"id": request.get("id"), "ok": True, "result": result}
+
+    async def client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.clients += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Past the stream limit, the rest of the line would be
+                    # read as the next request so the connection ends here
+                    response = {"id": None, "ok": False, "error": "Bad request: line too long"}
+                    writer.write(json.dumps(response).encode() + b"\n")
+                    await writer.drain()
+                    break
+                if not line:
+                    break
+                response = await self.handle(line)
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.clients -= 1
+            writer.close()
+
+    # Polls the loaded libraries, stat is cheap next to any decoding
+    async def watch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.interval)
+            for path, loaded in list(self.libraries.items()):
+                try:
+                    changed = stamp(path) != loaded.stamp
+                except FileNotFoundError:
+                    self.libraries.pop(path, None)
+                    continue
+                if not changed:
+                    continue
+                if self.policy == EAGER:
+                    try:
+                        await loop.run_in_executor(self.worker, self.reload, {"library": path})
+                    except (Exception, SystemExit):
+                        # Half written, the next round tries again
+                        self.libraries.pop(path, None)
+                else:
+                    self.libraries.pop(path, None)
+
+    # Serves until SIGINT or SIGTERM
+    async def serve(self, preload: list = ()):
+        removeStale(self.path)
+        server = await asyncio.start_unix_server(self.client, path=self.path)
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for number in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(number, stop.set)
+        watcher = asyncio.create_task(self.watch()) if self.policy != OFF else None
+        try:
+            for library in preload:
+                try:
+                    await loop.run_in_executor(self.worker, self.get, library)
+                except (Exception, SystemExit) as error:
+                    print(f'FAIL {library}: {failure(error)}', file=sys.stderr)
+            async with server:
+                await stop.wait()
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            self.worker.shutdown(wait=False)
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+# Error text for a response. The decoder calls exit() on records it cannot
+# decode yet (BaseAddress call frames), that must not stop the daemon.
+def failure(error: BaseException) -> str:
+    if isinstance(error, SystemExit):
+        return "Decoder stopped on a record it does not support"
+    return f"{type(error).__name__}: {error}"
+
+# A socket left behind by a daemon that died is removed, one that still
+# answers is not
+def removeStale(path: str):
+    if not os.path.exists(path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        try:
+            connection.connect(path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.remove(path)
+            return
+    raise OSError(f"A daemon is already serving {path}")
@@ -1,4 +1,5 @@
 from iarlib.reader import Reader
+from iarlib.dispatch import register
 
 size_map = {
     # Intrinsic types
@@ -20,8 +21,11 @@ size_map = {
     0x36: "unsigned char", # Why?
 }
 
+@register
 class SizeType:
+    __slots__ = ("type", "size")
     ID = 0x4F
+    SIZE = 2
     def __repr__(self):
         return f'{size_map[self.type]} = {self.size}'
     def __init__(self, data: Reader):
@@ -1,8 +1,11 @@
 from iarlib.reader import Reader
+from iarlib.context import ParseContext
 from iarlib.nametable import NameTable
 from iarlib.type import Type
+from iarlib.dispatch import register
 
 class FrameSize:
+    __slots__ = ("SNO", "size", "flags")
     def __repr__(self):
         return f'SNO={self.SNO:02X} {self.size:08X} {self.flags:04X}'
     
@@ -12,6 +15,7 @@ class FrameSize:
         self.flags = data.readU16()
 
 class FrameCount:
+    __slots__ = ("frame_sizes",)
     ID = 0xC4
     def __str__(self):
         ret = f'Frames:\n'
@@ -25,13 +29,17 @@ class FrameCount:
         for _ in range(count):
             data.readU8()
             self.frame_sizes.append(FrameSize(data))
+    # Skips every count record at the reader position
+    def scan(data: Reader):
+        while data.peekU8(0) == FrameCount.ID:
+            data.skip(1)
+            data.skip(8 * data.readU32())
 
-function_table = {}
-
-def getFunction(index):
-    return function_table.get(index)
+def getFunction(context: ParseContext, index):
+    return context.function_table.get(index)
 
 class Function:
+    __slots__ = ("symbol", "func_index", "file", "line", "func_def", "counts")
     def __str__(self):
         ret = f'FUNC={self.func_index:04X} FILE={self.file:04X} LINE={self.line:04X} DEF={self.func_def:08X}\n'
         for count in self.counts:
@@ -52,9 +60,10 @@ class Function:
         while(data.peekU8(0) == FrameCount.ID):
             data.readU8()
             self.counts.append(FrameCount(data))
-        function_table[self.func_index] = self
+        data.context.function_table[self.func_index] = self
 
 class ExternalFunction:
+    __slots__ = ("symbol", "func_index", "func_def", "counts")
     def __str__(self):
         ret = f'XFUNC={self.func_index:04X} DEF={self.func_def:08X}\n'
         for count in self.counts:
@@ -72,7 +81,7 @@ class ExternalFunction:
         while(data.peekU8(0) == 0xC4):
             data.readU8()
             self.counts.append(FrameCount(data))
-        function_table[self.func_index] = self
+        data.context.function_table[self.func_index] = self
 
 sub_def_map = {
     0xB0: Function,
@@ -84,15 +93,14 @@ location_names = {
     0x05: "EXTERNAL",
 }
 
-relocatable_table = {}
-external_table = {}
-
 location_map = {
-    0x02: relocatable_table,
-    0x05: external_table,
+    0x02: "relocatable_table",
+    0x05: "external_table",
 }
 
+@register
 class Symbol:
+    __slots__ = ("location", "index", "name", "type", "func")
     ID = 0xCE
     
     def __str__(self):
@@ -106,8 +114,6 @@ class Symbol:
                 return f'{self.type!r} {self.name}'
 
     def __init__(self, data: Reader):
-        global relocatable_table
-        global external_table
         data.readU32() # Unknown
         self.location = data.readU8()
         self.index = data.readDynamic()
@@ -118,7 +124,7 @@ class Symbol:
         data.readU8() # Unknown
         data.readU8() # Unknown
         data.readU8() # Unknown
-        self.name = NameTable.get(data.readU8())
+        self.name = NameTable.get(data.context, data.readU8())
         self.type = Type.get(data)
         data.readU8()
         data.readU8()
@@ -127,24 +133,49 @@ class Symbol:
             self.func = sub_def_map.get(data.readU8())(self, data)
         else:
             self.func = None
-        location_map[self.location][self.index] = self
+        getattr(data.context, location_map[self.location])[self.index] = self
+    def scan(data: Reader):
+        data.skip(4)
+        location = data.readU8()
+        index = data.readDynamic()
+        data.skip(7)
+        keys = [(location_map[location], index), ("symbol_name", data.readU8())]
+        data.readDynamic()
+        data.skip(3)
+        sub_def = data.peekU8(0)
+        if sub_def == 0xB0:
+            data.skip(1)
+            keys.append(("function_table", data.readU16()))
+            data.skip(10)
+            FrameCount.scan(data)
+        elif sub_def == 0xB1:
+            data.skip(1)
+            keys.append(("function_table", data.readU16()))
+            data.skip(4)
+            FrameCount.scan(data)
+        return keys
 
-    def getRelocatable(index):
-        return relocatable_table.get(index)
+    def getRelocatable(context: ParseContext, index):
+        return context.relocatable_table.get(index)
     
-    def getExternal(index):
-        return external_table.get(index)
+    def getExternal(context: ParseContext, index):
+        return context.external_table.get(index)
 
+@register
 class SourceCall:
+    __slots__ = ("caller", "callee", "flags", "counts")
     ID = 0xCB
     def __repr__(self):
         return f'Call Flags: {self.flags:04X}'
     def __init__(self, data: Reader):
-        self.caller = getFunction(data.readU16())
-        self.callee = getFunction(data.readU16())
+        self.caller = getFunction(data.context, data.readU16())
+        self.callee = getFunction(data.context, data.readU16())
         self.flags = data.readU16()
         self.counts = []
         while(data.peekU8(0) == FrameCount.ID):
             data.readU8()
             self.counts.append(FrameCount(data))
-        print(f';Call to external function {self.callee!r} with flags {self.flags:04X}')
\ No newline at end of file
+    def scan(data: Reader):
+        data.skip(6)
+        FrameCount.scan(data)
+        return ()
\ No newline at end of file
@@ -0,0 +1,95 @@
+from fnmatch import fnmatchcase
+from iarlib.index import SectionIndex
+from iarlib.segment import Segment
+from iarlib.symbol import Symbol, Function, ExternalFunction, location_names
+
+# Kind names a symbol can be found under, besides its location
+FUNCTION = "FUNCTION"
+DATA = "DATA"
+RELAY = "RELAY"
+
+# Every kind a query can ask for
+symbol_kinds = tuple(location_names.values()) + (FUNCTION, DATA, RELAY)
+
+def symbolKinds(symbol: Symbol) -> tuple:
+    kinds = [location_names[symbol.location]]
+    kinds.append(FUNCTION if isinstance(symbol.func, (Function, ExternalFunction)) else DATA)
+    if symbol.name is not None and symbol.name.endswith("::?relay"):
+        kinds.append(RELAY)
+    return tuple(kinds)
+
+# Name, segment and kind lookups over the symbols of one library. Only the
+# Symbol records (and the names, types and segments they refer to) are
+# decoded, code is left alone until asked for.
+class SymbolIndex:
+    def __init__(self, index: SectionIndex):
+        self.index = index
+        self.symbols = []
+        self.names = {}
+        self.scopes = {}
+        self.segments = {}
+        self.kinds = {}
+        for record in index.find(Symbol.ID):
+            self.add(index.decode(record))
+
+    def add(self, symbol: Symbol):
+        self.symbols.append(symbol)
+        name = symbol.name
+        if name is not None:
+            self.names.setdefault(name, []).append(symbol)
+            # Every enclosing scope of a qualified name, "a::b::c" is under "a" and "a::b"
+            parts = name.split("::")
+            for depth in range(1, len(parts)):
+                self.scopes.setdefault("::".join(parts[:depth]), []).append(symbol)
+        segment = self.segment(symbol)
+        if segment is not None:
+            self.segments.setdefault(segment.name, []).append(symbol)
+        for kind in symbolKinds(symbol):
+            self.kinds.setdefault(kind, []).append(symbol)
+
+    # Relocatable symbols live in the segment with the same index
+    def segment(self, symbol: Symbol) -> Segment:
+        if location_names[symbol.location] != "PUBLIC_REL":
+            return None
+        return Segment.get(self.index.data.context, symbol.index)
+
+    def name(self, name: str) -> list:
+        if any(char in name for char in "*?["):
+            return [symbol for key, symbols in self.names.items() if fnmatchcase(key, name) for symbol in symbols]
+        return list(self.names.get(name, ()))
+
+    # Symbols qualified by scope, e.g. the ?relay of a function
+    def scope(self, scope: str) -> list:
+        return list(self.scopes.get(scope, ()))
+
+    def placed(self, segment: str) -> list:
+        return list(self.segments.get(segment, ()))
+
+    def kind(self, kind: str) -> list:
+        return list(self.kinds.get(kind.upper(), ()))
+
+    # Every condition given has to hold
+    def query(self, name: str = None, segment: str = None, kind: str = None) -> list:
+        candidates = None
+        for found in (
+            self.name(name) if name is not None else None,
+            self.placed(segment) if segment is not None else None,
+            self.kind(kind) if kind is not None else None,
+        ):
+            if found is None:
+                continue
+            if candidates is None:
+                candidates = found
+            else:
+                ids = set(id(symbol) for symbol in found)
+                candidates = [symbol for symbol in candidates if id(symbol) in ids]
+        return list(self.symbols) if candidates is None else candidates
+
+    def code(self, symbol: Symbol):
+        if location_names[symbol.location] != "PUBLIC_REL":
+            return iter(())
+        return self.index.code(symbol.index)
+
+    def describe(self, symbol: Symbol) -> str:
+        segment = self.segment(symbol)
+        return f'{"/".join(symbolKinds(symbol)):<26} {segment.name if segment is not None else "-":<14} {symbol.name} {symbol.type!r}'
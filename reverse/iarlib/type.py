@@ -1,15 +1,17 @@
 from iarlib.reader import Reader
 from iarlib.nametable import NameTable
 from iarlib.memoryinfo import MemoryInfo
+from iarlib.dispatch import register
 
 class Intrinsic:
+    __slots__ = ("name", "size")
     def __repr__(self):
         return self.name
     def __init__(self, name, size):
         self.name = name
         self.size = size
 
-type_map = {
+intrinsic_map = {
     # Intrinsic types
     0x01: Intrinsic("unsigned char", 1),
     0x02: Intrinsic("signed char", 1),
@@ -30,66 +32,104 @@ type_map = {
     0x36: Intrinsic("char (unsigned)", 1), # Why??
 }
 
-class Pointer:
+# Caches the rendered declaration. A decoded type never changes and refers
+# to other types as objects, not indices, so the text can never go stale and
+# each type in a nested declaration is rendered once.
+class Rendered:
+    __slots__ = ("text",)
     def __repr__(self):
+        try:
+            return self.text
+        except AttributeError:
+            self.text = self.render()
+            return self.text
+
+class Pointer(Rendered):
+    __slots__ = ("target",)
+    def render(self):
         return f'({self.target!r} *)'
     def __init__(self, data: Reader):
         self.target = Type.get(data)
+    def scan(data: Reader):
+        data.readDynamic()
 
-class Function:
-    def __repr__(self):
+class Function(Rendered):
+    __slots__ = ("return_type", "format", "params")
+    def render(self):
         return f'{self.return_type!r}' + self.args()
     def __init__(self, data: Reader):
         self.return_type = Type.get(data)
         self.format = data.readU8()
         param_count = data.readU8()
-        self.params = []
-        for _ in range(param_count):
-            self.params.append(Type.get(data))
+        # Parameter types are a run of indices, decoded in one go
+        types = data.context.type_map
+        self.params = [types.get(index) for index in data.readDynamics(param_count)]
+    def scan(data: Reader):
+        data.readDynamic()
+        data.skip(1)
+        data.skipDynamics(data.readU8())
     def args(self):
-        ret = '('
-        for p in range(len(self.params)):
-            ret += f'{self.params[p]!r}, '
-        return ret.removesuffix(', ') + ')'
+        return '(' + ', '.join(repr(param) for param in self.params) + ')'
 
-class Array:
-    def __repr__(self):
+class Array(Rendered):
+    __slots__ = ("type", "size", "count")
+    def render(self):
         return f'{self.type!r} [{self.count}]'
     def __init__(self, data: Reader):
         self.type = Type.get(data)
         self.size = data.readU32()
         self.count = data.readU32()
+    def scan(data: Reader):
+        data.readDynamic()
+        data.skip(8)
 
-class DataAttribute:
-    def __repr__(self):
+class DataAttribute(Rendered):
+    __slots__ = ("memory_info", "data_type", "gen", "target")
+    def render(self):
         if self.memory_info is None:
             return f'{self.data_type!r}'
         return f'{self.data_type!r} {self.memory_info}'
     def __init__(self, data: Reader):
         mem_idx = data.readU8()
-        self.memory_info = MemoryInfo.get(mem_idx)
+        self.memory_info = MemoryInfo.get(data.context, mem_idx)
         self.data_type = Type.get(data)
         self.gen = data.readU32()
         data.readU8() # Unknown
         self.target = data.readU32()
+    def scan(data: Reader):
+        data.skip(1)
+        data.readDynamic()
+        data.skip(9)
 
-class FunctionAttribute:
+class FunctionAttribute(Rendered):
+    __slots__ = ("memory_info", "func_type", "gen", "target")
     def __str__(self):
             return f'{self.func_type!r} {self.memory_info}'
-    def __repr__(self):
+    def render(self):
             return f'{self.func_type!r}'
     def __init__(self, data: Reader):
         mem_idx = data.readU8()
-        self.memory_info = MemoryInfo.get(mem_idx)
+        self.memory_info = MemoryInfo.get(data.context, mem_idx)
         if self.memory_info is None:
             print(f'Memory Info {mem_idx:04X} is None!')
         self.func_type = Type.get(data)
         self.gen = data.readU32()
         data.readU8() # Unknown
         self.target = data.readU32()
+    def scan(data: Reader):
+        data.skip(1)
+        data.readDynamic()
+        data.skip(9)
 
 class Typedef:
+    __slots__ = ("reference_type", "name", "declaration")
     def __str__(self):
+        try:
+            return self.declaration
+        except AttributeError:
+            self.declaration = self.declare()
+            return self.declaration
+    def declare(self):
         if isinstance(self.reference_type, Pointer):
             if isinstance(self.reference_type.target, FunctionAttribute):
                 func = self.reference_type.target.func_type
@@ -100,37 +140,40 @@ class Typedef:
         return self.name
     def __init__(self, data: Reader):
         self.reference_type = Type.get(data)
-        self.name = NameTable.get(data.readU32())
-        print(self)
+        self.name = NameTable.get(data.context, data.readU32())
+    def scan(data: Reader):
+        data.readDynamic()
+        data.skip(4)
 
-class StructUnionMember:
-    def __repr__(self):
+class StructUnionMember(Rendered):
+    __slots__ = ("name", "type")
+    def render(self):
         return f'\t{self.type!r} {self.name}\n'
     def __init__(self, data: Reader):
         data.readU32() # Index
-        self.name = NameTable.get(data.readU32())
+        self.name = NameTable.get(data.context, data.readU32())
         self.type = Type.get(data)
         data.readU32() # Unknown
 
-class StructUnion:
-    def __repr__(self):
-        repr = ''
-        if self.type == 9:
-            repr += 'struct {\n'
-        else:
-            repr += 'union {\n'
-        for member in self.members:
-            repr += f'{member}'
-        repr += '}'
-        return repr
+class StructUnion(Rendered):
+    __slots__ = ("name", "type", "size", "members")
+    def render(self):
+        kind = 'struct {\n' if self.type == 9 else 'union {\n'
+        return kind + ''.join(repr(member) for member in self.members) + '}'
     def __init__(self, data: Reader):
-        self.name = NameTable.get(data.readU32())
+        self.name = NameTable.get(data.context, data.readU32())
         self.type = data.readU32() # Struct or union
         self.size = data.readU32()
         member_count = data.readU32()
         self.members = []
         for _ in range(member_count):
             self.members.append(StructUnionMember(data))
+    def scan(data: Reader):
+        data.skip(12)
+        for _ in range(data.readU32()):
+            data.skip(8)
+            data.readDynamic()
+            data.skip(4)
 
 subtype_map = {
     0x0F: Pointer,
@@ -142,17 +185,23 @@ subtype_map = {
     0x34: StructUnion,
 }
 
+@register
 class Type:
+    __slots__ = ("index", "type")
     ID = 0x4A
     def __repr__(self):
-        return f'{type_map.get(self.index)!r}'
+        return f'{self.type!r}'
     def __init__(self, data: Reader):
-        global type_map
         self.index = data.readDynamic()
         subtype = data.readU8()
-        type_map[self.index] = subtype_map.get(subtype)(data)
-        
+        self.type = subtype_map.get(subtype)(data)
+        if self.index not in intrinsic_map:
+            data.context.type_map[self.index] = self.type
+    def scan(data: Reader):
+        index = data.readDynamic()
+        subtype_map.get(data.readU8()).scan(data)
+        return (("type_map", index),)
+
     def get(data: Reader):
-        idx = data.readDynamic()
-        type = type_map.get(idx)
-        return type
\ No newline at end of file
+        # Intrinsics are seeded into every type_map
+        return data.context.type_map.get(data.readDynamic())
\ No newline at end of file